@@ -59,16 +59,21 @@ log_default = {
 
     "aquaPi":     {"level": "NOTSET"},
     # "aquaPi.api": {"level": "NOTSET"},
+    # "aquaPi.asgi": {"level": "NOTSET"},
+    # "aquaPi.assets": {"level": "NOTSET"},
 
     "machineroom":             {"level": "NOTSET"},
     # "machineroom.alert_nodes": {"level": "NOTSET"},
     # "machineroom.aux_nodes":   {"level": "NOTSET"},
+    # "machineroom.bench":       {"level": "NOTSET"},
     # "machineroom.ctrl_nodes":  {"level": "NOTSET"},
     # "machineroom.hist_nodes":  {"level": "NOTSET"},
     # "machineroom.in_nodes":    {"level": "NOTSET"},
     # "machineroom.msg_bus":     {"level": "NOTSET"},
     # "machineroom.msg_types":   {"level": "NOTSET"},
     # "machineroom.out_nodes":   {"level": "NOTSET"},
+    # "machineroom.runtime":     {"level": "NOTSET"},
+    # "machineroom.topology":    {"level": "NOTSET"},
 
     "driver":               {"level": "NOTSET"},
     # "driver.base":          {"level": "NOTSET"},
@@ -104,6 +109,9 @@ def create_app() -> Flask:
         INSTANCE_PATH=app.instance_path
     )
 
+    from . import assets
+    assets.init_app(app)
+
     # in debug mode, app starts a 2nd instance and thus we
     # would duplicate all our threads, which then compete,  AVOID THIS!
     # https://stackoverflow.com/questions/17552482/hook-when-flask-restarts-in-debug-mode
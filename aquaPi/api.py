@@ -96,6 +96,27 @@ def api_history(node_id: str) -> Response:
     return Response(status=HTTPStatus.INTERNAL_SERVER_ERROR)
 
 
+@bp.route('/api/plan/<node_id>')
+def api_plan(node_id: str) -> Response:
+    bus = the_bus()
+    if bus:
+        node_id = str(node_id.encode('ascii', 'xmlcharrefreplace'), errors='strict')
+        node = bus.get_node(node_id)
+
+        if node:
+            if hasattr(node, 'get_plan'):
+                plan = node.get_plan()
+
+                body = json.dumps({'result': 'SUCCESS', 'data': {node.id: plan}}, sort_keys=False)
+                log.debug('API plan/%s: %s', node_id, body)
+                return Response(status=HTTPStatus.OK, response=body, mimetype='application/json')
+            else:
+                return Response(status=HTTPStatus.BAD_REQUEST)
+        else:
+            return Response(status=HTTPStatus.NOT_FOUND)
+    return Response(status=HTTPStatus.INTERNAL_SERVER_ERROR)
+
+
 @bp.route('/api/sse', methods=['GET'])
 def api_sse() -> Response:
     if request.headers.get('accept') != 'text/event-stream':
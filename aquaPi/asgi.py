@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+
+import asyncio
+from concurrent.futures import (Future, ThreadPoolExecutor)
+from io import BytesIO
+import logging
+from http import HTTPStatus
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+from asgiref.sync import sync_to_async  # type: ignore[import-untyped]
+from asgiref.wsgi import WsgiToAsgiInstance  # type: ignore[import-untyped]
+from flask import json
+
+from . import create_app
+from .machineroom import MsgBus
+from .pages.sse_util import format_msg
+
+
+log = logging.getLogger('aquaPi.asgi')
+log.brief = log.warning  # alias, warning used as brief info, info is verbose
+
+
+# ========== production entry point ==========
+
+# Serve aquaPi with an ASGI server instead of 'flask run', e.g.
+#   uvicorn --factory aquaPi.asgi:create_asgi_app --host 0.0.0.0 --port 5000
+# Use a single worker process, the machine room owns the hardware!
+# Flask handles requests in a pool of WSGI_WORKERS threads, like the
+# threaded Werkzeug server, a slow view doesn't delay the others.
+# The SSE stream /api/sse is an async generator in the event loop, thus
+# an open dashboard costs no thread. The endless event streams of the
+# Jinja pages (render_sse_template) must not hold that thread, each
+# chunk of them is fetched in a pool of STREAM_WORKERS, and a stream
+# ends when its client disconnects.
+
+# max. age [s] browsers may cache static files without asking again
+STATIC_MAX_AGE = 24 * 60 * 60
+
+# max. count of Flask requests handled at the same time
+WSGI_WORKERS = 8
+
+# max. count of page event streams fetching a chunk at the same time
+STREAM_WORKERS = 8
+
+Scope = dict[str, Any]
+Receive = Callable[[], Awaitable[dict[str, Any]]]
+Send = Callable[[dict[str, Any]], Awaitable[None]]
+
+
+class _Subscriber:
+    def __init__(self):
+        self.ids: set[str] = set()
+        self.ready: asyncio.Event = asyncio.Event()
+
+
+class ChangeFeed:
+    """ Fans the change reports of a bus out to all SSE clients.
+        The bus reports from its own threads, the feed hands each
+        change over to the event loop, where every subscriber
+        collects the ids until its stream sends them.
+    """
+    # min. time [s] between two events of a stream, like send_sse_events
+    INTERVAL = 1.0
+    # time [s] without changes until a comment keeps the stream alive
+    KEEPALIVE = 30.0
+
+    def __init__(self, bus: MsgBus, loop: asyncio.AbstractEventLoop):
+        self._bus = bus
+        self._loop = loop
+        self._subscribers: set[_Subscriber] = set()
+        bus.add_change_hook(self._report)
+
+    def close(self) -> None:
+        self._bus.remove_change_hook(self._report)
+
+    def _report(self, node_id: str) -> None:
+        # runs in a bus thread
+        if not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._publish, node_id)
+
+    def _publish(self, node_id: str) -> None:
+        for sub in self._subscribers:
+            sub.ids.add(node_id)
+            sub.ready.set()
+
+    async def events(self) -> AsyncIterator[str]:
+        """ the SSE stream, one event with a list of changed node ids
+            at most every INTERVAL
+        """
+        sub = _Subscriber()
+        self._subscribers.add(sub)
+        log.debug('SSE client subscribed, %d now', len(self._subscribers))
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(sub.ready.wait(), self.KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                sub.ready.clear()
+                changed_ids, sub.ids = sub.ids, set()
+                log.debug('API sse reply: %r', changed_ids)
+                yield format_msg(json.dumps(list(changed_ids)))
+                await asyncio.sleep(self.INTERVAL)
+        finally:
+            self._subscribers.discard(sub)
+            log.debug('SSE client gone, %d left', len(self._subscribers))
+
+
+async def _disconnect(receive: Receive) -> None:
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+def _close(chunks: Any) -> None:
+    close = getattr(chunks, 'close', None)
+    if close:
+        close()
+
+
+class _WsgiInstance(WsgiToAsgiInstance):
+    """ one request through asgiref's WSGI adapter, run in a thread
+        of our pool instead of asgiref's single thread-sensitive one
+    """
+    _run_wsgi_app = WsgiToAsgiInstance.__dict__['run_wsgi_app'].func
+
+    def __init__(self, wsgi_application, executor: ThreadPoolExecutor):
+        super().__init__(wsgi_application)
+        self._executor = executor
+
+    async def run_wsgi_app(self, body) -> None:
+        await sync_to_async(self._run_wsgi_app, thread_sensitive=False,
+                            executor=self._executor)(body)
+
+
+class AquaPiAsgi:
+    """ ASGI application: the SSE stream natively, all else through
+        the WSGI Flask app
+    """
+    SSE_PATH = '/api/sse'
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self._requests = ThreadPoolExecutor(max_workers=WSGI_WORKERS,
+                                            thread_name_prefix='wsgi')
+        self._streams = ThreadPoolExecutor(max_workers=STREAM_WORKERS,
+                                           thread_name_prefix='sse_stream')
+        self._feed: ChangeFeed | None = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http' and scope['path'] == self.SSE_PATH:
+            await self._sse(scope, receive, send)
+        elif scope['type'] == 'http' \
+             and dict(scope['headers']).get(b'accept') == b'text/event-stream':
+            await self._wsgi_stream(scope, receive, send)
+        else:
+            await _WsgiInstance(self.flask_app, self._requests)(scope, receive, send)
+
+    def feed(self) -> ChangeFeed:
+        if not self._feed:
+            bus = self.flask_app.extensions['machineroom'].bus
+            self._feed = ChangeFeed(bus, asyncio.get_running_loop())
+        return self._feed
+
+    async def _lifespan(self, receive: Receive, send: Send) -> None:
+        while True:
+            event = await receive()
+            if event['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif event['type'] == 'lifespan.shutdown':
+                if self._feed:
+                    self._feed.close()
+                    self._feed = None
+                self._requests.shutdown(wait=False)
+                self._streams.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _sse(self, scope: Scope, receive: Receive, send: Send) -> None:
+        headers = dict(scope['headers'])
+        if headers.get(b'accept') != b'text/event-stream':
+            body = b'MUST ACCEPT content type text/event-stream'
+            await send({'type': 'http.response.start',
+                        'status': HTTPStatus.BAD_REQUEST,
+                        'headers': [(b'content-type', b'text/plain; charset=utf-8'),
+                                    (b'content-length', str(len(body)).encode())]})
+            await send({'type': 'http.response.body', 'body': body})
+            return
+
+        await send({'type': 'http.response.start',
+                    'status': HTTPStatus.OK,
+                    'headers': [(b'content-type', b'text/event-stream'),
+                                (b'cache-control', b'no-cache')]})
+
+        async def stream() -> None:
+            async for event in self.feed().events():
+                await send({'type': 'http.response.body',
+                            'body': event.encode(), 'more_body': True})
+
+        tasks = {asyncio.ensure_future(stream()), asyncio.ensure_future(_disconnect(receive))}
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+    async def _wsgi_stream(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """ an event stream of the Flask app, e.g. of a Jinja page
+            Flask returns an endless iterator, each chunk is fetched in
+            the stream pool and sent until the client disconnects.
+        """
+        loop = asyncio.get_running_loop()
+        wsgi = WsgiToAsgiInstance(self.flask_app)
+        wsgi.scope = scope
+        environ = wsgi.build_environ(scope, BytesIO())  # GET, no body
+        gone = asyncio.ensure_future(_disconnect(receive))
+        chunks = None
+        pending: Future | None = None
+        try:
+            chunks = iter(await loop.run_in_executor(self._streams, self.flask_app,
+                                                     environ, wsgi.start_response))
+            await send(wsgi.response_start)
+            while not gone.done():
+                pending = self._streams.submit(next, chunks, None)
+                await asyncio.wait({asyncio.wrap_future(pending), gone},
+                                   return_when=asyncio.FIRST_COMPLETED)
+                if not pending.done():
+                    break  # client gone while Flask waits for the next event
+                body, pending = pending.result(), None
+                if body is None:
+                    await send({'type': 'http.response.body'})
+                    break
+                await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+        finally:
+            gone.cancel()
+            if chunks is not None:
+                if pending and not pending.done():
+                    # the iterator can't be closed while it runs, close
+                    # it in the pool thread once it returns
+                    pending.add_done_callback(lambda _done, it=chunks: self._close_later(it))
+                else:
+                    self._close_later(chunks)
+            log.debug('SSE page stream %s ended', scope['path'])
+
+    def _close_later(self, chunks: Any) -> None:
+        try:
+            self._streams.submit(_close, chunks)
+        except RuntimeError:
+            pass  # pool is shut down
+
+
+def create_asgi_app() -> AquaPiAsgi:
+    """ app factory for ASGI servers
+    """
+    app = create_app()
+    if not app or 'machineroom' not in app.extensions:
+        raise RuntimeError('aquaPi failed to start, see log')
+    app.config['SEND_FILE_MAX_AGE_DEFAULT'] = STATIC_MAX_AGE
+    return AquaPiAsgi(app)
@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+from os import path
+import posixpath
+import re
+import shutil
+from typing import Any
+
+import click
+from flask import (Blueprint, Flask, abort, current_app, json, request,
+                   send_from_directory, url_for)
+from flask.cli import AppGroup
+
+try:
+    import brotli  # type: ignore[import-untyped]
+except ImportError:
+    brotli = None
+try:
+    import rjsmin  # type: ignore[import-untyped]
+    import rcssmin  # type: ignore[import-untyped]
+except ImportError:
+    rjsmin = rcssmin = None
+
+
+log = logging.getLogger('aquaPi.assets')
+log.brief = log.warning  # alias, warning used as brief info, info is verbose
+
+
+# ========== static asset pipeline ==========
+
+# 'flask --app aquaPi.assets assets build' copies all files of static/ to
+# instance/assets/, each with a content hash in its name, e.g.
+#   libs/luxon.3.1.1.js  ->  libs/luxon.3.1.1.2f9c01ab.js (+ .gz, .br)
+# and writes manifest.json, mapping the original to the hashed names.
+# JS & CSS are minified if rjsmin/rcssmin are installed, .br files are
+# written if brotli is installed. The classic scripts and the styles of
+# the SPA are concatenated to one file each, see BUNDLES.
+# CSS url() and the relative imports of the ES modules in spa/ are
+# rewritten to the hashed names. Since a name changes with its content,
+# browsers may cache these files forever.
+# Entries of a @font-face src list with a file missing in static/ are
+# dropped, browsers pick one of the others. Vendored CSS stays untouched.
+# Templates use asset_url()/asset_urls(), which fall back to plain
+# static files while there is no manifest, e.g. during development.
+# With --if-stale the build is skipped unless a file of static/, or
+# this module, is newer than the manifest, e.g. after an update.
+
+BUNDLES: dict[str, list[str]] = {
+    'bundle/libs.js': ['libs/vuex.3.6.2.js',
+                       'libs/vue-router.3.6.5.js',
+                       'libs/vue-i18n.8.28.2.js',
+                       'libs/vuetify.2.6.13.js',
+                       'libs/chart.js.4.0.1.js',
+                       'libs/luxon.3.1.1.js',
+                       'libs/chartjs-adapter-luxon.1.3.0.js',
+                       'libs/sortablejs.1.8.4.js',
+                       'libs/vuedraggable.2.20.0.js',
+                       'libs/vue-masonry-css.1.0.3.js'],
+    'bundle/styles.css': ['fonts/blinker-v12.css',
+                          'css/vuetify.2.6.13.customized.min.css',
+                          'css/app.css',
+                          'css/materialdesignicons.6.9.96.min.css'],
+}
+
+# ES modules, their relative imports are rewritten
+MODULE_DIRS = ('spa/',)
+
+# brotli level of the bundles, max. compression but slow, and of all else
+BROTLI_BEST = 11
+BROTLI_FAST = 9
+
+# no use to compress these
+COMPRESSED = {'.woff', '.woff2', '.webp', '.png', '.jpg', '.jpeg', '.gif'}
+
+MANIFEST = 'manifest.json'
+MANIFEST_VERSION = 1
+
+# browsers may keep a hashed file for a year
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+CSS_FONT_SRC = re.compile(r'(\bsrc\s*:\s*)([^;}]+)')
+# split a src list at commas, but not in url(...) or format(...)
+CSS_SRC_SPLIT = re.compile(r',(?![^(]*\))')
+JS_IMPORT = re.compile(r'''(\bfrom\s*|\bimport\s*\(?\s*)(['"])(\.{1,2}/[^'"]+)\2''')
+
+
+def _hashed_name(name: str, content: bytes) -> str:
+    digest = hashlib.sha256(content).hexdigest()[:8]
+    base, ext = posixpath.splitext(name)
+    return f'{base}.{digest}{ext}'
+
+
+def _is_module(name: str) -> bool:
+    return name.endswith('.js') and name.startswith(MODULE_DIRS)
+
+
+def _split_ref(ref: str) -> tuple[str, str]:
+    # 'x.eot?#iefix' -> ('x.eot', '?#iefix')
+    match = re.match(r'([^?#]*)(.*)', ref)
+    assert match
+    return match.group(1), match.group(2)
+
+
+class _Builder:
+    """ One run of the build, self.files maps original to hashed names
+    """
+    def __init__(self, static_dir: str, out_dir: str):
+        self.static_dir = static_dir
+        self.out_dir = out_dir
+        self.files: dict[str, str] = {}
+
+    def read(self, name: str) -> bytes:
+        with open(path.join(self.static_dir, name), 'rb') as f_in:
+            return f_in.read()
+
+    def emit(self, name: str, content: bytes, best: bool = False) -> None:
+        hashed = _hashed_name(name, content)
+        fname = path.join(self.out_dir, hashed)
+        os.makedirs(path.dirname(fname), exist_ok=True)
+        with open(fname, 'wb') as f_out:
+            f_out.write(content)
+        if posixpath.splitext(name)[1].lower() not in COMPRESSED:
+            variants = [('.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+            if brotli:
+                quality = BROTLI_BEST if best else BROTLI_FAST
+                variants.append(('.br', brotli.compress(content, quality=quality)))
+            for ext, packed in variants:
+                if len(packed) < len(content) * 0.9:
+                    with open(fname + ext, 'wb') as f_out:
+                        f_out.write(packed)
+        self.files[name] = hashed
+
+    @staticmethod
+    def _target(ref: str, src_dir: str) -> str | None:
+        # static file a CSS url() refers to, None for data:, http:, absolute
+        if not ref or ':' in ref or ref.startswith('/'):
+            return None
+        return posixpath.normpath(posixpath.join(src_dir, ref))
+
+    def drop_missing_fonts(self, text: str, src_dir: str) -> str:
+        def available(entry: str) -> bool:
+            match = CSS_URL.search(entry)
+            if not match:
+                return True  # local()
+            target = self._target(_split_ref(match.group(2))[0], src_dir)
+            return target is None or target in self.files
+
+        def font_src(match: re.Match) -> str:
+            entries = CSS_SRC_SPLIT.split(match.group(2))
+            kept = [entry for entry in entries if available(entry)]
+            if not kept or len(kept) == len(entries):
+                return match.group(0)
+            log.info('CSS in %s: dropped missing font(s) %s', src_dir,
+                     [entry.strip() for entry in entries if entry not in kept])
+            return match.group(1) + ','.join(kept)
+        return CSS_FONT_SRC.sub(font_src, text)
+
+    def rewrite_css(self, text: str, src_dir: str, out_dir: str) -> str:
+        def hashed_url(match: re.Match) -> str:
+            ref, suffix = _split_ref(match.group(2))
+            target = self._target(ref, src_dir)
+            if target is None:
+                return match.group(0)
+            if target not in self.files:
+                log.warning('CSS in %s refers to missing %s', src_dir, target)
+                return match.group(0)
+            rel = posixpath.relpath(self.files[target], out_dir or '.')
+            return f'url("{rel}{suffix}")'
+        return CSS_URL.sub(hashed_url, self.drop_missing_fonts(text, src_dir))
+
+    def css(self, name: str, out_dir: str) -> str:
+        text = self.read(name).decode('utf8')
+        text = self.rewrite_css(text, posixpath.dirname(name), out_dir)
+        return rcssmin.cssmin(text) if rcssmin else text
+
+    def js(self, name: str) -> str:
+        text = self.read(name).decode('utf8')
+        return rjsmin.jsmin(text) if rjsmin else text
+
+    def module(self, name: str, modules: set[str], active: list[str]) -> None:
+        """ emit module name after all modules it imports
+        """
+        if name in self.files:
+            return
+        if name in active:
+            raise ValueError('Import cycle: ' + ' -> '.join(active + [name]))
+        active.append(name)
+        text = self.js(name)
+        src_dir = posixpath.dirname(name)
+
+        def hashed_import(match: re.Match) -> str:
+            target = posixpath.normpath(posixpath.join(src_dir, match.group(3)))
+            if target not in modules:
+                raise ValueError(f'{name} imports missing {target}')
+            self.module(target, modules, active)
+            rel = posixpath.relpath(self.files[target], src_dir or '.')
+            if not rel.startswith('.'):
+                rel = './' + rel
+            return f'{match.group(1)}{match.group(2)}{rel}{match.group(2)}'
+
+        text = JS_IMPORT.sub(hashed_import, text)
+        active.pop()
+        self.emit(name, text.encode('utf8'))
+
+    def run(self) -> dict[str, str]:
+        names = []
+        for root, _dirs, files in os.walk(self.static_dir):
+            for fname in files:
+                rel = path.relpath(path.join(root, fname), self.static_dir)
+                names.append(rel.replace(os.sep, '/'))
+        names.sort()
+
+        # referenced files first, CSS & modules need their hashed names
+        for name in names:
+            if not name.endswith(('.css', '.js')):
+                self.emit(name, self.read(name))
+        for name in names:
+            if name.endswith('.css'):
+                self.emit(name, self.css(name, posixpath.dirname(name)).encode('utf8'))
+            elif name.endswith('.js') and not _is_module(name):
+                self.emit(name, self.js(name).encode('utf8'))
+        modules = {name for name in names if _is_module(name)}
+        for name in sorted(modules):
+            self.module(name, modules, [])
+
+        for bundle, parts in BUNDLES.items():
+            if bundle.endswith('.css'):
+                out_dir = posixpath.dirname(bundle)
+                text = '\n'.join(self.css(part, out_dir) for part in parts)
+            else:
+                # classic scripts, a missing ';' must not join two of them
+                text = ';\n'.join(self.js(part) for part in parts)
+            self.emit(bundle, text.encode('utf8'), best=True)
+        return self.files
+
+
+def build_assets(static_dir: str, out_dir: str) -> dict[str, str]:
+    """ build all assets of static_dir into out_dir, replacing
+        a previous build, return the manifest
+    """
+    tmp_dir = out_dir + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    builder = _Builder(static_dir, tmp_dir)
+    files = builder.run()
+    with open(path.join(tmp_dir, MANIFEST), 'w', encoding='utf8') as f_out:
+        json.dump({'version': MANIFEST_VERSION, 'files': files}, f_out, indent=2)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+    log.brief('Built %d assets%s%s', len(files),
+              '' if rjsmin else ', rjsmin/rcssmin missing: not minified',
+              '' if brotli else ', brotli missing: gzip only')
+    return files
+
+
+def _newest_source(static_dir: str) -> float:
+    # this module defines the bundles, directories change with the files in them
+    newest = path.getmtime(__file__)
+    for root, _dirs, files in os.walk(static_dir):
+        newest = max([newest, path.getmtime(root)]
+                     + [path.getmtime(path.join(root, fname)) for fname in files])
+    return newest
+
+
+def is_stale(static_dir: str, out_dir: str) -> bool:
+    """ True if there is no usable build, or a source is newer
+    """
+    if not load_manifest(out_dir):
+        return True
+    return _newest_source(static_dir) > path.getmtime(path.join(out_dir, MANIFEST))
+
+
+def load_manifest(out_dir: str) -> dict[str, str]:
+    """ map of original to hashed names, empty if nothing was built
+    """
+    fname = path.join(out_dir, MANIFEST)
+    if not path.exists(fname):
+        return {}
+    with open(fname, 'r', encoding='utf8') as f_in:
+        manifest = json.load(f_in)
+    if manifest.get('version') != MANIFEST_VERSION:
+        log.warning('%s has unknown version, static files are used', fname)
+        return {}
+    return manifest['files']
+
+
+# ========== Flask integration ==========
+
+
+bp = Blueprint('assets', __name__)
+
+assets_cli = AppGroup('assets', help='Build the static files for production.')
+
+
+def _assets_dir() -> str:
+    return current_app.config['ASSETS_DIR']
+
+
+def _manifest() -> dict[str, str]:
+    return current_app.extensions['assets']
+
+
+def _set_manifest(app: Flask, files: dict[str, str]) -> None:
+    # the set of hashed names guards /assets/, no scan of the manifest
+    app.extensions['assets'] = files
+    app.extensions['assets_hashed'] = set(files.values())
+
+
+@assets_cli.command('build')
+@click.option('--if-stale', is_flag=True,
+              help='Only build if static/ changed since the last build.')
+def build_command(if_stale: bool) -> None:
+    """ Fingerprint, minify and compress static/ into ASSETS_DIR.
+    """
+    if if_stale and not is_stale(current_app.static_folder, _assets_dir()):
+        click.echo(f'Assets in {_assets_dir()} are up to date')
+        return
+    files = build_assets(current_app.static_folder, _assets_dir())
+    _set_manifest(current_app, files)
+    click.echo(f'{len(files)} assets written to {_assets_dir()}')
+
+
+@bp.route('/assets/<path:filename>')
+def asset(filename: str) -> Any:
+    if filename not in current_app.extensions['assets_hashed']:
+        abort(404)
+    mimetype, _ = mimetypes.guess_type(filename)
+    response = None
+    for encoding, ext in (('br', '.br'), ('gzip', '.gz')):
+        if encoding in request.accept_encodings \
+        and path.isfile(path.join(_assets_dir(), filename + ext)):
+            response = send_from_directory(_assets_dir(), filename + ext,
+                                           mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+            break
+    if not response:
+        response = send_from_directory(_assets_dir(), filename, mimetype=mimetype)
+    response.headers['Cache-Control'] = IMMUTABLE
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def asset_url(filename: str) -> str:
+    """ template helper: URL of the built asset, or the static file
+    """
+    hashed = _manifest().get(filename)
+    if hashed:
+        return url_for('assets.asset', filename=hashed)
+    return url_for('static', filename=filename)
+
+
+def asset_urls(filename: str) -> list[str]:
+    """ template helper: URL of the built bundle, or all its parts
+    """
+    if filename in _manifest():
+        return [asset_url(filename)]
+    return [url_for('static', filename=part) for part in BUNDLES[filename]]
+
+
+def init_app(app: Flask) -> None:
+    app.config.setdefault('ASSETS_DIR', path.join(app.instance_path, 'assets'))
+    _set_manifest(app, load_manifest(app.config['ASSETS_DIR']))
+    app.register_blueprint(bp)
+    app.jinja_env.globals.update(asset_url=asset_url, asset_urls=asset_urls)
+
+
+def create_app() -> Flask:
+    """ app of 'flask --app aquaPi.assets', with the static files
+        and instance folder of aquaPi, but no machine room
+    """
+    app = Flask('aquaPi', instance_relative_config=True)
+    init_app(app)
+    app.cli.add_command(assets_cli)
+    return app
@@ -2,6 +2,9 @@
 
 import logging
 import statistics
+import random
+from time import time, sleep
+from threading import Event, Lock, Thread
 
 # latest Blinka supports x86 LinuxPC, but we don't at least not chips on I²C
 from adafruit_platformdetect import Detector  # type: ignore[import-untyped]
@@ -11,32 +14,42 @@ else:
     SIMULATED = True
 
 import board  # type: ignore[import-untyped]
-import busio  # type: ignore[import-untyped]
 
 # from adafruit_ads1x15 import ADS1015
 from adafruit_ads1x15.ads1115 import ADS1115
+from adafruit_ads1x15.ads1x15 import Mode
 from adafruit_ads1x15.analog_in import AnalogIn
 
-from .base import (AInDriver, IoPort, PortFunc)
+try:
+    import RPi.GPIO as GPIO  # type: ignore[import-untyped]
+except (RuntimeError, ModuleNotFoundError):
+    GPIO = None
+
+from .base import (AInDriver, IoPort, PortFunc, DriverReadError)
+from .i2c_bus import I2cBus
 
 
 log = logging.getLogger('driver.DriverADC')
 log.brief = log.warning  # alias, warning used as brief info, info is verbose
 
-
-# ========== ADC inputs ==========
+# config register and its input multiplexer bits
+_REG_CONFIG = 0x01
+_MUX_MASK = 0x7000
+_MUX_SHIFT = 12
 
 
-adc_count: int = 0
+# ========== ADC inputs ==========
 
 
-def _scan_i2c(i2c, addresses):
+def _scan_i2c(bus: I2cBus, addresses):
     """Yield all devices that respond on the given addresses."""
     for adr in addresses:
         try:
-            yield adr, ADS1115(i2c, address=adr)
+            with bus.transaction(adr) as i2c:
+                ads = ADS1115(i2c, address=adr)
         except Exception:
             continue
+        yield adr, ads
 
 
 def _detect_ads111x(ads):
@@ -46,6 +59,272 @@ def _detect_ads111x(ads):
         return False
 
 
+class FakeADS1115:
+    """ Minimal stand-in for an ADS1115 on a simulated I²C bus.
+        It implements what AdsSampler and AnalogIn use, and lets the
+        input voltage of each pin drift around its initial value.
+    """
+    bits = 16
+
+    def __init__(self, address: int = 0x48, gain: float = 1):
+        self.address: int = address
+        self.gain: float = gain
+        self.gains: list[float] = [2 / 3, 1, 2, 4, 8, 16]
+        self.mode: int = Mode.SINGLE
+        self.data_rate: int = 128
+        self.comparator_queue_length: int = 0
+        self.comparator_low_threshold: int = -32768
+        self.comparator_high_threshold: int = 32767
+        self.voltages: dict[int, float] = {}
+        self._initvals: dict[int, float] = {}
+        self._pin: int = 4
+        self._last_pin_read: int | None = None
+        self.conversions: int = 0
+
+    def set_voltage(self, pin: int, volt: float) -> None:
+        self._initvals[pin] = volt
+        self.voltages[pin] = volt
+
+    def read(self, pin: int) -> int:
+        """ pin is the mux setting as used by AnalogIn, 4..7 = single-ended
+        """
+        self._pin = pin
+        raw = self.get_last_result()
+        return raw - (1 << 16) if raw & 0x8000 else raw
+
+    def _read_register(self, reg: int, fast: bool = False) -> int:
+        return self._pin << _MUX_SHIFT if reg == _REG_CONFIG else 0
+
+    def _write_register(self, reg: int, value: int) -> None:
+        if reg == _REG_CONFIG:
+            self._pin = (value & _MUX_MASK) >> _MUX_SHIFT
+
+    def get_last_result(self, fast: bool = False) -> int:
+        """ a new conversion of the last pin read, unsigned as in the register
+        """
+        self.conversions += 1
+        inp = self._pin - 4 if self._pin >= 4 else self._pin
+        initval = self._initvals.get(inp, 0.)
+        volt = self.voltages.get(inp, initval) + random.uniform(-0.005, 0.005)
+        self.voltages[inp] = min(max(initval - 1, volt), initval + 1)
+        fsr = {2 / 3: 6.144, 1: 4.096, 2: 2.048, 4: 1.024, 8: 0.512, 16: 0.256}[self.gain]
+        return int(min(max(-32768, self.voltages[inp] / fsr * 32768), 32767)) & 0xFFFF
+
+
+class AdsSampler:
+    """ Sampler thread of one ADS1x15 chip.
+        The chip runs in continuous conversion mode, the sampler round-robins
+        all channels in use, and caches the latest median-filtered voltage of
+        each. DriverADS1115.read() is served from this cache, thus several
+        inputs share one chip without contending for the I²C bus.
+        Register accesses are transactions on the shared I2cBus, waiting for
+        conversions is done without holding the bus.
+        End of conversion is signalled by the ALERT/RDY pin, if connected to
+        a GPIO (cfg 'rdy_pin'), else the sampler waits one conversion time.
+    """
+    # default cycle time [s] of a scan over all channels
+    INTERVAL = 5.0
+    # digits for auto-gain to switch to a lower or higher gain
+    GAIN_HIGH = 32300
+    GAIN_LOW = 16000
+
+    # one sampler per chip, keyed by (bus, adr)
+    _samplers: dict[tuple[I2cBus, int], 'AdsSampler'] = {}
+    _samplers_lock: Lock = Lock()
+
+    class Channel:
+        """ state of one input of the chip
+        """
+        def __init__(self, inp: int, gain: float, median: bool):
+            self.inp: int = inp
+            self.gain: float = gain  # <= 0 is auto-gain
+            self.median: bool = median
+            self.voltage: float | None = None
+            self.ready: Event = Event()  # set after first conversion
+
+    @classmethod
+    def get(cls, bus: I2cBus, adr: int, ads_factory) -> 'AdsSampler':
+        """ return the sampler of chip at adr on bus, create it with ads_factory()
+        """
+        with cls._samplers_lock:
+            if (bus, adr) not in cls._samplers:
+                with bus.transaction(adr):
+                    cls._samplers[(bus, adr)] = AdsSampler(bus, adr, ads_factory())
+            return cls._samplers[(bus, adr)]
+
+    def __init__(self, bus: I2cBus, adr: int, ads):
+        self.bus: I2cBus = bus
+        self.adr: int = adr
+        self.ads = ads  # ADS1115 or FakeADS1115
+        self._channels: dict[int, AdsSampler.Channel] = {}
+        self._lock: Lock = Lock()
+        self._stop: Event = Event()
+        self._wakeup: Event = Event()
+        self._thread: Thread | None = None
+        self._rdy_pin: int | None = None
+        self.interval: float = self.INTERVAL
+
+    def __str__(self) -> str:
+        return f'{type(self).__name__}(0x{self.adr:02X})'
+
+    def register(self, inp: int, gain: float, median: bool = True,
+                 interval: float | None = None, rdy_pin: int | None = None) -> None:
+        with self._lock:
+            self._channels[inp] = AdsSampler.Channel(inp, gain, median)
+            if interval:
+                self.interval = min(self.interval, interval)
+            if rdy_pin is not None and GPIO:
+                self._rdy_pin = rdy_pin
+            if not self._thread:
+                self._stop.clear()
+                self._thread = Thread(name=str(self), target=self._sampler, daemon=True)
+                self._thread.start()
+        self._wakeup.set()  # sample the new input asap
+        log.debug('%s: registered in %d, %d channels', self, inp, len(self._channels))
+
+    def unregister(self, inp: int) -> None:
+        with self._lock:
+            self._channels.pop(inp, None)
+            if self._channels:
+                return
+            thread = self._thread
+            self._thread = None
+            self._stop.set()
+            self._wakeup.set()
+        if thread:
+            thread.join(timeout=5)
+        with AdsSampler._samplers_lock:
+            AdsSampler._samplers.pop((self.bus, self.adr), None)
+        # return chip to power-on defaults to allow future auto-detect
+        try:
+            with self.bus.transaction(self.adr):
+                self.ads.mode = Mode.SINGLE
+                self.ads.comparator_queue_length = 0
+                self.ads.gain = 2
+                self.ads.read(0)
+        except Exception:
+            log.exception('%s: reset to power-on defaults failed', self)
+
+    def voltage(self, inp: int) -> float | None:
+        """ return the latest voltage of an input,
+            wait for its first conversion if necessary
+        """
+        with self._lock:
+            chan = self._channels.get(inp)
+        if not chan:
+            return None
+        chan.ready.wait(timeout=5)
+        with self._lock:
+            return chan.voltage
+
+    def _setup(self) -> None:
+        ads = self.ads
+        with self.bus.transaction(self.adr):
+            ads.mode = Mode.CONTINUOUS
+            if self._rdy_pin is not None:
+                # Hi_thresh MSB = 1 and Lo_thresh MSB = 0 turn ALERT into RDY
+                ads.comparator_high_threshold = -32768
+                ads.comparator_low_threshold = 0
+                ads.comparator_queue_length = 1
+        if self._rdy_pin is not None:
+            GPIO.setup(self._rdy_pin, GPIO.IN)
+
+    def _wait_conversion(self) -> None:
+        timeout = 2 / self.ads.data_rate
+        if self._rdy_pin is not None:
+            if GPIO.wait_for_edge(self._rdy_pin, GPIO.FALLING,
+                                  timeout=max(1, int(timeout * 1000))):
+                return
+        sleep(timeout)
+
+    def _convert(self) -> int:
+        """ wait for the next conversion and return it as signed digits
+        """
+        self._wait_conversion()
+        # no fast read: a config change may have moved the register pointer
+        with self.bus.transaction(self.adr):
+            raw = self.ads.get_last_result(False)
+        return raw - (1 << 16) if raw & 0x8000 else raw
+
+    def _select(self, chan: 'AdsSampler.Channel') -> None:
+        """ set gain and mux for the channel. ADS1x15.read() would wait for
+            the conversion holding the bus, _convert() waits without it.
+        """
+        ads = self.ads
+        pin = chan.inp + 4
+        with self.bus.transaction(self.adr):
+            ads.gain = abs(chan.gain)
+            if ads._last_pin_read != pin:
+                config = ads._read_register(_REG_CONFIG)
+                ads._write_register(_REG_CONFIG,
+                                    config & ~_MUX_MASK | pin << _MUX_SHIFT)
+                ads._last_pin_read = pin
+
+    def _adjust_gain(self, chan: 'AdsSampler.Channel') -> int:
+        """ set the channel's gain, with auto-gain pick the highest gain
+            without overflow. Returns the last conversion result.
+        """
+        ads = self.ads
+        self._select(chan)
+        val = self._convert()
+        if chan.gain > 0:
+            return val
+
+        for _ in ads.gains:
+            if abs(val) > self.GAIN_HIGH:
+                lower = [g for g in ads.gains if g < ads.gain]
+                if not lower:
+                    break
+                with self.bus.transaction(self.adr):
+                    ads.gain = lower[-1]
+            elif abs(val) < self.GAIN_LOW:
+                higher = [g for g in ads.gains if g > ads.gain]
+                if not higher or abs(val) * higher[0] / ads.gain > self.GAIN_HIGH:
+                    break
+                with self.bus.transaction(self.adr):
+                    ads.gain = higher[0]
+            else:
+                break
+            val = self._convert()
+        chan.gain = -ads.gain
+        log.debug('%s: in %d gain %r, digits %d', self, chan.inp, ads.gain, val)
+        return val
+
+    def _sample(self, chan: 'AdsSampler.Channel') -> float:
+        ana_in = AnalogIn(self.ads, chan.inp)
+        val = self._adjust_gain(chan)
+        if not chan.median:
+            return ana_in.convert_to_voltage(val)
+        median = [ana_in.convert_to_voltage(val),
+                  ana_in.convert_to_voltage(self._convert()),
+                  ana_in.convert_to_voltage(self._convert())]
+        log.debug('%s: in %d median %f %f %f', self, chan.inp, *median)
+        return statistics.median(median)
+
+    def _sampler(self) -> None:
+        log.debug('%s: started', self)
+        try:
+            self._setup()
+        except Exception:
+            log.exception('%s: setup failed', self)
+        while not self._stop.is_set():
+            start = time()
+            with self._lock:
+                channels = list(self._channels.values())
+            for chan in channels:
+                try:
+                    volt = self._sample(chan)
+                except Exception:
+                    log.exception('%s: conversion of in %d failed', self, chan.inp)
+                    continue
+                with self._lock:
+                    chan.voltage = volt
+                chan.ready.set()
+            self._wakeup.wait(max(0., self.interval - (time() - start)))
+            self._wakeup.clear()
+        log.debug('%s: stopped', self)
+
+
 def _create_port(adr, adc_index: int, ch: int) -> IoPort:
     deps = ['GPIO %d in' % board.SCL.id, 'GPIO %d out' % board.SCL.id,
             'GPIO %d in' % board.SDA.id, 'GPIO %d out' % board.SDA.id]
@@ -60,10 +339,20 @@ class DriverADS1115(AInDriver):
             ADS1x13 1 channel, no comparator
             ADS1x14 1 channel, gain adjustable
             ADS1x15 4 channel or 2 differential, gain adjustable
-        Sample rate and continuous mode not supported. Differential isn't yet.
+        Conversions run in continuous mode in the chip's AdsSampler, read()
+        returns the latest cached value. Differential isn't yet supported.
+        cfg = { adr: int          # I²C address
+              , cnt: int          # ADC number, 1..
+              , in: int           # input 0..3
+              , gain: -16         # PGA gain, <=0 for auto-gain
+              , scan_interval: 5  # secs between scans of the chip
+              , rdy_pin: None     # GPIO connected to ALERT/RDY
+              , fake: False       # use a FakeADS1115
+              }
     """
 
     ADDRESSES = [0x48, 0x49, 0x4A, 0x4B]
+    CACHE_DISCOVERY = True  # the I²C scan is slow, revalidated in background
 
     @staticmethod
     def is_ads111x(ads: ADS1115) -> bool:
@@ -99,25 +388,41 @@ class DriverADS1115(AInDriver):
         return False
 
     @staticmethod
-    def find_ports() -> dict[str, IoPort]:
-        global adc_count  # pylint: disable=W0603
+    def fingerprint() -> str | None:
+        """ the addresses of ADS1x15 candidates responding on I²C
+        """
+        if SIMULATED:
+            return None
+        try:
+            found = I2cBus.get().scan()
+        except Exception as ex:
+            log.debug('I²C scan failed: %r', ex)
+            return None
+        return ','.join(f'0x{adr:02X}' for adr in DriverADS1115.ADDRESSES if adr in found)
 
+    @staticmethod
+    def find_ports() -> dict[str, IoPort]:
         if SIMULATED:
             return DriverADS1115._simulated_ports()
 
-        i2c = busio.I2C(board.SCL, board.SDA)
+        bus = I2cBus.get()
         ports = {}
 
+        # chips sampled by us are no longer in power-on state, don't probe them
+        with AdsSampler._samplers_lock:
+            chips = {adr for (smp_bus, adr) in AdsSampler._samplers
+                     if smp_bus is bus and adr in DriverADS1115.ADDRESSES}
+
         log.brief('Scanning I²C bus for ADS1x13/4/5 ...')
         # autodetect of I²C is undefined and risky, as some chips may react on
         # read as if it was a write! We're on a pretty well defined HW though.
-        for adr, ads in _scan_i2c(i2c, DriverADS1115.ADDRESSES):
+        for adr, ads in _scan_i2c(bus, [adr for adr in DriverADS1115.ADDRESSES
+                                        if adr not in chips]):
             try:
-                if _detect_ads111x(ads):
-                    adc_count += 1
-                    for ch in range(4):
-                        name = f"ADC #{adc_count} in {ch}"
-                        ports[name] = _create_port(adr, adc_count, ch)
+                with bus.transaction(adr):
+                    is_ads = _detect_ads111x(ads)
+                if is_ads:
+                    chips.add(adr)
                 else:
                     log.brief('I²C device at 0x%02X seems not to be an ADS1x15,'
                               'probably a different device, or already in use.', adr)
@@ -127,19 +432,24 @@ class DriverADS1115(AInDriver):
                 # pass  # whatever it is, ignore this device
                 log.debug('%r', ex)
 
+        # the number follows the address, 0x48 is #1 .. 0x4B is #4, thus
+        # port names don't change when another chip is added or removed
+        for adr in sorted(chips):
+            cnt = DriverADS1115.ADDRESSES.index(adr) + 1
+            for ch in range(4):
+                name = f"ADC #{cnt} in {ch}"
+                ports[name] = _create_port(adr, cnt, ch)
         return ports
 
     @staticmethod
     def _simulated_ports():
-        global adc_count  # pylint: disable=W0603
-
-        adc_count += 1
         deps = ['GPIO 2 in', 'GPIO 2 out']
-        base = f"ADC #{adc_count} in "
+        base = "ADC #1 in "
+        adr = DriverADS1115.ADDRESSES[0]
         return {
             base + str(i):
-            IoPort(PortFunc.Ain, AInDriver,
-                   {"cnt": adc_count, "in": i, "fake": True},
+            IoPort(PortFunc.Ain, DriverADS1115,
+                   {"adr": adr, "cnt": 1, "in": i, "fake": True},
                    deps)
             for i in range(4)
         }
@@ -148,70 +458,40 @@ class DriverADS1115(AInDriver):
         super().__init__(cfg, func)
         cnt = int(cfg['cnt'])
         adr = int(cfg['adr'])
-        inp = int(cfg['in'])
+        self._inp: int = int(cfg['in'])
         self.gain: float = float(cfg.get('gain', -16))
         self.cfg: dict[str, str] = cfg
-        self.name: str = f'ADC #{cnt} (ADS1115 @0x{adr:02X} in {inp}'
+        self.name: str = f'ADC #{cnt} (ADS1115 @0x{adr:02X} in {self._inp}'
+        if self._fake:
+            self.name = '!' + self.name
 
-        i2c = busio.I2C(board.SCL, board.SDA)
-        self._ads = ADS1115(i2c, address=adr, gain=abs(self.gain))
-        self._ana_in: AnalogIn = AnalogIn(self._ads, inp)
-        self._median_filter: bool = True  # const ATM
+        bus = I2cBus.get(fake=self._fake)
 
-    def close(self) -> None:
+        def ads_factory():
+            if bus.is_fake:
+                return FakeADS1115(address=adr, gain=abs(self.gain))
+            return ADS1115(bus.i2c, address=adr, gain=abs(self.gain))
+
+        self._sampler: AdsSampler = AdsSampler.get(bus, adr, ads_factory)
         if self._fake:
-            return super().close()
+            self._sampler.ads.set_voltage(self._inp, self.initval)
+        interval = cfg.get('scan_interval')
+        rdy_pin = cfg.get('rdy_pin')
+        self._sampler.register(self._inp, self.gain, median=True,
+                               interval=float(interval) if interval else None,
+                               rdy_pin=int(rdy_pin) if rdy_pin is not None else None)
 
-        # return chip to power-on defaults to allow future auto-detect
-        self._ads.gain = 2
-        self._ads.read(0)
+    def close(self) -> None:
+        log.debug('Closing %r', self)
+        if getattr(self, '_sampler', None):
+            self._sampler.unregister(self._inp)
+            self._sampler = None
 
     def read(self) -> float:
-        if self._fake:
-            return super().read()
-
-        self._adjust_gain()
-        if not self._median_filter:
-            self._val = self._ana_in.voltage
-        else:
-            median = [self._ana_in.voltage,
-                      self._ana_in.voltage,
-                      self._ana_in.voltage]
-            log.debug('median %f %f %f', median[0], median[1], median[2])
-            self._val = statistics.median(median)
+        volt = self._sampler.voltage(self._inp) if self._sampler else None
+        if volt is None:
+            raise DriverReadError()
+        self._val = volt
 
         log.info('%s = %f', self.name, self._val)
         return self._val
-
-    def _increase_gain(self):
-        ads = self._ads
-        lower = [g for g in ads.gains if g < ads.gain]
-        if lower:
-            ads.gain = lower[-1]
-
-    def _decrease_gain(self):
-        ads = self._ads
-        higher = [g for g in ads.gains if g > ads.gain]
-        if higher:
-            ads.gain = higher[0]
-
-    def _adjust_gain(self) -> None:
-        """ gain <= 0 is auto-gain.
-            Since there's only a common gain for all channels,
-            we need repeated conversions, and increase I2C traffic.
-        """
-        ads = self._ads
-        ads.gain = abs(self.gain)
-        if self.gain <= 0:
-            val = self._ana_in.value
-
-            while abs(val) > 32300:
-                self._increase_gain()
-                val = self._ana_in.value
-
-            while abs(val) < 16000:
-                self._decrease_gain()
-                val = self._ana_in.value
-
-            self.gain = -ads.gain
-            log.debug('ADS gain %d (%d), digits %f', ads.gain, self.gain, val)
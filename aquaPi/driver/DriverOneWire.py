@@ -3,6 +3,8 @@
 import logging
 from os import path
 import glob
+from time import time, sleep
+from threading import Condition, Event, Lock, Thread
 
 from .base import (AInDriver, IoPort, PortFunc, is_raspi,
                    DriverInvalidAddrError, DriverReadError)
@@ -14,7 +16,221 @@ log.brief = log.warning  # alias, warning is used as brief info, level info is v
 # ========== 1-wire ==========
 
 
+class W1BulkConverter:
+    """ Conversion pipeline for all DS1820 sensors of one 1-wire bus master.
+        A worker thread triggers a simultaneous conversion of all sensors by
+        writing to the master's therm_bulk_read, waits one conversion time,
+        then collects the results of all registered sensors. Reading the
+        sensors' 'temperature' file after a bulk conversion returns the
+        converted value without starting another conversion.
+        Thus N sensors cost one conversion time instead of N, and readers get
+        the latest value from the cache without blocking.
+        The cycle follows the readers: each sensor's driver reports the time
+        between its reads, the bus converts at the shortest of these, timed
+        to finish LEAD seconds before the next read. A reader finding a
+        result older than its max. age, or an implausible one, waits for a
+        conversion started after its request.
+    """
+    # cycle time [s] of the bulk conversions until a reader's period is known
+    INTERVAL = 10.0
+    # shortest cycle time [s]
+    MIN_INTERVAL = 1.0
+    # a conversion should finish this time [s] before the next read
+    LEAD = 0.2
+    # results older than this [s] are converted again on read
+    MAX_AGE = 2.0
+
+    _masters: dict[str, 'W1BulkConverter'] = {}
+    _masters_lock: Lock = Lock()
+
+    @classmethod
+    def get(cls, master: str) -> 'W1BulkConverter | None':
+        """ return the converter of bus master (sysfs folder),
+            or None if the kernel doesn't support bulk conversion
+        """
+        if not path.exists(path.join(master, 'therm_bulk_read')):
+            return None
+        with cls._masters_lock:
+            if master not in cls._masters:
+                cls._masters[master] = W1BulkConverter(master)
+            return cls._masters[master]
+
+    def __init__(self, master: str):
+        self._master: str = master
+        self._trigger: str = path.join(master, 'therm_bulk_read')
+        self._sensors: dict[str, str] = {}  # sysfs adr: temperature file
+        self._results: dict[str, str] = {}  # sysfs adr: last raw reading
+        self._stamps: dict[str, float] = {}  # sysfs adr: time of last reading
+        self._periods: dict[str, float] = {}  # sysfs adr: period of its reader
+        self._lock: Lock = Lock()
+        # conversions started and finished, notified when one finishes
+        self._done: Condition = Condition(self._lock)
+        self._started: int = 0
+        self._finished: int = 0
+        self._next: float = 0.0  # start of the next conversion
+        self._stop: Event = Event()
+        self._wakeup: Event = Event()
+        self._thread: Thread | None = None
+        self.interval: float = self.INTERVAL
+        self.conv_time: float = 0.0
+
+    def __str__(self) -> str:
+        return f'{type(self).__name__}({self._master})'
+
+    def register(self, adr: str, temp_file: str, interval: float | None = None) -> None:
+        with self._lock:
+            self._sensors[adr] = temp_file
+            if interval:
+                self._periods[adr] = interval
+                self._update_interval()
+            self.conv_time = max(self.conv_time, self._read_conv_time(adr))
+            if not self._thread:
+                self._stop.clear()
+                self._next = 0.0
+                self._thread = Thread(name=str(self), target=self._converter, daemon=True)
+                self._thread.start()
+        log.debug('%s: registered %s, %d sensors', self, adr, len(self._sensors))
+
+    def unregister(self, adr: str) -> None:
+        with self._lock:
+            self._sensors.pop(adr, None)
+            self._results.pop(adr, None)
+            self._stamps.pop(adr, None)
+            self._periods.pop(adr, None)
+            self._update_interval()
+            if self._sensors:
+                return
+            thread = self._thread
+            self._thread = None
+            self._stop.set()
+            self._wakeup.set()
+        if thread:
+            thread.join(timeout=2 * self.conv_time + 1)
+
+    def reader_period(self, adr: str, period: float) -> None:
+        """ the reader of sensor adr reads every period seconds,
+            the last read was just now
+        """
+        with self._lock:
+            if adr not in self._sensors:
+                return
+            self._periods[adr] = period
+            shorter = self._update_interval()
+            # finish the conversion just before the reader's next read
+            due = time() + period - self.conv_time - self.LEAD
+            earlier = due < self._next
+            self._next = min(self._next, due)
+        if shorter:
+            log.debug('%s: bulk conversion every %.1f s', self, self.interval)
+        if earlier:
+            self._wakeup.set()
+
+    def _update_interval(self) -> bool:
+        """ convert as often as the most frequent reader reads,
+            return True if the interval got shorter; call with lock held
+        """
+        interval = self.INTERVAL
+        if self._periods:
+            interval = max(self.MIN_INTERVAL, min(self._periods.values()))
+        shorter = interval < self.interval
+        self.interval = interval
+        return shorter
+
+    def result(self, adr: str, max_age: float | None = None) -> str | None:
+        """ return the last raw reading of a sensor, if it's older than
+            max_age [s] wait for a new conversion. None if there's no result.
+        """
+        max_age = self.MAX_AGE if max_age is None else max_age
+        with self._lock:
+            stamp = self._stamps.get(adr)
+        if stamp is None or time() - stamp >= max_age:
+            self.refresh()
+        with self._lock:
+            return self._results.get(adr)
+
+    def refresh(self) -> None:
+        """ wait for a conversion started after this call
+        """
+        with self._lock:
+            target = self._started + 1
+            self._next = 0.0
+            self._wakeup.set()
+            self._done.wait_for(lambda: self._finished >= target or self._stop.is_set(),
+                                timeout=3 * self.conv_time + 1)
+
+    @staticmethod
+    def _read_conv_time(adr: str) -> float:
+        conv_time = path.join(adr, 'conv_time')
+        try:
+            with open(conv_time, 'r', encoding='ascii') as ct:
+                return int(ct.readline()) / 1000
+        except (OSError, ValueError):
+            return 0.75
+
+    def _convert(self) -> None:
+        with self._lock:
+            self._started += 1
+            current = self._started
+        try:
+            with open(self._trigger, 'w', encoding='ascii') as trig:
+                trig.write('trigger\n')
+            sleep(self.conv_time)
+
+            # -1 = conversion in progress, 1 = results waiting, 0 = idle
+            deadline = time() + self.conv_time
+            while time() < deadline:
+                with open(self._trigger, 'r', encoding='ascii') as trig:
+                    if trig.readline().strip() != '-1':
+                        break
+                sleep(0.05)
+
+            with self._lock:
+                sensors = self._sensors.copy()
+            for adr, temp_file in sensors.items():
+                try:
+                    with open(temp_file, 'r', encoding='ascii') as temp:
+                        ln = temp.readline()
+                except OSError as ex:
+                    log.debug('%s: %s read failed: %r', self, adr, ex)
+                    ln = ''
+                with self._lock:
+                    self._results[adr] = ln
+                    self._stamps[adr] = time()
+        finally:
+            with self._lock:
+                self._finished = current
+                self._done.notify_all()
+
+    def _converter(self) -> None:
+        log.debug('%s: started', self)
+        while not self._stop.is_set():
+            with self._lock:
+                wait = self._next - time()
+                if wait <= 0:
+                    self._next = time() + self.interval
+            if wait > 0:
+                self._wakeup.wait(wait)
+                self._wakeup.clear()
+                continue
+            try:
+                self._convert()
+            except OSError:
+                log.exception('%s: bulk conversion failed', self)
+        with self._lock:
+            self._done.notify_all()
+        log.debug('%s: stopped', self)
+
+
 class DriverDS1820(AInDriver):
+    CACHE_DISCOVERY = True
+
+    @staticmethod
+    def fingerprint() -> str | None:
+        """ the ids of all 1-wire sensors
+        """
+        return ','.join(sorted(path.basename(sensor)
+                               for sensor in glob.glob('/sys/bus/w1/devices/28-*')))
+
     @staticmethod
     def find_ports() -> dict[str, IoPort]:
         io_ports = {}
@@ -47,7 +263,16 @@ class DriverDS1820(AInDriver):
             Parasitic power is supported; the typical read error of 85°C
             resulting from this (on cheap sensors?) triggers retrys before
             an exception is raised,
+            If the kernel supports it, all sensors of one bus master are
+            converted at once by a shared W1BulkConverter, and read()
+            returns the latest cached conversion result, unless it's older
+            than max_age or 85°C, then it waits for a new conversion.
             cfg = { adr : string  # 1-wire bus adr, see DriverDS1820.find()
+                  , bulk: True    # allow bulk conversion, if supported
+                  , bulk_interval: 10  # secs between bulk conversions,
+                                       # default follows the reads
+                  , max_age: 2    # secs a cached bulk result stays valid,
+                                  # default is bulk_interval + 2, if set
                   , fake: False   # force driver simulation even on Raspi
                   }
             Fake is always set on non-Raspi.
@@ -69,30 +294,66 @@ class DriverDS1820(AInDriver):
             if not path.exists(self._sysfs_adr):
                 raise DriverInvalidAddrError(self._sysfs_adr)
             self._temp: str = path.join(self._sysfs_adr, 'temperature')
+            self._bulk: W1BulkConverter | None = None
+            self._max_age: float = W1BulkConverter.MAX_AGE
+            self._last_read: float = 0.0
+            self._report_period: bool = not cfg.get('bulk_interval')
             if not path.exists(self._temp):
                 self._temp = path.join(self._sysfs_adr, 'w1_slave')
+            elif cfg.get('bulk', True):
+                # sensor folder is a symlink into its bus master's folder
+                master = path.dirname(path.realpath(self._sysfs_adr))
+                self._bulk = W1BulkConverter.get(master)
+                if self._bulk:
+                    interval = cfg.get('bulk_interval')
+                    self._max_age = float(cfg.get('max_age', 0)) or (
+                        float(interval) + W1BulkConverter.MAX_AGE if interval
+                        else W1BulkConverter.MAX_AGE)
+                    self._bulk.register(self._sysfs_adr, self._temp,
+                                        float(interval) if interval else None)
+                    log.debug('%s uses bulk conversion of %s', self.name, master)
         else:
             self._val = self.initval
             self._dir: int = 1
 
+    def close(self) -> None:
+        # called by __del__ too, possibly after a failed __init__ or
+        # during interpreter shutdown, when module globals are gone
+        bulk = getattr(self, '_bulk', None)
+        if bulk:
+            self._bulk = None
+            bulk.unregister(self._sysfs_adr)
+
     def read(self) -> float:
         if self._fake:
             return super().read()
 
-        with open(self._temp, 'r', encoding='ascii') as temp:
-            ln = temp.readline()
-            if self._temp[-8:] == 'w1_slave':
+        if self._bulk and self._report_period:
+            now = time()
+            if self._last_read:
+                self._bulk.reader_period(self._sysfs_adr, now - self._last_read)
+            self._last_read = now
+        ln = None
+        if self._bulk:
+            ln = self._bulk.result(self._sysfs_adr, self._max_age)
+            if ln == '85000\n':
+                # power-on value, likely a failed conversion, don't wait for the next cycle
+                ln = self._bulk.result(self._sysfs_adr, 0.)
+        if ln is None:
+            with open(self._temp, 'r', encoding='ascii') as temp:
                 ln = temp.readline()
-                ln = ln[29:]  # e.g. '90 01 4b 46 7f ff 0c 10 33 t=25000'
-            log.debug('%s = %s', self.name, ln)
-            if ln and not ln == '85000\n':
-                val = float(ln) / 1000
-                self._val = val
-                self._err_cnt = 0
-            elif self._err_cnt <= self._err_retry:
-                self._err_cnt += 1
-            else:
-                raise DriverReadError()
+                if self._temp[-8:] == 'w1_slave':
+                    ln = temp.readline()
+                    ln = ln[29:]  # e.g. '90 01 4b 46 7f ff 0c 10 33 t=25000'
+        log.debug('%s = %s', self.name, ln)
+        if ln and not ln == '85000\n':
+            val = float(ln) / 1000
+            self._val = val
+            self._err_cnt = 0
+        elif self._err_cnt <= self._err_retry:
+            self._err_cnt += 1
+        else:
+            raise DriverReadError()
 
         log.info('%s = %s', self.name, self._val)
         return float(self._val)
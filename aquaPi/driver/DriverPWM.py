@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 import logging
+import os
 from os import path
 from time import sleep
 
@@ -11,7 +12,7 @@ except (RuntimeError, ModuleNotFoundError):
     def gpio_function(_: int):
         return 0
 
-from .base import (OutDriver, IoPort, PortFunc, PinFunc, is_raspi)
+from .base import (OutDriver, IoPort, PortFunc, PinFunc, is_raspi, DriverWriteError)
 
 
 log = logging.getLogger('driver.DriverPWM')
@@ -33,7 +34,10 @@ class DriverPWMbase(OutDriver):
 
 class DriverPWM(DriverPWMbase):
     """ one PWM channel, hardware PWM
+        The sysfs files 'duty_cycle' and 'enable' stay open for the driver's
+        lifetime, and are only written when their value changes.
     """
+    PERIOD = 3333333  # ns
 
     @staticmethod
     def find_ports() -> dict[str, IoPort]:
@@ -71,10 +75,13 @@ class DriverPWM(DriverPWMbase):
         super().__init__(cfg, func)
 
         self.name: str = 'PWM %d @ pin %d' % (self._channel, self._pin)
+        self._duty_fd: int | None = None
+        self._enable_fd: int | None = None
+        self._duty: int | None = None
+        self._enabled: bool | None = None
         if not self._fake:
-            ##breakpoint()
             self.name = 'PWM %d @ sysfs' % self._channel
-            self._pwmchip: str = '/sys/class/pwm/pwmchip0'
+            self._pwmchip: str = cfg.get('pwmchip', '/sys/class/pwm/pwmchip0')
             self._pwmchannel: str = path.join(self._pwmchip, 'pwm%d' % self._channel)
 
             if not path.exists(self._pwmchannel):
@@ -87,9 +94,10 @@ class DriverPWM(DriverPWMbase):
                 log.debug('Created sysfs PWM channel %d', self._channel)
 
             with open(path.join(self._pwmchannel, 'period'), 'wt', encoding='ascii') as p:
-                p.write('3333333')
-            with open(path.join(self._pwmchannel, 'enable'), 'wt', encoding='ascii') as p:
-                p.write('0')
+                p.write('%d' % self.PERIOD)
+            self._duty_fd = os.open(path.join(self._pwmchannel, 'duty_cycle'), os.O_WRONLY)
+            self._enable_fd = os.open(path.join(self._pwmchannel, 'enable'), os.O_WRONLY)
+            self._set_enable(False)
         else:
             self.name = '!' + self.name
 
@@ -97,18 +105,39 @@ class DriverPWM(DriverPWMbase):
 
     def close(self) -> None:
         log.debug('Closing %r', self)
-        if not self._fake:
-            with open(path.join(self._pwmchannel, 'enable'), 'wt', encoding='ascii') as p:
-                p.write('0')
-            log.debug('Removed sysfs PWM channel %d', self._channel)
+        if getattr(self, '_enable_fd', None) is not None:
+            self._set_enable(False)
+            os.close(self._enable_fd)
+            self._enable_fd = None
+            log.debug('Disabled sysfs PWM channel %d', self._channel)
+        if getattr(self, '_duty_fd', None) is not None:
+            os.close(self._duty_fd)
+            self._duty_fd = None
+
+    @staticmethod
+    def _sysfs_write(fd: int, value: int) -> None:
+        # sysfs attributes take each write() as a complete new value,
+        # rewind and truncate anyway, a regular file would grow otherwise
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.ftruncate(fd, 0)
+        os.write(fd, b'%d' % value)
+
+    def _set_enable(self, enable: bool) -> None:
+        if enable != self._enabled and self._enable_fd is not None:
+            self._sysfs_write(self._enable_fd, 1 if enable else 0)
+            self._enabled = enable
 
     def write(self, value: float) -> None:
         log.info('%s -> %f', self.name, float(value))
         if not self._fake:
-            if not path.exists(self._pwmchannel):
-                breakpoint()
-            with open(path.join(self._pwmchannel, 'duty_cycle'), 'wt', encoding='ascii') as p:
-                p.write('%d' % int(value / 100.0 * 3333333))
-            with open(path.join(self._pwmchannel, 'enable'), 'wt', encoding='ascii') as p:
-                p.write('1' if value > 0 else '0')
+            if self._duty_fd is None:
+                raise DriverWriteError('%s is closed.' % self.name)
+            duty = int(value / 100.0 * self.PERIOD)
+            try:
+                if duty != self._duty:
+                    self._sysfs_write(self._duty_fd, duty)
+                    self._duty = duty
+                self._set_enable(value > 0)
+            except OSError as ex:
+                raise DriverWriteError('%s: %s' % (self.name, ex)) from ex
         self._val = float(value)
@@ -4,7 +4,9 @@ import logging
 import sys
 import os
 from os import path
-from threading import Lock, Timer
+from time import monotonic
+from threading import Condition, Lock, Thread
+from typing import Any
 
 # not nice, but how else do you import a package from a git submodule?
 sys.path.insert(1, path.join(os.path.dirname(os.path.abspath(__file__)), 'tc420','tc420'))
@@ -20,25 +22,68 @@ log.brief = log.warning  # alias, warning is used as brief info, level info is v
 # ========== PWM ==========
 
 
+class FakeTC420:
+    """ A transport standing in for a TC420 on USB, it records the
+        packets sent instead.
+    """
+    def __init__(self, dev_index: int = 0):
+        self.dev_index: int = dev_index
+        self.sent: list[Any] = []
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}(#{self.dev_index + 1}, {len(self.sent)} packets)'
+
+    def time_sync(self) -> None:
+        pass
+
+    def send(self, packet: Any) -> None:
+        log.debug('  fake TC420 #%d: %r', self.dev_index + 1, packet)
+        self.sent.append(packet)
+
+
 class DriverTC420(OutDriver):
     """ the popular 5-channel LED controller TC420/421
         connected via USB - no clue whether it could be driven via WiFi
+
+        Channel writes are coalesced: a single writer thread sends
+        at most one PlaySetChannels per device every FLUSH_INTERVAL,
+        with all 5 channels, and repeats it every KEEPALIVE seconds.
+        A device failing to write is retried with a growing delay,
+        up to RETRY_MAX.
     """
-    devices: list[TC420] = []    # each entry is a TC420 instance
+    # min. time [s] between two updates of a device
+    FLUSH_INTERVAL = 0.1
+    # TC420 aborts play mode after ~10sec without communication
+    KEEPALIVE = 9.0
+    # max. delay [s] between retries of a failing device
+    RETRY_MAX = 60.0
+
+    devices: list[TC420 | FakeTC420] = []  # each entry is a TC420 instance
     ports: list[list[int]] = []  # echo entry is a list of 5 channel values of 1 TC420
-    _writer_lock: Lock = Lock()
-    _writer_timer: Timer | None = None
+    _dirty: set[int] = set()     # indices of devices with changed channels
+    _sent: dict[int, float] = {}  # index -> time of last PlaySetChannels
+    _failed: dict[int, int] = {}  # index -> count of consecutive failed writes
+    # protects the above, never held during USB I/O
+    _writer_cond: Condition = Condition()
+    # serializes USB I/O, taken before _writer_cond
+    _io_lock: Lock = Lock()
+    _writer_thread: Thread | None = None
 
     @staticmethod
     def find_ports() -> dict[str, IoPort]:
         io_ports = {}
+        # devices found by an earlier call are kept, with their channels
+        with DriverTC420._writer_cond:
+            devices = [tc for tc in DriverTC420.devices if not isinstance(tc, FakeTC420)]
+            ports = DriverTC420.ports[:len(devices)]
+        idx = 0
         try:
-            idx = 0
             while True:
-                tc = TC420(dev_index=idx)
-                tc.time_sync()
-                DriverTC420.devices[idx] = tc
-                DriverTC420.devices[idx] = [0, 0, 0, 0, 0]
+                if idx == len(devices):
+                    tc = TC420(dev_index=idx)
+                    tc.time_sync()
+                    devices.append(tc)
+                    ports.append([0, 0, 0, 0, 0])
                 for ch in range(5):
                     port_name = f'TC420 #{idx + 1} CH{ch + 1}'
                     io_ports[port_name] = IoPort(PortFunc.Aout,
@@ -49,12 +94,17 @@ class DriverTC420(OutDriver):
         except NoDeviceFoundError:
             # fake when no TC420 found
             if not is_raspi() and idx == 0:
+                devices.append(FakeTC420(0))
+                ports.append([0, 0, 0, 0, 0])
                 io_ports = {
                     'TC420 #1 CH1': IoPort(PortFunc.Aout, DriverTC420,
                                            {'idx': '0', 'channel': '0', 'fake': True}, []),
                     'TC420 #1 CH2': IoPort(PortFunc.Aout, DriverTC420,
                                            {'idx': '0', 'channel': '1', 'fake': True}, [])
                 }
+        with DriverTC420._writer_cond:
+            DriverTC420.devices = devices
+            DriverTC420.ports = ports
         return io_ports
 
     def __init__(self, cfg: dict[str, str], func: PortFunc):
@@ -69,42 +119,104 @@ class DriverTC420(OutDriver):
         if self._fake:
             self.name = '!' + self.name
 
-        if not self._fake:
-            log.debug('  PlayInitPacket %r', self)
-            tc = DriverTC420.devices[self._idx]
-            tc.send(PlayInitPacket('aquaPi'))
+        log.debug('  PlayInitPacket %r', self)
+        with DriverTC420._io_lock:  # nodes may be created in parallel
+            DriverTC420.devices[self._idx].send(PlayInitPacket('aquaPi'))
 
         self.write(0)
 
     def close(self) -> None:
-        if not self._fake:
-            self.write(0)
-            log.debug('  ModeStopPacket %r', self)
-            tc = DriverTC420.devices[self._idx]
-            tc.send(ModeStopPacket())
+        self.write(0)
+        DriverTC420._flush(self._idx)
+        log.debug('  ModeStopPacket %r', self)
+        with DriverTC420._io_lock:
+            DriverTC420.devices[self._idx].send(ModeStopPacket())
 
     def write(self, value: float):
         log.info('%s -> %r', self.name, value)
         value = int(value + .9999)  if value else 0  # lowest dim value -> 1%
-        if not self._fake:
-            with self._writer_lock:
-                ports = DriverTC420.ports[self._idx]
+        with DriverTC420._writer_cond:
+            ports = DriverTC420.ports[self._idx]
+            if ports[self._channel] != value or self._idx not in DriverTC420._sent:
                 ports[self._channel] = value
-            DriverTC420._writer()
+                DriverTC420._dirty.add(self._idx)
+            if not DriverTC420._writer_thread:
+                DriverTC420._writer_thread = Thread(name='TC420', target=DriverTC420._writer,
+                                                    daemon=True)
+                DriverTC420._writer_thread.start()
+            DriverTC420._writer_cond.notify()
         self._val = value
 
     @staticmethod
-    def _writer():
-        ''' TC420 aborts play mode after ~10sec without communication.
-            This function writes and reschedules itself until cancelled.
-        '''
-        with DriverTC420._writer_lock:
-            if DriverTC420._writer_timer:
-                DriverTC420._writer_timer.cancel()
+    def _flush(idx: int) -> None:
+        """ send all channels of device idx now, the channels are
+            copied under the lock, the USB transfer runs without it
+        """
+        with DriverTC420._io_lock:
+            with DriverTC420._writer_cond:
+                channels = list(DriverTC420.ports[idx])
+                tc = DriverTC420.devices[idx]
+                DriverTC420._sent[idx] = monotonic()
+                DriverTC420._dirty.discard(idx)
+            log.debug('  PlaySetChannels #%d: %r', idx + 1, channels)
+            tc.send(PlaySetChannels(channels))
 
-            for idx, device in enumerate(DriverTC420.devices):
-                log.debug('  PlaySetChannels #%d: %r', idx + 1, device[1])
-                device[0].send(PlaySetChannels(device[1]))
+    @staticmethod
+    def _retry_delay(idx: int) -> float:
+        """ delay after the last write of a failing device, doubles with
+            each failure, starting with FLUSH_INTERVAL
+        """
+        failed = DriverTC420._failed.get(idx, 0)
+        if not failed:
+            return 0.
+        return min(DriverTC420.RETRY_MAX, DriverTC420.FLUSH_INTERVAL * 2 ** min(failed, 16))
 
-            DriverTC420._writer_timer = Timer(9, DriverTC420._writer)
-            DriverTC420._writer_timer.start()
+    @staticmethod
+    def _writer():
+        ''' Send changed channels of each device, at most every FLUSH_INTERVAL,
+            and a keepalive after KEEPALIVE seconds without update.
+        '''
+        cond = DriverTC420._writer_cond
+        while True:
+            with cond:
+                now = monotonic()
+                wake = now + DriverTC420.KEEPALIVE
+                due_idx = []
+                for idx in range(len(DriverTC420.devices)):
+                    if idx not in DriverTC420._sent and idx not in DriverTC420._dirty:
+                        continue  # never written, nothing to keep alive
+                    last = DriverTC420._sent.get(idx, 0.)
+                    if idx in DriverTC420._dirty:
+                        due = last + max(DriverTC420.FLUSH_INTERVAL,
+                                         DriverTC420._retry_delay(idx))
+                    else:
+                        due = last + DriverTC420.KEEPALIVE
+                    if due <= now:
+                        due_idx.append(idx)
+                        due = now + DriverTC420.FLUSH_INTERVAL
+                    wake = min(wake, due)
+                if not due_idx:
+                    cond.wait(timeout=max(0., wake - monotonic()))
+                    continue
+
+            for idx in due_idx:
+                try:
+                    DriverTC420._flush(idx)
+                except Exception as ex:
+                    with cond:
+                        DriverTC420._dirty.add(idx)  # retry after the delay
+                        failed = DriverTC420._failed.get(idx, 0) + 1
+                        DriverTC420._failed[idx] = failed
+                        delay = DriverTC420._retry_delay(idx)
+                    if failed == 1:
+                        log.exception('TC420 #%d: write failed, retry in %.1f s',
+                                      idx + 1, delay)
+                    else:
+                        log.info('TC420 #%d: write failed %d times, retry in %.1f s: %s',
+                                 idx + 1, failed, delay, ex)
+                else:
+                    with cond:
+                        failed = DriverTC420._failed.pop(idx, 0)
+                    if failed:
+                        log.brief('TC420 #%d: write succeeded after %d failures',
+                                  idx + 1, failed)
@@ -4,6 +4,8 @@ import logging
 from socket import gaierror
 import smtplib
 from email.message import EmailMessage
+from time import monotonic
+from threading import Condition, Thread
 import requests
 
 from . import driver_config
@@ -19,28 +21,132 @@ log.brief = log.warning  # alias, warning is used as brief info, level info is v
 
 class DriverText(OutDriver):
     """ abstract base of text (output) drivers such as email, Telegram, display
+
+        write() only queues the text, a background thread of each driver
+        delivers it through _deliver(). Texts arriving within MERGE_WINDOW
+        are merged into one message. Failed deliveries are retried with
+        exponentially growing delay, texts queued meanwhile join the retry.
     """
+    # texts arriving within this time [s] after the first are merged
+    MERGE_WINDOW = 5.0
+    # retry delay [s] doubles from RETRY_MIN up to RETRY_MAX ...
+    RETRY_MIN = 2.0
+    RETRY_MAX = 300.0
+    # ... a message is dropped after this count of attempts
+    RETRY_CNT = 10
 
     def __init__(self, cfg: dict[str, str], func: PortFunc):
         super().__init__(cfg, func)
         self.name: str = '!abstract TEXT'
         self._val = ''
+        self._queue: list[str] = []
+        self._first: float = 0.0  # arrival of oldest queued text
+        self._closing: bool = False
+        self._cond: Condition = Condition()
+        self._sender_thread: Thread | None = None
+
+    def close(self) -> None:
+        """ deliver queued texts without delay, then end the sender
+        """
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
 
     # pylint: disable-next=arguments-renamed
     def write(self, subj_text: str) -> None:
         """ 1st line of subj_text is headline, rest is body
         """
         self._val = subj_text
+        with self._cond:
+            if not self._queue:
+                self._first = monotonic()
+            self._queue.append(subj_text)
+            if not self._sender_thread:
+                self._sender_thread = Thread(name=self.name, target=self._sender, daemon=True)
+                self._sender_thread.start()
+            self._cond.notify()
 
     def read(self) -> list[str]:
         """ read previously written text
         """
         return self._val
 
+    def _deliver(self, subj_text: str) -> None:
+        """ send one message, raise an exception on failure
+        """
+
+    @staticmethod
+    def _merge(texts: list[str]) -> str:
+        """ combine several texts to one, keeping 1st line as headline
+            A common headline is not repeated in the body, otherwise
+            the first one is counted up, e.g. "Temp above 28 (+2)".
+        """
+        if len(texts) == 1:
+            return texts[0]
+        heads = [txt.split('\n', 1)[0] for txt in texts]
+        if len(set(heads)) == 1:
+            head = heads[0]
+            bodies = [txt.split('\n', 1)[1] for txt in texts if '\n' in txt]
+        else:
+            head = f'{heads[0]} (+{len(texts) - 1})'
+            bodies = texts
+        return '\n'.join([head] + (['\n\n'.join(bodies)] if bodies else []))
+
+    def _take_queue(self) -> list[str]:
+        with self._cond:
+            texts, self._queue = self._queue, []
+            return texts
+
+    def _sender(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue and not self._closing:
+                    self._cond.wait()
+                # collect more texts until the merge window closes
+                while not self._closing:
+                    remain = self._first + self.MERGE_WINDOW - monotonic()
+                    if remain <= 0:
+                        break
+                    self._cond.wait(timeout=remain)
+                if not self._queue:
+                    self._sender_thread = None
+                    break  # closing
+
+            texts = self._take_queue()
+            delay = self.RETRY_MIN
+            for attempt in range(1, self.RETRY_CNT + 1):
+                text = self._merge(texts)
+                try:
+                    self._deliver(text)
+                    log.info('%s delivered %d text(s)', self.name, len(texts))
+                    break
+                except Exception as ex:
+                    log.warning('%s delivery attempt %d failed: %s', self.name, attempt, ex)
+                    # write() notifies too, don't let it shorten the delay
+                    retry = monotonic() + delay
+                    with self._cond:
+                        while not self._closing:
+                            remain = retry - monotonic()
+                            if remain <= 0:
+                                break
+                            self._cond.wait(timeout=remain)
+                    delay = min(delay * 2, self.RETRY_MAX)
+                    texts += self._take_queue()
+            else:
+                log.error('%s dropped message after %d attempts: %r',
+                          self.name, self.RETRY_CNT, text)
+        self._disconnect()
+
+    def _disconnect(self) -> None:
+        """ release connections when closed
+        """
+
 
 class DriverEmail(DriverText):
     """ this driver produces email from a text
     """
+    LAZY_DISCOVERY = True
+    DISCOVERY_TIMEOUT = 30.0
 
     @staticmethod
     def find_ports() -> dict[str, IoPort]:
@@ -91,8 +197,34 @@ class DriverEmail(DriverText):
         super().__init__(cfg, func)
         self._cfg = cfg.copy()
         self.name = f'Email({self._cfg["to"]})'
+        self._smtp: smtplib.SMTP | None = None
 
-    def write(self, subj_text: str) -> None:
+    def _disconnect(self) -> None:
+        smtp, self._smtp = self._smtp, None
+        if smtp:
+            try:
+                smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                smtp.close()  # quit() leaves the socket open when it fails
+
+    def _session(self) -> smtplib.SMTP:
+        """ return the SMTP session, (re-)connect if it's gone
+        """
+        if self._smtp:
+            try:
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._disconnect()
+        smtp = smtplib.SMTP(self.cfg['server'], timeout=30)
+        # smtp.set_debuglevel(1)
+        smtp.starttls()
+        smtp.login(self.cfg['login'], self.cfg['pwd'])
+        self._smtp = smtp
+        return smtp
+
+    def _deliver(self, subj_text: str) -> None:
         """ 1st line is used as subject, rest is body
             If only single line, body will repeat the subject.
         """
@@ -109,14 +241,10 @@ class DriverEmail(DriverText):
 
         log.info('%s -> %r', self.name, subj_text)
         try:
-            with smtplib.SMTP(self.cfg['server']) as smtp:
-                # smtp.set_debuglevel(1)
-                smtp.starttls()
-                smtp.login(self.cfg['login'], self.cfg['pwd'])
-                smtp.send_message(msg)
+            self._session().send_message(msg)
         except Exception:
-            log.exception('Atempt to send email: ')
-        self._val = subj_text
+            self._disconnect()  # reconnect with the retry
+            raise
 
 
 class DriverTelegram(DriverText):
@@ -138,10 +266,13 @@ Note: if you don’t send your Telegram bot a message, your results might be emp
 A bad caveat:
 see _local/telegram_supergroup.log for sequence of supergroup upgrade messages
     """
+    LAZY_DISCOVERY = True
+    DISCOVERY_TIMEOUT = 30.0
 
     @staticmethod
-    def _bot_request(url: str, api: str, json: str = "") -> str:
-        res = requests.post(f"{url}{api}", json=json, timeout=10).json()
+    def _bot_request(url: str, api: str, json: str = "",
+                     session: requests.Session | None = None) -> str:
+        res = (session or requests).post(f"{url}{api}", json=json, timeout=10).json()
         if not res['ok']:
             raise DriverConfigError()
         return res['result']
@@ -178,7 +309,7 @@ see _local/telegram_supergroup.log for sequence of supergroup upgrade messages
                           idx + 1, cfg)
                 raise DriverConfigError()
 
-            url = f"https://api.telegram.org/bot{cfg['bot_token']}/"
+            url = f"{cfg.get('api', 'https://api.telegram.org')}/bot{cfg['bot_token']}/"
             try:
                 res = DriverTelegram._bot_request(url, 'getMe')
 # res = {"id":813504918,"is_bot":true,"first_name":"zuHause","username":"Schwabix_bot","can_join_groups":true,"can_read_all_group_messages":false,"supports_inline_queries":false,"can_connect_to_business":false,"has_main_web_app":false}
@@ -225,15 +356,15 @@ see _local/telegram_supergroup.log for sequence of supergroup upgrade messages
         super().__init__(cfg, func)
         self._cfg = cfg.copy()
         self.name = f'Telegram({self._cfg["chat_name"]})'
+        self._http: requests.Session = requests.Session()  # keeps the connection
 
-    def write(self, subj_text: str) -> None:
+    def _disconnect(self) -> None:
+        self._http.close()
+
+    def _deliver(self, subj_text: str) -> None:
         """ all lines are sent as one message
         """
-        try:
-            payload = {"chat_id": self.cfg['chat_id'], 'text': subj_text}
-            res = DriverTelegram._bot_request(self.cfg['url'], 'sendMessage', json=payload)
-            log.info('%s -> %r : %r', self.name, subj_text, res)
-        except Exception:
-            log.exception('%s failed to send Telegram message with error: ', self.name)
-
-        self._val = subj_text
+        payload = {"chat_id": self.cfg['chat_id'], 'text': subj_text}
+        res = DriverTelegram._bot_request(self.cfg['url'], 'sendMessage', json=payload,
+                                          session=self._http)
+        log.info('%s -> %r : %r', self.name, subj_text, res)
@@ -3,8 +3,13 @@
 import logging
 import importlib.util
 import sys
+import os
 from os import path
 import glob
+import json
+from threading import (Lock, RLock, Thread)
+from time import monotonic
+from typing import (Any, Iterable)
 
 from .base import (IoPort, PortFunc, Driver,
                    DriverPortInuseError, DriverInvalidPortError, DriverParamError)
@@ -71,12 +76,23 @@ class IoRegistry(object):
     """
 
     _map: dict[str, IoPort] = {}
+    # indexes of _map by function, split into free and used ports
+    _free: dict[PortFunc, dict[str, IoPort]] = {func: {} for func in PortFunc}
+    _used: dict[PortFunc, dict[str, IoPort]] = {func: {} for func in PortFunc}
+    # protects _map, the indexes and IoPort.used
+    _lock: RLock = RLock()
+    _lazy: set[type[Driver]] = set()
+    _lazy_lock: Lock = Lock()
+    # per driver class: {'state': ok/cached/timeout/error/lazy, 'time': [s], 'ports': count}
+    discovery: dict[str, dict[str, Any]] = {}
+    # version of the discovery cache file format
+    CACHE_VERSION = 1
 
     @classmethod
     def get(cls) -> 'IoRegistry':
         return _io_reg
 
-    def __init__(self):
+    def __init__(self, cache_file: str = ''):
         # iterate all class imports from a module, then call each class' port enumerator
         # https://stackoverflow.com/questions/7584418/iterate-the-classes-defined-in-a-module-imported-dynamically
         # https://stackoverflow.com/questions/4821104/dynamic-instantiation-from-string-name-of-a-class-in-dynamically-imported-module
@@ -99,25 +115,228 @@ class IoRegistry(object):
                             if type(cl) is type and issubclass(cl, Driver)}
             drv_classes |= mod_drivers
 
-        for drv in drv_classes:
-            if hasattr(drv, 'find_ports'):
-                drv_ports = drv.find_ports()
-                log.info('Driver %s reported ports %r', drv.__name__, [k for k in drv_ports])
-
-                # TODO: reject duplicate ports, same port should in theory not be reported
-                #      by multiple drivers, but better play safe: len(_map.keys() & drv_ports.keys()) > 0
-                IoRegistry._map.update(drv_ports)
+        drv_classes = {drv for drv in drv_classes if hasattr(drv, 'find_ports')}
+        IoRegistry._lazy = {drv for drv in drv_classes if drv.LAZY_DISCOVERY}
+        for drv in IoRegistry._lazy:
+            IoRegistry.discovery[drv.__name__] = {'state': 'lazy', 'time': 0.0, 'ports': 0}
+
+        # warm start: take ports of drivers with CACHE_DISCOVERY from cache file
+        self._cache_file: str = cache_file
+        self._cache: dict[str, Any] = {}
+        cached = self._load_cache(drv_classes - IoRegistry._lazy)
+        for drv, drv_ports in cached.items():
+            self._add_ports(drv_ports)
+            IoRegistry.discovery[drv.__name__] = {'state': 'cached', 'time': 0.0,
+                                                  'ports': len(drv_ports)}
+
+        found = self._discover(drv_classes - IoRegistry._lazy - cached.keys())
+        for drv_ports in found.values():
+            # TODO: reject duplicate ports, same port should in theory not be reported
+            #      by multiple drivers, but better play safe: len(_map.keys() & drv_ports.keys()) > 0
+            self._add_ports(drv_ports)
+        self._save_cache(found)
 
         log.brief('Port drivers found for:')
         log.brief('%r', [k for k in sorted(IoRegistry._map)])
 
-    def get_ports_by_function(self, funcs: list[PortFunc], in_use: bool = False
+        if cached:
+            Thread(name='IoRevalidate', target=self._revalidate,
+                   args=(set(cached.keys()),), daemon=True).start()
+
+    def _load_cache(self, drv_classes: Iterable[type[Driver]]
+                    ) -> dict[type[Driver], dict[str, IoPort]]:
+        """ Return the cached ports of drivers supporting CACHE_DISCOVERY,
+            if their hardware fingerprint still matches.
+        """
+        if not self._cache_file or not path.exists(self._cache_file):
+            return {}
+        try:
+            with open(self._cache_file, 'r', encoding='utf8') as f_in:
+                cache = json.load(f_in)
+            if cache.get('version') != IoRegistry.CACHE_VERSION:
+                log.brief('Discovery cache %s is outdated, ignored', self._cache_file)
+                return {}
+        except (OSError, ValueError):
+            log.exception('Discovery cache %s is unreadable, ignored', self._cache_file)
+            return {}
+
+        self._cache = cache.get('drivers', {})
+        cached: dict[type[Driver], dict[str, IoPort]] = {}
+        for drv in drv_classes:
+            entry = self._cache.get(drv.__name__)
+            if not drv.CACHE_DISCOVERY or not entry:
+                continue
+            if entry['fingerprint'] != drv.fingerprint():
+                log.brief('Driver %s: hardware changed, discovering ports', drv.__name__)
+                continue
+            cached[drv] = {name: IoPort(PortFunc[port['func']], drv, port['cfg'], port['deps'])
+                           for name, port in entry['ports'].items()}
+        return cached
+
+    def _save_cache(self, found: dict[type[Driver], dict[str, IoPort]]) -> None:
+        """ update the cache file with ports of drivers supporting CACHE_DISCOVERY
+        """
+        if not self._cache_file:
+            return
+        changed = False
+        for drv, drv_ports in found.items():
+            if not drv.CACHE_DISCOVERY:
+                continue
+            entry = {'fingerprint': drv.fingerprint(),
+                     'ports': {name: {'func': port.func.name,
+                                      'cfg': dict(port.cfg),
+                                      'deps': list(port.deps)}
+                               for name, port in drv_ports.items()}}
+            entry = json.loads(json.dumps(entry, default=str))
+            if self._cache.get(drv.__name__) != entry:
+                self._cache[drv.__name__] = entry
+                changed = True
+        if not changed:
+            return
+        try:
+            tmp_file = self._cache_file + '.tmp'
+            with open(tmp_file, 'w', encoding='utf8') as f_out:
+                json.dump({'version': IoRegistry.CACHE_VERSION, 'drivers': self._cache},
+                          f_out, indent=2, default=str)
+            os.replace(tmp_file, self._cache_file)
+            log.info('Discovery cache %s written', self._cache_file)
+        except OSError:
+            log.exception('Failed to write discovery cache %s', self._cache_file)
+
+    def _revalidate(self, drv_classes: set[type[Driver]]) -> None:
+        """ Rediscover drivers started from cache. New ports are added,
+            missing ports are removed unless they are in use.
+        """
+        found = self._discover(drv_classes)
+        for drv, drv_ports in found.items():
+            with IoRegistry._lock:
+                known = {name for name, port in IoRegistry._map.items() if port.driver is drv}
+                for name in drv_ports.keys() - known:
+                    self._add_ports({name: drv_ports[name]})
+                    log.brief('Port %s appeared', name)
+                for name in known - drv_ports.keys():
+                    if IoRegistry._map[name].used:
+                        log.error('Port %s disappeared, but it is in use!', name)
+                    else:
+                        self._remove_port(name)
+                        log.brief('Port %s disappeared', name)
+        self._save_cache(found)
+
+    def _discover(self, drv_classes: Iterable[type[Driver]]
+                  ) -> dict[type[Driver], dict[str, IoPort]]:
+        """ Call find_ports() of all drivers in parallel, each limited
+            to its DISCOVERY_TIMEOUT. A driver exceeding it is left
+            running in its thread, its ports are ignored.
+            Returns the ports of each successful driver.
+        """
+        found: dict[type[Driver], dict[str, IoPort]] = {}
+        drv_classes = list(drv_classes)
+        if not drv_classes:
+            return found
+
+        # daemon threads, a hanging driver must not block the shutdown
+        results: dict[type[Driver], tuple[dict[str, IoPort], float, Exception | None]] = {}
+
+        def timed_find(drv: type[Driver]) -> None:
+            begin = monotonic()
+            try:
+                results[drv] = (drv.find_ports(), monotonic() - begin, None)
+            except Exception as ex:
+                results[drv] = ({}, monotonic() - begin, ex)
+
+        start = monotonic()
+        threads = {drv: Thread(name=f'find_ports {drv.__name__}', target=timed_find,
+                               args=(drv,), daemon=True)
+                   for drv in drv_classes}
+        for thread in threads.values():
+            thread.start()
+        for drv, thread in threads.items():
+            stats: dict[str, Any] = {'state': 'ok', 'time': 0.0, 'ports': 0}
+            thread.join(max(0.0, start + drv.DISCOVERY_TIMEOUT - monotonic()))
+            if drv not in results:
+                stats.update(state='timeout', time=monotonic() - start)
+                log.error('Driver %s: port discovery timed out after %.1f s',
+                          drv.__name__, stats['time'])
+            else:
+                drv_ports, stats['time'], error = results[drv]
+                if error:
+                    stats['state'] = 'error'
+                    log.error('Driver %s: port discovery failed', drv.__name__, exc_info=error)
+                else:
+                    log.info('Driver %s reported ports %r', drv.__name__, [k for k in drv_ports])
+                    stats['ports'] = len(drv_ports)
+                    found[drv] = drv_ports
+            IoRegistry.discovery[drv.__name__] = stats
+            log.brief('Driver %s: %s, %d ports in %.2f s',
+                      drv.__name__, stats['state'], stats['ports'], stats['time'])
+        return found
+
+    def _resolve_lazy(self) -> None:
+        """ discover ports of all lazy drivers, once
+        """
+        with IoRegistry._lazy_lock:
+            lazy, IoRegistry._lazy = IoRegistry._lazy, set()
+            if lazy:
+                log.brief('Resolving lazy drivers %r', sorted(drv.__name__ for drv in lazy))
+                for drv_ports in self._discover(lazy).values():
+                    self._add_ports(drv_ports)
+
+    def _resolve_lazy_background(self) -> None:
+        """ discover ports of lazy drivers without waiting for them,
+            their ports show up in later calls
+        """
+        if IoRegistry._lazy and not IoRegistry._lazy_lock.locked():
+            Thread(name='IoResolveLazy', target=self._resolve_lazy, daemon=True).start()
+
+    @staticmethod
+    def _add_ports(ports: dict[str, IoPort]) -> None:
+        """ add or replace ports in _map and the indexes
+        """
+        with IoRegistry._lock:
+            for name, io_port in ports.items():
+                if name in IoRegistry._map:
+                    IoRegistry._remove_port(name)
+                IoRegistry._map[name] = io_port
+                index = IoRegistry._used if io_port.used else IoRegistry._free
+                index[io_port.func][name] = io_port
+
+    @staticmethod
+    def _remove_port(name: str) -> None:
+        with IoRegistry._lock:
+            io_port = IoRegistry._map.pop(name)
+            IoRegistry._free[io_port.func].pop(name, None)
+            IoRegistry._used[io_port.func].pop(name, None)
+
+    @staticmethod
+    def _count_use(name: str, delta: int) -> None:
+        """ change use count of a port, and move it between the indexes
+            Call with _lock held.
+        """
+        io_port = IoRegistry._map.get(name)
+        if not io_port:
+            log.debug('  no port %r to reserve', name)
+            return
+        io_port.used = max(0, io_port.used + delta)
+        if io_port.used:
+            IoRegistry._free[io_port.func].pop(name, None)
+            IoRegistry._used[io_port.func][name] = io_port
+        else:
+            IoRegistry._used[io_port.func].pop(name, None)
+            IoRegistry._free[io_port.func][name] = io_port
+
+    def get_ports_by_function(self, funcs: Iterable[PortFunc], in_use: bool = False
                               ) -> dict[str, IoPort]:
         """ returns a view of free or used IoPorts filtered by iterable funcs.
+            Lazy drivers are discovered in background, the ports known so
+            far are returned, e.g. a config page doesn't wait for them.
         """
-        mp = IoRegistry._map
-        return {key: mp[key] for key in mp
-                if mp[key].func in funcs and bool(mp[key].used) == in_use}
+        self._resolve_lazy_background()
+        index = IoRegistry._used if in_use else IoRegistry._free
+        with IoRegistry._lock:
+            ports: dict[str, IoPort] = {}
+            for func in funcs:
+                ports.update(index[func])
+            return ports
 
     def driver_factory(self, port: str, drv_options: dict | None = None
                        ) -> Driver | None:
@@ -126,43 +345,43 @@ class IoRegistry(object):
         """
         log.debug('create a driver for %r', port)
         if port not in IoRegistry._map:
-            raise DriverInvalidPortError(port)
-
-        io_port = IoRegistry._map[port]
-        if io_port.used:
-            raise DriverPortInuseError(port)
-
-        try:
+            self._resolve_lazy()
+
+        # reserve port and deps, the driver is created outside of the lock
+        with IoRegistry._lock:
+            io_port = IoRegistry._map.get(port)
+            if not io_port:
+                raise DriverInvalidPortError(port)
+            if io_port.used:
+                raise DriverPortInuseError(port)
+            self._count_use(port, 1)
+            for dep in io_port.deps:
+                self._count_use(dep, 1)
             if drv_options:
                 io_port.cfg.update(drv_options)
-            driver = io_port.driver(io_port.cfg, io_port.func)
-            # same as io_port.used += 1 - on immutable
-            IoRegistry._map[port] = io_port._replace(used=io_port.used + 1)
-
-            for dep in io_port.deps:
-                # same as IoRegistry._map[dep].used += 1
-                dep_port = IoRegistry._map[dep]
-                IoRegistry._map[dep] = dep_port._replace(used=dep_port.used + 1)
+            cfg = io_port.cfg
 
-            return driver
+        try:
+            return io_port.driver(cfg, io_port.func)
         except Exception:
             log.exception('Failed to create port driver: %s', port)
+            with IoRegistry._lock:
+                self._count_use(port, -io_port.used)
+                for dep in io_port.deps:
+                    self._count_use(dep, -1)
             raise
 
     def driver_destruct(self, port: str, driver: Driver) -> None:
         log.debug('destruct driver for %r', port)
-        if port not in IoRegistry._map:
+        io_port = IoRegistry._map.get(port)
+        if not io_port:
             raise DriverInvalidPortError(port)
 
-        io_port = IoRegistry._map[port]
         driver.close()
-        # same as io_port.used = 0
-        IoRegistry._map[port] = io_port._replace(used=0)
-
-        for dep in io_port.deps:
-            # same as IoRegistry._map[dep].used -= 1
-            dep_port = IoRegistry._map[dep]
-            IoRegistry._map[dep] = dep_port._replace(used=dep_port.used - 1)
+        with IoRegistry._lock:
+            self._count_use(port, -io_port.used)
+            for dep in io_port.deps:
+                self._count_use(dep, -1)
 
 
 # ========== IoRegistry is a singleton -> 1 global instance ==========
@@ -173,9 +392,10 @@ class IoRegistry(object):
 from .base import *  # noqa: F403 allow import * for the runtime-imports
 
 
-def create_io_registry():
+def create_io_registry(cache_file: str = ''):
     """ Create the singleton _io_registry, which is accessible as
         IoRegistry.get()
+        Discovered ports of slow drivers are cached in cache_file.
     """
     # pylint: disable-next=W0603
     global _io_reg
@@ -209,4 +429,4 @@ def create_io_registry():
                     drv_spec.loader.exec_module(drv_mod)
                     log.debug('  loaded module %s', drv_mod)
 
-    _io_reg = IoRegistry()
+    _io_reg = IoRegistry(cache_file)
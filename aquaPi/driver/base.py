@@ -4,7 +4,6 @@ import logging
 from typing import Any
 from os import path
 from enum import Enum
-from collections import namedtuple
 import math
 import random
 
@@ -82,7 +81,25 @@ class DriverConfigError(DriverError):
 # ========== common types ==========
 
 
-IoPort = namedtuple('IoPort', 'func driver cfg deps used', defaults=([], 0))
+class IoPort:
+    """ A port reported by a driver's find_ports(): function, driver class,
+        the driver's cfg and the names of ports it depends on.
+        'used' counts the users of the port, it's maintained by IoRegistry
+        under its lock, don't change it elsewhere.
+    """
+    __slots__ = ('func', 'driver', 'cfg', 'deps', 'used')
+
+    def __init__(self, func: 'PortFunc', driver: Any, cfg: dict[str, Any],
+                 deps: list[str] | None = None, used: int = 0):
+        self.func: PortFunc = func
+        self.driver: Any = driver
+        self.cfg: dict[str, Any] = cfg
+        self.deps: list[str] = deps if deps is not None else []
+        self.used: int = used
+
+    def __repr__(self) -> str:
+        return (f'{type(self).__name__}({self.func}, {getattr(self.driver, "__name__", self.driver)}, '
+                f'{self.cfg}, {self.deps}, used={self.used})')
 
 
 class PortFunc(Enum):
@@ -108,7 +125,22 @@ class Driver:
     """ base class of all drivers
         Drivers persist their cinfiguration in dict 'cfg', no need for
         __getstate__/__setstate__ overloads in derived classes.
+        find_ports() of all drivers runs in parallel at startup, limited
+        to DISCOVERY_TIMEOUT. Drivers depending on network services set
+        LAZY_DISCOVERY, their ports are discovered on first use.
+        Drivers with slow discovery set CACHE_DISCOVERY, their ports are
+        taken from a cache file at startup and revalidated in background.
     """
+    LAZY_DISCOVERY: bool = False
+    DISCOVERY_TIMEOUT: float = 10.0
+    CACHE_DISCOVERY: bool = False
+
+    @staticmethod
+    def fingerprint() -> str | None:
+        """ Cheap signature of the attached hardware, a mismatch with the
+            cached one skips the cache. None if there's no cheap check.
+        """
+        return None
 
     # TODO this persistance approach could be transferred to MsgNodes!
     def __init__(self, cfg: dict[str, str], func: PortFunc):
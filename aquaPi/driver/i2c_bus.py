@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+import logging
+from contextlib import contextmanager
+from time import monotonic, sleep
+from threading import Lock, RLock
+from typing import Any, Iterator
+
+
+log = logging.getLogger('driver.i2c_bus')
+log.brief = log.warning  # alias, warning is used as brief info, level info is verbose
+
+
+# ========== I²C bus manager ==========
+
+
+class I2cDeviceStats:
+    """ access statistics of one device address
+    """
+    def __init__(self):
+        self.transactions: int = 0
+        self.errors: int = 0
+        self.busy: float = 0.0   # total time the bus was held [s]
+        self.waited: float = 0.0  # total time spent waiting for the bus [s]
+
+    def __repr__(self) -> str:
+        return (f'{type(self).__name__}(transactions={self.transactions}, errors={self.errors}, '
+                f'busy={self.busy:.3f}s, waited={self.waited:.3f}s)')
+
+
+class I2cBus:
+    """ One shared bus object per physical I²C bus.
+        Drivers get the bus with I2cBus.get() instead of constructing their
+        own busio.I2C, and wrap each logical transfer, e.g. "write config,
+        read result", into 'with bus.transaction(adr):'. This serializes
+        transfers of all threads using the bus, and counts them per device.
+        The lock is re-entrant, nested transactions of one thread are ok.
+
+        A fake bus (no hardware, i2c is None) is returned on systems without
+        I²C; drivers are expected to use a simulated device then.
+    """
+    _buses: dict[tuple[Any, Any], 'I2cBus'] = {}
+    _buses_lock: Lock = Lock()
+
+    @classmethod
+    def get(cls, scl: Any = None, sda: Any = None, fake: bool = False) -> 'I2cBus':
+        """ return the bus on pins scl/sda, default is the board's I²C
+        """
+        if fake:
+            scl = sda = None
+        elif scl is None or sda is None:
+            import board  # type: ignore[import-untyped]
+            scl = board.SCL
+            sda = board.SDA
+
+        key = (getattr(scl, 'id', scl), getattr(sda, 'id', sda))
+        with cls._buses_lock:
+            if key not in cls._buses:
+                cls._buses[key] = I2cBus(scl, sda)
+            return cls._buses[key]
+
+    def __init__(self, scl: Any, sda: Any):
+        self.name: str = 'I²C (fake)'
+        self.i2c: Any = None
+        if scl is not None:
+            import busio  # type: ignore[import-untyped]
+            self.i2c = busio.I2C(scl, sda)
+            self.name = f'I²C SCL {getattr(scl, "id", scl)} SDA {getattr(sda, "id", sda)}'
+        self._lock: RLock = RLock()
+        self._stats: dict[int, I2cDeviceStats] = {}
+        log.debug('%s created', self.name)
+
+    def __str__(self) -> str:
+        return f'{type(self).__name__}({self.name})'
+
+    @property
+    def is_fake(self) -> bool:
+        return self.i2c is None
+
+    @contextmanager
+    def transaction(self, adr: int) -> Iterator[Any]:
+        """ hold the bus for one logical transfer with device adr
+        """
+        begin = monotonic()
+        with self._lock:
+            start = monotonic()
+            stats = self._stats.setdefault(adr, I2cDeviceStats())
+            stats.waited += start - begin
+            stats.transactions += 1
+            try:
+                yield self.i2c
+            except Exception:
+                stats.errors += 1
+                raise
+            finally:
+                stats.busy += monotonic() - start
+
+    def scan(self) -> list[int]:
+        """ addresses of all devices acknowledging on the bus
+        """
+        if self.is_fake:
+            return []
+        with self._lock:
+            while not self.i2c.try_lock():
+                sleep(0)
+            try:
+                return self.i2c.scan()
+            finally:
+                self.i2c.unlock()
+
+    def get_stats(self) -> dict[int, I2cDeviceStats]:
+        """ return a copy of the per-device access statistics
+        """
+        with self._lock:
+            return dict(self._stats)
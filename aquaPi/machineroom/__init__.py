@@ -1,18 +1,23 @@
 #!/usr/bin/env python3
 
 import logging
+import os
 from os import (environ, path)
 import json
 import pickle
 import atexit
+from threading import (Condition, Lock, Thread)
+from time import monotonic
 
-from .msg_bus import MsgBus
+from .msg_bus import (BusNode, MsgBus)
 from .ctrl_nodes import *  # noqa
 from .in_nodes import *  # noqa
 from .out_nodes import *  # noqa
 from .aux_nodes import *  # noqa
 from .hist_nodes import History
 from .alert_nodes import *  # noqa
+from .runtime import AsyncRuntime
+from .topology import (save_nodes, save_topology, load_topology)
 from ..driver import (driver_config, create_io_registry, DriverError)
 
 
@@ -27,7 +32,12 @@ class MachineRoom:
         The Bus also provides the interface to Flask backend.
         Some bus nodes start worker threads (e.g. sensors), the rest
         works in msg handlers and callbacks.
+        Changed nodes are saved by a background thread, see mark_dirty().
     """
+    # quiet time [s] after the last change before changed nodes are saved
+    SAVE_DELAY = 5.0
+    # ... but save at the latest this long after the first unsaved change
+    SAVE_MAX_DELAY = 60.0
 
     def __init__(self, global_cfg: dict[str, str]) -> None:
         """ Create everything needed to get the machinery going:
@@ -36,6 +46,15 @@ class MachineRoom:
         self.globals = global_cfg
         instance_path = global_cfg['INSTANCE_PATH']
 
+        self._dirty: set[str] = set()  # ids of nodes with unsaved changes
+        self._topo_dirty: bool = False  # nodes plugged in or pulled out
+        self._dirty_since: float = 0.
+        self._dirty_last: float = 0.
+        self._persist_cond = Condition()
+        self._persist_thread: Thread | None = None
+        self._persist_stop = False
+        self._save_lock = Lock()
+
         # merge customized config from this file
         cfg_file = 'config.json'
         if 'AQUAPI_CFG' in environ:
@@ -47,10 +66,12 @@ class MachineRoom:
                 custom_cfg = json.load(f_in)
             self.globals.update(custom_cfg)
 
-        topo_file = 'topo.pickle'
+        topo_file = 'topo.json'
         if 'AQUAPI_TOPO' in environ:
             topo_file = environ['AQUAPI_TOPO']
         topo_file = path.join(instance_path, topo_file)
+        if topo_file.endswith('.pickle'):
+            topo_file = path.splitext(topo_file)[0] + '.json'
 
         self.globals['CUSTOM_CFG'] = cfg_file
         self.globals['BUS_TOPO'] = topo_file
@@ -59,11 +80,24 @@ class MachineRoom:
             driver_config['Email'] = self.globals['Email']
         if 'Telegram' in self.globals:
             driver_config['Telegram'] = self.globals['Telegram']
-        create_io_registry()
+        create_io_registry(path.join(instance_path, 'ports.json'))
+
+        # optional: timed node work as tasks of one asyncio loop, not a thread each
+        if self.globals.get('ASYNC_RUNTIME'):
+            AsyncRuntime.start()
 
         try:
-            if not path.exists(self.globals['BUS_TOPO']):
-                self.bus: MsgBus = MsgBus(threaded=False)
+            legacy_file = path.splitext(self.globals['BUS_TOPO'])[0] + '.pickle'
+            if not path.exists(self.globals['BUS_TOPO']) and path.exists(legacy_file):
+                log.brief("=== Converting Bus & Nodes from %s", legacy_file)
+                self.bus: MsgBus = self._restore_legacy(legacy_file)
+                self.save_nodes(self.bus)
+                os.replace(legacy_file, legacy_file + '.bak')
+                log.brief("  ... saved to %s, old file kept as %s.bak",
+                          self.globals['BUS_TOPO'], legacy_file)
+
+            elif not path.exists(self.globals['BUS_TOPO']):
+                self.bus = MsgBus(threaded=False)
 
                 log.brief("=== There are no controllers defined, creating default")
 
@@ -104,6 +138,9 @@ class MachineRoom:
             log.fatal("Creation of a controller failed: %s", ex.msg)
             raise
 
+        # nodes plugged in or pulled out from now on change the topology
+        self.bus.add_topology_hook(self._topology_changed)
+
         # Our __del__ would not be called after Ctrl-C.
         atexit.register(self.shutdown)
 
@@ -134,28 +171,118 @@ class MachineRoom:
                 p.write(json.dumps(custom_cfg, indent=2))
 
         if self.bus:
+            with self._persist_cond:
+                self._persist_stop = True
+                self._persist_cond.notify()
+            if self._persist_thread:
+                self._persist_thread.join(timeout=5)
+            # the full save includes all changed nodes
+            self.bus.remove_topology_hook(self._topology_changed)
+            with self._persist_cond:
+                self._dirty.clear()
+                self._topo_dirty = False
             self.save_nodes(self.bus)
             self.bus.teardown()
+            AsyncRuntime.stop()
             # self.bus = None
             log.brief('... shutdown completed')
 
-    def save_nodes(self, container, fname: str = '') -> None:
-        """ save the Bus, Nodes and Drivers to storage
+    def save_nodes(self, container: MsgBus, fname: str = '') -> None:
+        """ save topology of the Bus and state of all Nodes to storage
             Parameters allow usage for controller templates,
             contained in "something", not a bus
         """
         if container:
             if not fname:
                 fname = self.globals['BUS_TOPO']
-            with open(fname, 'wb') as p:
-                pickle.dump(container, p, protocol=pickle.HIGHEST_PROTOCOL)
+            state = container.__getstate__()
+            with self._save_lock:
+                save_topology(fname, state['nodes'], threaded=state['threaded'],
+                              compiled=state['compiled'])
+
+    def mark_dirty(self, node: BusNode) -> None:
+        """ remember a changed Node, it is saved in the background
+            when there were no more changes for SAVE_DELAY seconds.
+            Several changes of the same or other nodes thus cause
+            a single write.
+        """
+        with self._persist_cond:
+            now = monotonic()
+            if not self._dirty:
+                self._dirty_since = now
+            self._dirty_last = now
+            self._dirty.add(node.id)
+            if not self._persist_thread:
+                self._persist_thread = Thread(name='persist', target=self._persister,
+                                              daemon=True)
+                self._persist_thread.start()
+            self._persist_cond.notify()
+
+    def _topology_changed(self, node: BusNode) -> None:
+        """ a node was plugged in or pulled out, save the whole topology
+        """
+        with self._persist_cond:
+            self._topo_dirty = True
+        self.mark_dirty(node)
 
-    def restore_nodes(self, fname: str = ''):
+    def flush(self) -> None:
+        """ save all changed Nodes now, or the whole topology if
+            nodes were plugged in or pulled out
+        """
+        with self._persist_cond:
+            node_ids, self._dirty = self._dirty, set()
+            topo, self._topo_dirty = self._topo_dirty, False
+        nodes = [node for node in map(self.bus.get_node, node_ids) if node]
+        if not nodes and not topo:
+            return
+        try:
+            if topo:
+                self.save_nodes(self.bus)
+                log.info('Saved changed topology')
+            else:
+                with self._save_lock:
+                    save_nodes(self.globals['BUS_TOPO'], nodes)
+                log.info('Saved %d changed nodes', len(nodes))
+        except OSError:
+            log.exception('Saving changed nodes failed, will retry')
+            with self._persist_cond:
+                if not self._dirty:
+                    self._dirty_since = monotonic()
+                self._dirty |= node_ids
+                self._dirty_last = monotonic()
+                self._topo_dirty |= topo
+
+    def _persister(self) -> None:
+        """ thread waiting for changed nodes to settle, then save them
+        """
+        cond = self._persist_cond
+        while True:
+            with cond:
+                while True:
+                    if self._persist_stop:
+                        return
+                    if not self._dirty:
+                        cond.wait()
+                        continue
+                    due = min(self._dirty_last + self.SAVE_DELAY,
+                              self._dirty_since + self.SAVE_MAX_DELAY)
+                    if monotonic() >= due:
+                        break
+                    cond.wait(timeout=due - monotonic())
+            self.flush()
+
+    def restore_nodes(self, fname: str = '') -> MsgBus:
         """ recreate the Bus, Nodes and Drivers from storage,
             or a controller template in a container from some file
         """
         if not fname:
             fname = self.globals['BUS_TOPO']
+        return load_topology(fname)
+
+    @staticmethod
+    def _restore_legacy(fname: str) -> MsgBus:
+        """ read a topology pickled by older versions, only used once to convert it
+        """
         with open(fname, 'rb') as p:
             container = pickle.load(p)
         return container
@@ -93,6 +93,15 @@ class AlertThreshold(AlertCond):
         self._direction = direction
         self._starttime: float | None = None
 
+    def __getstate__(self) -> dict[str, Any]:
+        return {'node_id': self.node_id, 'limit': self.limit,
+                'duration': self.duration}
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        # cmp & direction are given by the derived class
+        type(self).__init__(self, state['node_id'], state['limit'],
+                            state.get('duration', 0))
+
     def __str__(self) -> str:
         txt = f'{type(self).__name__}({OP_SYMBOL[self._cmp]}{self.limit}'
         if self.duration:
@@ -19,8 +19,10 @@ class AuxNode(BusListener, ABC):
     """ Auxiliary nodes are for advanced configurations where
         direct connections of input to controller or controller to
         output aren't sufficient.
+        They post changed results only, unchanged ones every 5 minutes.
     """
     ROLE = BusRole.AUX
+    PUBLISH = {'enabled': True, 'heartbeat': 300.0}
 
 
 class SingleInAux(AuxNode, ABC):
@@ -50,6 +52,7 @@ class MultiInAux(AuxNode, ABC):
 
     def __setstate__(self, state: dict[str, Any]) -> None:
         self.data = state['data']
+        self.publish = state.get('publish')
         MultiInAux.__init__(self, state['name'], state['receives'],
                             _cont=True)
 
@@ -110,6 +113,7 @@ class ScaleAux(SingleInAux):
 
     def __setstate__(self, state: dict[str, Any]) -> None:
         self.data = state['data']
+        self.publish = state.get('publish')
         ScaleAux.__init__(self, state['name'], state['receives'], unit=state['unit'],
                           offset=state['offset'], factor=state['factor'],
                           limit=state['limit'],
@@ -169,6 +173,7 @@ class AvgAux(MultiInAux):
 
     def __setstate__(self, state: dict[str, Any]) -> None:
         self.data = state['data']
+        self.publish = state.get('publish')
         AvgAux.__init__(self, state['name'], state['receives'],
                         unfair_avg=state['unfair_avg'], _cont=True)
 
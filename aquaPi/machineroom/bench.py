@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+
+import argparse
+import gc
+import json
+import logging
+import platform
+import resource
+import statistics
+import sys
+import tracemalloc
+from time import perf_counter
+from typing import Any, Callable
+
+from .msg_bus import (BusNode, MsgBus)
+from .msg_types import (Msg, MsgData)
+from .in_nodes import AnalogInput
+from .aux_nodes import (AvgAux, MinAux)
+from .alert_nodes import (Alert, AlertAbove, AlertBelow)
+from . import hist_nodes
+from .hist_nodes import History
+
+
+log = logging.getLogger('machineroom.bench')
+log.brief = log.warning  # alias, warning is used as brief info, level info is verbose
+
+
+# ========== bus benchmark ==========
+
+# python -m aquaPi.machineroom.bench [--sizes 10 100 1000] [-o result.json]
+#
+# Builds synthetic topologies of cells with 10 nodes each:
+#   in0..in4 -> avg0 (in0..in2), avg1 (in2..in4) -> min (avg0, avg1)
+#   hist records in0..in4 and min, alert watches min and avg0
+# posts changing values to the inputs, round robin, and measures for
+# each bus mode: messages/s, latency from post to each listen, memory
+# of the topology. The inputs have no port, the tickers of real drivers
+# would add load at random, values are posted by the benchmark instead.
+# History stays in memory, alerts never trigger.
+# Each mode runs with and without MsgBus.report_change, i.e. the SSE
+# change feed, to show its share.
+
+BENCH_VERSION = 2
+CELL_SIZE = 10
+
+
+def build_cell(idx: int) -> list[BusNode]:
+    """ the 10 nodes of cell idx
+    """
+    ins = [AnalogInput(f'bench in{idx}_{i}', '', 0, '°C', interval=3600)
+           for i in range(5)]
+    ids = [node.id for node in ins]
+    avg0 = AvgAux(f'bench avg{idx}_0', ids[0:3])
+    avg1 = AvgAux(f'bench avg{idx}_1', ids[2:5])
+    low = MinAux(f'bench min{idx}', [avg0.id, avg1.id])
+    hist = History(f'bench hist{idx}', ids + [low.id])
+    alert = Alert(f'bench alert{idx}',
+                  {AlertAbove(low.id, 1e9), AlertBelow(avg0.id, -1e9)}, '')
+    return ins + [avg0, avg1, low, hist, alert]
+
+
+def build_nodes(size: int) -> list[BusNode]:
+    """ the nodes of size // CELL_SIZE cells, at least one
+    """
+    nodes: list[BusNode] = []
+    for idx in range(max(1, size // CELL_SIZE)):
+        nodes.extend(build_cell(idx))
+    return nodes
+
+
+def _wait_idle(bus: MsgBus) -> None:
+    if bus._queue:
+        bus._queue.join()
+
+
+def _instrument(bus: MsgBus, latencies: list[float]) -> None:
+    """ stamp each message posted, record the delay of each listen
+    """
+    post = bus.post
+
+    def timed_post(msg: Msg) -> None:
+        msg.posted = perf_counter()  # type: ignore[attr-defined]
+        post(msg)
+    bus.post = timed_post  # type: ignore[method-assign]
+
+    def timed_listen(listen: Callable[[Msg], None]) -> Callable[[Msg], None]:
+        def wrapper(msg: Msg) -> None:
+            if isinstance(msg, MsgData):
+                latencies.append(perf_counter() - getattr(msg, 'posted', perf_counter()))
+            listen(msg)
+        return wrapper
+    for node in bus.nodes:
+        node.listen = timed_listen(node.listen)  # type: ignore[method-assign]
+
+
+def _percentiles(values: list[float]) -> dict[str, float]:
+    if len(values) < 2:
+        return {}
+    cuts = statistics.quantiles(values, n=100, method='inclusive')
+    return {'p50': round(cuts[49] * 1e6, 1),
+            'p90': round(cuts[89] * 1e6, 1),
+            'p99': round(cuts[98] * 1e6, 1),
+            'max': round(max(values) * 1e6, 1)}
+
+
+def run_one(size: int, threaded: bool, compiled: bool,
+            posts: int, change_feed: bool) -> dict[str, Any]:
+    """ benchmark one topology in one bus mode
+    """
+    gc.collect()
+    tracemalloc.start()
+    nodes = build_nodes(size)
+    topo_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    bus = MsgBus(threaded=threaded, compiled=compiled)
+    if not change_feed:
+        bus.report_change = lambda node_id: None  # type: ignore[method-assign]
+    bus.plugin_all(nodes)
+    _wait_idle(bus)
+    inputs = [n for n in nodes if isinstance(n, AnalogInput)]
+    latencies: list[float] = []
+    _instrument(bus, latencies)
+
+    start_cnt = bus.dbg_cnt
+    start = perf_counter()
+    for i in range(posts):
+        node = inputs[i % len(inputs)]
+        node.data = float(i % 7) + i / posts  # always a change
+        node.post(MsgData(node.id, node.data))
+        if threaded:
+            # don't outrun the worker, nodes post from within dispatch
+            _wait_idle(bus)
+    _wait_idle(bus)
+    elapsed = perf_counter() - start
+    msgs = bus.dbg_cnt - start_cnt
+
+    result = {'nodes': len(bus.nodes),
+              'threaded': threaded,
+              'compiled': compiled,
+              'change_feed': change_feed,
+              'posts': posts,
+              'msgs': msgs,
+              'listens': len(latencies),
+              'seconds': round(elapsed, 4),
+              'msgs_per_s': round(msgs / elapsed, 1) if elapsed else 0.,
+              'latency_us': _percentiles(latencies),
+              'topology_kib': round(topo_bytes / 1024, 1),
+              'maxrss_kib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+    bus.teardown()
+    log.brief('%d nodes, threaded %s, compiled %s, change feed %s: %.0f msgs/s',
+              result['nodes'], threaded, compiled, change_feed, result['msgs_per_s'])
+    return result
+
+
+def run(sizes: list[int], posts: int) -> dict[str, Any]:
+    """ benchmark all sizes in all bus modes, with and without change feed
+    """
+    hist_nodes.QUEST_DB = False  # never write to a real database
+    results = [run_one(size, threaded, compiled, posts, change_feed)
+               for size in sizes
+               for threaded in (False, True)
+               for compiled in (False, True)
+               for change_feed in (True, False)]
+    return {'version': BENCH_VERSION,
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'results': results}
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m aquaPi.machineroom.bench',
+                                     description='Throughput and latency of the message bus')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000],
+                        help='node counts of the topologies, multiples of %d' % CELL_SIZE)
+    parser.add_argument('--posts', type=int, default=2000,
+                        help='input values posted per run')
+    parser.add_argument('-o', '--output', help='write JSON to this file, else stdout')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING if args.verbose else logging.ERROR,
+                        format='%(asctime)s %(levelname).3s %(name)s: %(message)s')
+    report = run(args.sizes, args.posts)
+    if args.output:
+        with open(args.output, 'w', encoding='utf8') as f_out:
+            json.dump(report, f_out, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,14 +4,15 @@ from abc import ABC
 import logging
 from typing import Any, Callable
 import operator
-from time import (time, sleep)
+from time import time
 import math
 import random
-from datetime import timedelta
-from threading import Thread
+from datetime import (datetime, timedelta)
+from threading import (Condition, Lock, Thread)
 
 from .msg_bus import (Msg, MsgData)
 from .msg_bus import (BusListener, BusRole, DataRange)
+from .runtime import Ticker
 
 
 log = logging.getLogger('machineroom.ctrl_nodes')
@@ -77,7 +78,11 @@ class ControllerNode(BusListener, ABC):
 
 class ThresholdCtrl(ControllerNode):
     """ A controler switching when passing a threshold
+        Repeated output is posted only every 5 minutes, changes
+        of output or alert immediately.
     """
+    PUBLISH = {'enabled': True, 'heartbeat': 300.0}
+
     def __init__(self, name: str, receives: str,
                  setpoint: float, hysteresis: float,
                  cmp_on: Callable[[float, float], bool],
@@ -192,6 +197,7 @@ class MinimumCtrl(ThresholdCtrl):
 
     def __setstate__(self, state: dict[str, Any]) -> None:
         self.data = state['data']
+        self.publish = state.get('publish')
         MinimumCtrl.__init__(self, state['name'], state['receives'],
                              state['setpoint'], hysteresis=state['hysteresis'],
                              _cont=True)
@@ -241,6 +247,7 @@ class MaximumCtrl(ThresholdCtrl):
 
     def __setstate__(self, state: dict[str, Any]) -> None:
         self.data = state['data']
+        self.publish = state.get('publish')
         MaximumCtrl.__init__(self, state['name'], state['receives'],
                              state['setpoint'], hysteresis=state['hysteresis'],
                              _cont=True)
@@ -291,6 +298,7 @@ class PidCtrl(ControllerNode):
     def __setstate__(self, state: dict[str, Any]) -> None:
         log.debug('__SETstate__ %r', state)
         self.data = state['data']
+        self.publish = state.get('publish')
         PidCtrl.__init__(self, state['name'], state['receives'], state['setpoint'],
                          p_fact=state['p_fact'], i_fact=state['i_fact'], d_fact=state['d_fact'],
                          _cont=True)
@@ -335,13 +343,144 @@ class PidCtrl(ControllerNode):
         return settings
 
 
+class FadeEngine:
+    """ A single clock for the ramps of all FadeCtrl nodes.
+        Ramps advance on a common grid of TICK seconds, and the changes of
+        one tick are posted as one batch. Thus several channels of a light
+        fade in lock-step. A ramp is only evaluated when it can have changed
+        by MIN_STEP, the thread ends when there's nothing to fade.
+        The batch is still one message per node, each output writes its
+        own channel. One device update per tick relies on the driver
+        merging writes: DriverTC420 collects the channels of a device for
+        FLUSH_INTERVAL, drivers without that (PWM, GPIO) write per channel.
+        Access the singleton through FadeEngine.get().
+    """
+    # clock grid [s], the shortest step of a ramp
+    TICK = 0.1
+    # smallest change [%] posted
+    MIN_STEP = 0.1
+
+    # easing curves map progress 0..1 to 0..1, with their max. slope
+    EASINGS: dict[str, tuple[Callable[[float], float], float]] = {
+        'linear': (lambda x: x, 1.0),
+        'sine': (lambda x: (1 - math.cos(math.pi * x)) / 2, math.pi / 2),
+        'quad': (lambda x: 2 * x * x if x < .5 else 1 - 2 * (1 - x) ** 2, 2.0),
+        'cubic': (lambda x: 4 * x ** 3 if x < .5 else 1 - 4 * (1 - x) ** 3, 3.0),
+    }
+
+    _engine: 'FadeEngine | None' = None
+    _engine_lock: Lock = Lock()
+
+    class Ramp:
+        """ state of one running ramp
+        """
+        def __init__(self, node: 'FadeCtrl', target: float, duration: float, now: float):
+            self.node: 'FadeCtrl' = node
+            self.begin: float = now
+            self.start: float = node.data
+            self.target: float = target
+            self.duration: float = duration
+            self.ease, max_slope = FadeEngine.EASINGS.get(node.easing,
+                                                           FadeEngine.EASINGS['linear'])
+            # time to change by MIN_STEP at the steepest part of the curve
+            delta = abs(target - self.start)
+            self.step_t: float = FadeEngine.MIN_STEP * duration / delta / max_slope \
+                if delta else FadeEngine.TICK
+            self.due: float = now
+
+        def value(self, now: float) -> tuple[float, bool]:
+            """ current value and whether the ramp is complete
+            """
+            progress = (now - self.begin) / self.duration if self.duration else 1.0
+            if progress >= 1.0:
+                return self.target, True
+            return self.start + (self.target - self.start) * self.ease(progress), False
+
+    @classmethod
+    def get(cls) -> 'FadeEngine':
+        with cls._engine_lock:
+            if not cls._engine:
+                cls._engine = FadeEngine()
+            return cls._engine
+
+    def __init__(self):
+        self._ramps: dict[str, FadeEngine.Ramp] = {}
+        self._cond: Condition = Condition()
+        self._thread: Thread | None = None
+
+    def start(self, node: 'FadeCtrl', target: float, duration: float) -> None:
+        """ start a ramp from node.data to target, replaces a running one
+        """
+        with self._cond:
+            ramp = FadeEngine.Ramp(node, target, duration, time())
+            self._ramps[node.id] = ramp
+            log.brief('FadeCtrl %s: fading in %f s from %f -> %f, %s, step every %f s',
+                      node.id, duration, ramp.start, target, node.easing, ramp.step_t)
+            if not self._thread:
+                self._thread = Thread(name='FadeEngine', target=self._run, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def stop(self, node: 'FadeCtrl') -> bool:
+        """ stop the node's ramp, return True if one was running
+        """
+        with self._cond:
+            ramp = self._ramps.pop(node.id, None)
+            self._cond.notify()
+        return ramp is not None
+
+    def is_fading(self, node: 'FadeCtrl') -> bool:
+        return node.id in self._ramps
+
+    def _next_tick(self, when: float) -> float:
+        """ round up to the tick grid
+        """
+        return math.ceil(when / self.TICK) * self.TICK
+
+    def _run(self) -> None:
+        log.debug('FadeEngine started')
+        while True:
+            batch: list[tuple[FadeCtrl, bool]] = []
+            with self._cond:
+                if not self._ramps:
+                    self._thread = None
+                    break
+                now = time()
+                for ramp in list(self._ramps.values()):
+                    if ramp.due > now:
+                        continue
+                    node = ramp.node
+                    val, done = ramp.value(now)
+                    ramp.due = self._next_tick(max(now + self.TICK / 2, now + ramp.step_t))
+                    if done:
+                        del self._ramps[node.id]
+                    if done or abs(val - node.data) >= self.MIN_STEP:
+                        node.data = val if done else round(val, 4)
+                        node.alert = None if done else \
+                            ('\u2197' if ramp.target > node.data else '\u2198', 'act')
+                        batch.append((node, done))
+
+            # post outside the lock, listeners may start or stop ramps
+            for node, done in batch:
+                node.post(MsgData(node.id, node.data))
+                if done:
+                    log.brief('FadeCtrl %s: fader DONE', node.id)
+
+            with self._cond:
+                if self._ramps:
+                    wake = min(r.due for r in self._ramps.values())
+                    self._cond.wait(timeout=max(0., wake - time()))
+        log.debug('FadeEngine stopped')
+
+
 class FadeCtrl(ControllerNode):
-    """ Single channel linear fading controller, usable for light (dusk/dawn).
+    """ Single channel fading controller, usable for light (dusk/dawn).
         A change of input value will start a ramp from current to new
         percentage. The duration of this ramp is deltaPerc / 100 * fade_time.
         Durations for fade-in and fade-out can be different and may be 0 for
         hard switches.
-        The ramp steps by 0.1%, or more to keep step duration >= 100 ms.
+        The ramp follows an easing curve and steps by >= 0.1% on the
+        100 ms clock of the shared FadeEngine.
 
         Options:
             name       - unique name of this controller node in UI
@@ -349,6 +488,7 @@ class FadeCtrl(ControllerNode):
             fade_time  - time span in secs to transition to the target state
             fade_out   - optional time span in secs to transition to off
                          defaults to fade_time
+            easing     - shape of ramp: linear, sine, quad or cubic
 
         Output:
             float - posts series of percentages after input state change
@@ -357,7 +497,8 @@ class FadeCtrl(ControllerNode):
 
     def __init__(self, name: str, receives: str,
                  fade_time: int | timedelta = 0,
-                 fade_out: int | timedelta | None = 0, _cont: bool = False):
+                 fade_out: int | timedelta | None = 0,
+                 easing: str = 'linear', _cont: bool = False):
         super().__init__(name, receives, _cont=_cont)
         if isinstance(fade_time, timedelta):
             self.fade_time: int = int(fade_time.total_seconds())
@@ -371,8 +512,7 @@ class FadeCtrl(ControllerNode):
                 self.fade_out = int(fade_out.total_seconds())
             else:
                 self.fade_out = fade_out
-        self._fader_thread: Thread | None = None
-        self._fader_stop: bool = False
+        self.easing: str = easing if easing in FadeEngine.EASINGS else 'linear'
         if not _cont:
             self.data = 0.0
         self.target: float = self.data
@@ -381,93 +521,82 @@ class FadeCtrl(ControllerNode):
         state = super().__getstate__()
         state["fade_time"] = self.fade_time
         state["fade_out"] = self.fade_out
+        state["easing"] = self.easing
         return state
 
     def __setstate__(self, state: dict[str, Any]) -> None:
         self.data = state['data']
+        self.publish = state.get('publish')
         FadeCtrl.__init__(self, state['name'], state['receives'],
                           fade_time=state['fade_time'], fade_out=state['fade_out'],
+                          easing=state.get('easing', 'linear'),
                           _cont=True)
 
     def listen(self, msg: Msg) -> None:
         if isinstance(msg, MsgData):
             log.info('FadeCtrl: got %f', msg.data)
             self.target = float(msg.data)
+            engine = FadeEngine.get()
             if self.data != self.target:
-                if self._fader_thread:
-                    self._fader_stop = True
-                    self._fader_thread.join()
+                if engine.stop(self):
+                    log.brief('FadeCtrl %s: fader stopped', self.id)
                     self.post(MsgData(self.id, round(self.data, 4)))  # start of new ramp
 
+                f_time = self.fade_time if self.data < self.target else self.fade_out
                 # fade_time or fade_out can be 0 -> switch to target
-                if (self.data < self.target and not self.fade_time) \
-                 or (self.data > self.target and not self.fade_out):
+                if not f_time:
                     self.data = self.target
+                    self.alert = None
                     log.brief('FadeCtrl %s: output %f', self.id, self.data)
                     self.post(MsgData(self.id, self.data))
                 else:
                     log.debug('_fader %f -> %f', self.data, self.target)
-                    self._fader_thread = Thread(name=self.id, target=self._fader, daemon=True)
-                    self._fader_thread.start()
+                    engine.start(self, self.target,
+                                 abs(self.target - self.data) / 100 * f_time)
 
         super().listen(msg)
 
-    def _fader(self):
-        """ This fader uses constant steps of 0.1% unless this would be >10 steps/sec
-        """
-        f_time = self.fade_time  if self.data < self.target else self.fade_out
-        delta_d = self.target - self.data      # total change
-        delta_t = abs(delta_d) / 100 * f_time  # total time for this change
-        step_t = max(delta_t / 1000, 0.1)      # try 1000 steps, at most 10 steps per sec
-        step_d = delta_d * step_t / delta_t
-        log.brief('FadeCtrl %s: fading in %f s from %f -> %f, change by %f every %f s',
-                  self.id, delta_t, self.data, self.target, step_d, step_t)
-
-        next_t = time() + step_t
-        while abs(self.target - self.data) > abs(step_d):
-            self.data += step_d
-            log.debug('_fader %f ...', self.data)
-
-            self.alert = ('\u2197'  if self.target > self.data else '\u2198', 'act')
-            self.post(MsgData(self.id, round(self.data, 4)))
-            sleep(max(0, next_t - time()))
-            next_t += step_t
-            if self._fader_stop:
-                log.brief('FadeCtrl %s: fader stopped', self.id)
-                break
-        else:
-            if self.data != self.target:
-                self.data = self.target
-                self.post(MsgData(self.id, self.data))  # end of ramp
-            self.alert = None
-            log.brief('FadeCtrl %s: fader DONE', self.id)
-
-        self._fader_thread = None
-        self._fader_stop = False
-
     def get_settings(self) -> list[tuple]:
         settings = super().get_settings()
         settings.append(('fade_time', 'Fade-In time [s]',
                          self.fade_time, 'type="number" min="0"'))
         settings.append(('fade_out', 'Fade-Out time [s]',
                          self.fade_out, 'type="number" min="0"'))
+        settings.append(('easing', 'Fade-Kurve [linear/sine/quad/cubic]',
+                         self.easing, 'type="text"'))
         return settings
 
 
 class Cloud(object):
     """ Represents a single cloud
     """
-    def __init__(self, cloudiness: int):
-        self.born: float = time()
+    def __init__(self, cloudiness: int, born: float | None = None,
+                 rng: random.Random | None = None):
+        rnd = rng or random.Random()
+        self.born: float = time() if born is None else born
         if cloudiness & 1:  # odd weather types have shorter darker clouds
-            self.duration: int = random.randint(1, 60 * 60)
-            self.darkness: int = random.randint(1, 20)
+            self.duration: int = rnd.randint(1, 60 * 60)
+            self.darkness: int = rnd.randint(1, 20)
         else:
-            self.duration = random.randint(1, 8 * 60 * 60)
-            self.darkness = random.randint(1, 8)
+            self.duration = rnd.randint(1, 8 * 60 * 60)
+            self.darkness = rnd.randint(1, 8)
+
+    @property
+    def gone(self) -> float:
+        return self.born + self.duration
+
+    def shadow_at(self, when: float) -> float:
+        if self.born <= when < self.gone:
+            return self.halfsine(when - self.born, self.duration, self.darkness)
+        return 0.0
 
     def current_shadow(self) -> float:
-        return self.halfsine(time() - self.born, self.duration, self.darkness)
+        return self.shadow_at(time())
+
+    def max_slope(self) -> float:
+        """ steepest change of shadow [%/s]
+        """
+        return self.darkness * math.pi / self.duration
 
     @staticmethod
     def halfsine(elapsed_t, wave_t, max_p):
@@ -509,7 +638,12 @@ class SunCtrl(ControllerNode):
         Unlike FadeCtrl, SunCtrl starts ascend with darkness.
         As soon as a target level (>0) is reached the random cloud simulation
         will start. An input of 0 will stop this and trigger a descend.
-        The ramp steps by >=0.1% to keep step duration >= 100 ms.
+
+        The light curve is planned ahead: a cycle seeds its own random
+        generator, plans the clouds and computes the points where the
+        output changes by >= MIN_STEP. The fader thread just sleeps until
+        the next point. get_plan() returns the curve of the current cycle,
+        past and forecast.
 
         Options:
             name     - unique name of this controller node in UI
@@ -521,17 +655,31 @@ class SunCtrl(ControllerNode):
     """
     data_range = DataRange.PERCENT
 
+    # smallest change of output [%] to post
+    MIN_STEP = 0.1
+    # chance of a new cloud per second, while there are less than cloudiness
+    CLOUD_RATE = 0.001
+    # the curve is planned this far [s] ahead, and extended while lit
+    PLAN_HORIZON = 6 * 60 * 60
+
     def __init__(self, name: str, receives: str,
                  xscend: float = 1, _cont: bool = False):
         super().__init__(name, receives, _cont=_cont)
         self.xscend = xscend
         if isinstance(xscend, timedelta):
             self.xscend = xscend.total_seconds() / 60 / 60
-        self._fader_thread: Thread | None = None
-        self._fader_stop: bool = False
+        self._fader_ticker: Ticker = Ticker(self.id, self._fader, offload=True)
+        self._fader_idx: int = 0
         self._high: float = 0.0
         self.clouds: list[Cloud] = []
         self.cloudiness: int = 0
+        self.seed: int = 0
+        self._rng: random.Random = random.Random()
+        self._ascend: float = 0.0         # start of ascend
+        self._descend: float | None = None  # start of descend
+        self._plan: list[tuple[float, float, str]] = []
+        self._plan_time: float = 0.0      # curve is planned up to here
+        self._cloud_time: float = 0.0     # clouds are planned up to here
 
         if not _cont:
             self.data = 0.0
@@ -544,6 +692,7 @@ class SunCtrl(ControllerNode):
 
     def __setstate__(self, state: dict[str, Any]) -> None:
         self.data = state['data']
+        self.publish = state.get('publish')
         SunCtrl.__init__(self, state['name'], state['receives'],
                          xscend=state['xscend'],
                          _cont=True)
@@ -551,85 +700,160 @@ class SunCtrl(ControllerNode):
     def listen(self, msg: Msg) -> None:
         if isinstance(msg, MsgData):
             log.info('SunCtrl: got %f', msg.data)
-            if self._fader_thread:
-                self._fader_stop = True
-                self._fader_thread.join()
-            self.target = float(msg.data)
-            if self.target:
-                self._high = self.target
-                self.cloudiness = int(random.random() * 7.5)
-                log.brief('SunCtrl: cloudiness %d', self.cloudiness)
-
-            if self.target != self.data:
-                log.debug('_fader %f -> %f', self.data, self.target)
-                self._fader_thread = Thread(name=self.id, target=self._fader, daemon=True)
-                self._fader_thread.start()
+            target = float(msg.data)
+            if target and target == self._high and self._descend is None \
+               and self._fader_ticker.running:
+                log.debug('SunCtrl %s: repeated input, cycle continues', self.id)
+            else:
+                self._stop_fader()
+                self.target = target
+                now = time()
+                if self.target:
+                    self._new_cycle(now)
+                elif self.data:
+                    self._descend = now
+                    self._plan = [pt for pt in self._plan if pt[0] < now]
+                    self._plan_time = now
+
+                if self.target != self.data:
+                    log.debug('_fader %f -> %f', self.data, self.target)
+                    self._fader_idx = len(self._plan)
+                    self._fader_ticker.start()
 
         super().listen(msg)
 
-    def _make_next_step(self, phase: str, new_data: float) -> None:
-        if abs(new_data - self.data) >= 0.1:
-            self.data = new_data
-            log.info('SunCtrl %s: %s %f%%', self.id, phase, self.data)
-            self.post(MsgData(self.id, self.data))
-        sleep(max(1, new_data/30))  # shorten steps for low values
-
-    def _calculate_clouds(self) -> float:
-        if random.random() < 0.002 and len(self.clouds) < self.cloudiness:
-            cloud = Cloud(self.cloudiness)
-            self.clouds.append(cloud)
-            log.brief('SunCtrl %s: new cloud (%dmin | %d%%)', self.id, cloud.duration/60, cloud.darkness)
-
-        shadow = 0.0
-        for i, cloud in enumerate(self.clouds.copy()):
-            if cloud.born + cloud.duration < time():
-                self.clouds.remove(cloud)
-            else:
-                sh = cloud.current_shadow()
-                log.debug('SunCtrl %s: cloud %d = %f%%', self.id, i, sh)
-                shadow = min(shadow + sh, 80)
-        shadow = (100.0 - shadow) / 100
-        log.debug('SunCtrl %s: cloud factor %f', self.id, shadow)
-        return shadow
-
-    def _fader(self) -> None:
-        """ This fader updates every second in low range, less often >30%
-            Changes are delayed until <0.1%
+    def pullout(self) -> bool:
+        self._stop_fader()
+        return super().pullout()
+
+    def _stop_fader(self) -> None:
+        if self._fader_ticker.running:
+            self._fader_ticker.stop()
+            self._fader_end('stopped')
+
+    def _fader_end(self, how: str) -> None:
+        log.brief('SunCtrl %s: fader %s', self.id, how)
+        if not self.data:
+            self.alert = None
+
+    def _new_cycle(self, now: float, seed: int | None = None) -> None:
+        """ start a new ascend with new weather
+        """
+        self.seed = int(now) if seed is None else seed
+        self._rng = random.Random(f'{self.id}/{self.seed}')
+        self._high = self.target
+        self.cloudiness = int(self._rng.random() * 7.5)
+        log.brief('SunCtrl: cloudiness %d', self.cloudiness)
+        self.clouds = []
+        self._ascend = self._plan_time = self._cloud_time = now
+        self._descend = None
+        self._plan = []
+
+    def _plan_clouds(self, until: float) -> None:
+        """ let clouds be born in a poisson process until the given time
+        """
+        self.clouds = [c for c in self.clouds if c.gone > self._plan_time]
+        born = self._cloud_time
+        while True:
+            born += self._rng.expovariate(self.CLOUD_RATE)
+            if born >= until:
+                break
+            if len([c for c in self.clouds if c.born <= born < c.gone]) < self.cloudiness:
+                cloud = Cloud(self.cloudiness, born, self._rng)
+                self.clouds.append(cloud)
+                log.debug('SunCtrl %s: cloud planned at %s (%dmin | %d%%)', self.id,
+                          datetime.fromtimestamp(born), cloud.duration / 60, cloud.darkness)
+        self._cloud_time = until
+
+    def _level(self, when: float) -> tuple[float, str]:
+        """ output level and phase of the curve at time when
         """
         xscend = self.xscend * 60 * 60
-        start = now = time()
-        if self.target:
-            self.alert = ('\u2197', 'act')  # north east arrow
-            self.data = 0  # sart of ascend
+        shadow = min(sum(c.shadow_at(when) for c in self.clouds), 80)
+        factor = (100.0 - shadow) / 100
+        # compare absolute times, same as _next_sample does
+        if self._descend is not None:
+            if when >= self._descend + xscend:
+                return 0.0, 'dark'
+            elapsed = when - self._descend
+            return Cloud.halfsine(elapsed + xscend, xscend * 2, self._high) * factor, 'descend'
+        if when < self._ascend + xscend:
+            elapsed = when - self._ascend
+            return Cloud.halfsine(elapsed, xscend * 2, self._high) * factor, 'ascend'
+        return self._high * factor, 'cloudy' if shadow else 'sunny'
+
+    def _next_sample(self, when: float, until: float) -> float:
+        """ Next time the curve might have changed by MIN_STEP. Steps over
+            the max. slope of sine and active clouds, jumps to the next
+            cloud or phase change if the curve is flat.
+        """
+        xscend = self.xscend * 60 * 60
+        slope = 0.0
+        edges = [until]
+        phase_end = (self._ascend if self._descend is None else self._descend) + xscend
+        if when < phase_end:
+            slope += self._high * math.pi / (2 * xscend)
+            edges.append(phase_end)
+        for cloud in self.clouds:
+            if cloud.born <= when < cloud.gone:
+                slope += cloud.max_slope() * self._high / 100
+                edges.append(cloud.gone)
+            elif cloud.born > when:
+                edges.append(cloud.born)
+        nxt = min(edges)
+        if slope:
+            nxt = min(nxt, when + max(1.0, self.MIN_STEP / slope))
+        return nxt
+
+    def _extend_plan(self, until: float) -> None:
+        """ add points with changes >= MIN_STEP up to time until
+        """
+        self._plan_clouds(until)
+        when = self._plan_time
+        last = self._plan[-1][1] if self._plan else None
+        while when < until:
+            level, phase = self._level(when)
+            level = round(level, 4)
+            if phase == 'dark':
+                self._plan.append((when, level, phase))  # end of cycle
+                break
+            if last is None or abs(level - last) >= self.MIN_STEP:
+                self._plan.append((when, level, phase))
+                last = level
+            when = self._next_sample(when, until)
+        self._plan_time = until
+        log.debug('SunCtrl %s: %d points planned until %s',
+                  self.id, len(self._plan), datetime.fromtimestamp(until))
+
+    def _fader(self) -> float | None:
+        """ This fader posts the planned points that are due, extends
+            the plan while still lit, and returns the time until the
+            next point.
+        """
+        while True:
+            if self._fader_idx >= len(self._plan):
+                if self._plan and self._plan[-1][2] == 'dark':
+                    self._fader_end('DONE')
+                    return None
+                self._extend_plan(max(time(), self._plan_time) + self.PLAN_HORIZON)
+                continue
+
+            when, level, phase = self._plan[self._fader_idx]
+            if when > time():
+                return when - time()
+            self._fader_idx += 1
+            self.alert = {'ascend': ('\u2197', 'act'),   # north east arrow
+                          'descend': ('\u2198', 'act'),  # south east arrow
+                          'cloudy': ('\u219d', 'act'),   # rightwards wave arrow
+                          }.get(phase)
+            self.data = level
+            log.info('SunCtrl %s: %s %f%%', self.id, phase, self.data)
             self.post(MsgData(self.id, self.data))
-            while now - start < xscend and not self._fader_stop:
-                shadow = self._calculate_clouds()
-                new_data = Cloud.halfsine(now - start, xscend * 2, self._high) * shadow
-                self._make_next_step('ascend', new_data)
-                now = time()
-
-            # loop with clouds until fader_stop
-            #FIXME: post some heartbeat values to keep diagram nice - could help everywhere ...
-            while not self._fader_stop:
-                shadow = self._calculate_clouds()
-                self.alert = ('\u219d', 'act') if shadow else None  # rightwards wave arrow
-                new_data = self._high * shadow
-                self._make_next_step('cloudy', new_data)
-                now = time()
-        else:
-            self.alert = ('\u2198', 'act')  # south east arrow
-            while now - start < xscend and not self._fader_stop:
-                shadow = self._calculate_clouds()
-                new_data = Cloud.halfsine(now - start + xscend, xscend * 2, self._high) * shadow
-                self._make_next_step('descend', new_data)
-                now = time()
-            self.data = 0  # end of descend
 
-        log.brief('SunCtrl %s: fader %s', self.id, 'DONE' if not self._fader_stop else 'stopped')
-        self.post(MsgData(self.id, self.data))
-        self.alert = None
-        self._fader_thread = None
-        self._fader_stop = False
+    def get_plan(self) -> list[tuple[int, float]]:
+        """ planned curve of the current cycle as (timestamp, level)
+        """
+        return [(int(when), level) for (when, level, _) in self._plan.copy()]
 
     def get_settings(self) -> list[tuple]:
         settings = super().get_settings()
@@ -5,10 +5,12 @@ import logging
 from typing import Any
 import time
 from datetime import datetime
-from croniter import croniter
-from threading import Thread
+from collections import deque
+import statistics
+from croniter import (croniter, CroniterBadDateError)
 
 from .msg_bus import (MsgBus, BusNode, BusRole, DataRange, MsgData)
+from .runtime import Ticker
 from ..driver import (IoRegistry, DriverReadError, InDriver)
 
 
@@ -22,7 +24,7 @@ log.brief = log.warning  # alias, warning is used as brief info, level info is v
 class InputNode(BusNode, ABC):
     """ Base class for IN_ENDP delivering measurments,
         e.g. temperature, pH, water level switch
-        All use a reader thread, most reading from IoRegistry port
+        All use a reader Ticker, most reading from IoRegistry port
     """
     ROLE = BusRole.IN_ENDP
 
@@ -32,8 +34,7 @@ class InputNode(BusNode, ABC):
         self._driver: InDriver | None = None
         self._driver_opts = None
         self._port: str = ''
-        self._reader_thread: Thread | None = None
-        self._reader_stop: bool = False
+        self._ticker: Ticker = Ticker(self.id, self._reader, offload=True)
         self.interval: float = max(0.1, float(interval))
         self.port: str = port
 
@@ -58,6 +59,7 @@ class InputNode(BusNode, ABC):
     def port(self, port: str) -> None:
         if self._driver:
             IoRegistry.get().driver_destruct(self._port, self._driver)
+            self._driver = None
         if port:
             driver = IoRegistry.get().driver_factory(port, self._driver_opts)
             if isinstance(driver, InDriver):
@@ -68,37 +70,40 @@ class InputNode(BusNode, ABC):
         self._port = port
         self.data = self.read()
 
-    def plugin(self, bus: MsgBus) -> None:
-        super().plugin(bus)
-        self._reader_thread = Thread(name=self.id, target=self._reader, daemon=True)
-        self._reader_thread.start()
+    def plugin(self, bus: MsgBus, announce: bool = True) -> None:
+        super().plugin(bus, announce)
+        self._ticker.start()
 
     def pullout(self) -> bool:
-        if self._reader_thread:
-            self._reader_stop = True
-            self._reader_thread.join(timeout=5)
-            self._reader_thread = None
+        self._ticker.stop()
         self.port = ''
         return super().pullout()
 
     def read(self):
         raise NotImplementedError()
 
-    def _reader(self) -> None:
-        log.debug('InputNode.reader started')
-        while not self._reader_stop:
-            try:
-                self.data = self.read()
-                self.alert = None
-                log.brief('%s: read %f', self.id, self.data)
-                self.post(MsgData(self.id, self.data))
-            except (DriverReadError, Exception):
-                log.exception('Reader exception')
-                self.alert = ('Read error!', 'err')
-            time.sleep(self.interval)
-
-        self._reader_thread = None
-        self._reader_stop = False
+    def _next_interval(self) -> float:
+        """ delay until the next read, overload for adaptive sampling
+        """
+        return self.interval
+
+    def _publish(self) -> None:
+        """ post the data read, overload to filter
+        """
+        self.post(MsgData(self.id, self.data))
+
+    def _reader(self) -> float:
+        """ read and publish once, return the delay until next read
+        """
+        try:
+            self.data = self.read()
+            self.alert = None
+            log.brief('%s: read %f', self.id, self.data)
+            self._publish()
+        except (DriverReadError, Exception):
+            log.exception('Reader exception')
+            self.alert = ('Read error!', 'err')
+        return self._next_interval()
 
     def get_settings(self) -> list[tuple]:
         settings = super().get_settings()
@@ -138,6 +143,7 @@ class SwitchInput(InputNode):
 
     def __setstate__(self, state: dict[str, Any]) -> None:
         self.data = state['data']
+        self.publish = state.get('publish')
         SwitchInput.__init__(self, state['name'], state['port'],
                              interval=state['interval'], inverted=state['inverted'],
                              _cont=True)
@@ -162,6 +168,12 @@ class AnalogInput(InputNode):
     """ An analog input for anything read from a port driver.
         Port driver reads measurements in a worker thread.
 
+        Adaptive sampling is enabled by a min_interval < interval. The
+        reader then speeds up to min_interval as soon as the input changes
+        faster than rate, or the spread (std. deviation) of the recent
+        readings exceeds rate. With a flat signal the delay doubles with each
+        read, up to interval.
+
         Options:
             name     - unique name of this input node in UI
             port     - name of a IoRegistry port driver to read input
@@ -169,17 +181,33 @@ class AnalogInput(InputNode):
             interval - delay of reader loop, conversion time adds to this!
             unit     - unit of measurement for labels
             avg      - floating average, 1=no average, 2..5=depth of averaging
+            min_interval - shortest delay of adaptive sampling, default interval
+            rate     - change per minute [unit/min] to speed up sampling
+            deadband - post only changes >= deadband, see PublishPolicy
 
         Output:
-            float - posts each change of measurement in driver units
+            float - posts each change of measurement in driver units,
+                    unchanged values at least every 5 minutes
     """
     data_range = DataRange.ANALOG
+    PUBLISH = {'enabled': True, 'heartbeat': 300.0}
+
+    # count of recent readings for the spread of the signal
+    RECENT_CNT = 5
 
     def __init__(self, name: str, port: str, initval: float, unit: str,
                  interval: float = 10.0, avg: int = 0,
+                 min_interval: float = 0, rate: float = 0.1,
+                 deadband: float = 0,
                  _cont: bool = False):
         self.avg = min(max(1, avg), 5)
+        self._recent: deque[tuple[float, float]] = deque(maxlen=self.RECENT_CNT)
+        self._cur_interval: float = 0
         super().__init__(name, port, interval, _cont=_cont)
+        self.min_interval: float = min_interval or self.interval
+        self.rate: float = rate
+        if deadband:
+            self.deadband = deadband
         self.unit = unit
         self.initval = initval
         if initval:
@@ -190,15 +218,59 @@ class AnalogInput(InputNode):
         state = super().__getstate__()
         state["initval"] = self.initval
         state["avg"] = self.avg
+        state["min_interval"] = self.min_interval
+        state["rate"] = self.rate
         return state
 
     def __setstate__(self, state: dict[str, Any]) -> None:
         self.data = state['data']
+        self.publish = state.get('publish')
         AnalogInput.__init__(self, state['name'], state['port'],
                              state['initval'], state['unit'],
                              interval=state['interval'], avg=state['avg'],
+                             min_interval=state.get('min_interval', 0),
+                             rate=state.get('rate', 0.1),
                              _cont=True)
 
+    @property
+    def deadband(self) -> float:
+        return self.publish.deadband
+
+    @deadband.setter
+    def deadband(self, deadband: float) -> None:
+        self.publish.deadband = deadband
+        self.publish.enabled = True
+
+    @property
+    def heartbeat(self) -> float:
+        return self.publish.heartbeat
+
+    @heartbeat.setter
+    def heartbeat(self, heartbeat: float) -> None:
+        self.publish.heartbeat = heartbeat
+
+    def _next_interval(self) -> float:
+        now = time.time()
+        self._recent.append((now, float(self.data)))
+        slow = max(self.interval, self.min_interval)
+        fast = min(self.interval, self.min_interval)
+        if fast >= slow or len(self._recent) < 2:
+            self._cur_interval = self.interval
+            return self.interval
+
+        (t_prev, v_prev), (t_last, v_last) = self._recent[-2], self._recent[-1]
+        slope = abs(v_last - v_prev) / max(t_last - t_prev, 0.001) * 60
+        spread = statistics.pstdev([v for _, v in self._recent])
+        if slope > self.rate or spread > self.rate:
+            if self._cur_interval > fast:
+                log.brief('%s: sampling every %.1f s, change %.3f/min, spread %.3f',
+                          self.id, fast, slope, spread)
+            self._cur_interval = fast
+        else:
+            self._cur_interval = min(max(fast, self._cur_interval * 2), slow)
+        log.debug('%s: next read in %.1f s', self.id, self._cur_interval)
+        return self._cur_interval
+
     def read(self) -> float:
         val = self.data
         if self._driver:
@@ -214,6 +286,14 @@ class AnalogInput(InputNode):
                          self.unit, 'type="text"'))
         settings.append(('avg', 'Mittelwert [1=direkt]',
                          self.avg, 'type="number" min="1" max="5" step="1"'))
+        settings.append(('min_interval', 'Min. Leseintervall [s]',
+                         self.min_interval, 'type="number" min="1" max="600" step="1"'))
+        settings.append(('rate', f'Änderungsrate [{self.unit}/min]',
+                         self.rate, 'type="number" min="0" step="0.01"'))
+        settings.append(('deadband', f'Totband [{self.unit}]',
+                         self.deadband, 'type="number" min="0" step="0.01"'))
+        settings.append(('heartbeat', 'Max. Sendepause [s]',
+                         self.heartbeat, 'type="number" min="0" max="3600" step="10"'))
         return settings
 
 
@@ -240,16 +320,24 @@ class ScheduleInput(BusNode):
     ROLE = BusRole.IN_ENDP
     data_range = DataRange.BINARY
 
-    # time [s] to stop the scheduler thread
-    STOP_DURATION = 2
+    # longest wait [s] between checks of the plan, this follows
+    # corrections of the system clock, e.g. by NTP after boot
+    MAX_WAIT = 60 * 60
     # This limits CPU usage to find rare events with long gaps,
     # such as '0 4 1 1 fri' = Jan. 1st 4pm and Friday -> very rare!
     CRON_YEARS_DEPTH = 2
+    # the ON/OFF plan is compiled for this time span [s] ahead ...
+    PLAN_HORIZON = 24 * 60 * 60
+    # ... or for this count of cron events, whatever is reached first
+    PLAN_EVENTS = 1000
 
     def __init__(self, name: str, cronspec: str, _cont: bool = False):
         super().__init__(name, _cont=_cont)
-        self._scheduler_thread: Thread | None = None
-        self._scheduler_stop: bool = False
+        self._ticker: Ticker = Ticker(self.id, self._scheduler, offload=True)
+        self._first: bool = True
+        self._plan: list[tuple[float, float]] | None = None
+        self._plan_valid: float = 0
+        self._plan_utcoffset: Any = None
         self.cronspec = cronspec
         self.hires: bool = len(cronspec.split(' ')) > 5
         if not _cont:
@@ -263,6 +351,7 @@ class ScheduleInput(BusNode):
 
     def __setstate__(self, state: dict[str, Any]) -> None:
         self.data = state['data']
+        self.publish = state.get('publish')
         ScheduleInput.__init__(self, state['name'], state['cronspec'], _cont=True)
 
     def __str__(self) -> str:
@@ -279,96 +368,91 @@ class ScheduleInput(BusNode):
         croniter(cronspec, now, day_or=False,
                  max_years_between_matches=self.CRON_YEARS_DEPTH)
 
-        self._stop_thread()
         self._cronspec = cronspec
-        self._start_thread()
+        self.hires = len(cronspec.split(' ')) > 5
+        self._plan = None
+        self._ticker.wake()  # a running scheduler applies it immediately
 
-    def plugin(self, bus: MsgBus) -> None:
-        super().plugin(bus)
-        self._start_thread()
+    def plugin(self, bus: MsgBus, announce: bool = True) -> None:
+        super().plugin(bus, announce)
+        if not self._ticker.running:
+            log.brief('ScheduleInput %s: start', self.id)
+            self._first = True
+            self._ticker.start()
 
     def pullout(self) -> bool:
-        self._stop_thread()
+        if self._ticker.running:
+            self._ticker.stop(timeout=1)
+            # turn off? Probably not, to avoid flicker when schedule is changed
+            log.brief('ScheduleInput %s: end', self.id)
         return super().pullout()
 
-    def _start_thread(self) -> None:
-        if self._bus:
-            self._scheduler_thread = Thread(name=self.id, target=self._scheduler, daemon=True)
-            self._scheduler_thread.start()
-
-    def _stop_thread(self) -> None:
-        if self._scheduler_thread:
-            self._scheduler_stop = True
-            self._scheduler_thread.join()
-            self._scheduler_thread = None
-
-    def _scheduler(self) -> None:
-        log.brief('ScheduleInput %s: start', self.id)
-
-        now = datetime.now().astimezone()  # = local tz, this enables DST
-        cron = croniter(self._cronspec, now, ret_type=float, day_or=False,
-                        max_years_between_matches=self.CRON_YEARS_DEPTH)
+    def _compile(self, start: float) -> None:
+        """ Compile cronspec into a list of ON intervals (begin, end) from
+            start until PLAN_HORIZON or PLAN_EVENTS is reached. Events less
+            than one tick apart are concatenated, a single event is ON for
+            one tick. The plan is valid until _plan_valid, a span still
+            running at that time is continued by the next compilation.
+        """
         tick = 1 if self.hires else 60
-        log.debug(' now  %s = %f, 1 tick = %d s', now, time.time(), tick)
-
+        start_dt = datetime.fromtimestamp(start).astimezone()  # = local tz, this enables DST
+        cron = croniter(self._cronspec, start_dt, ret_type=float, day_or=False,
+                        max_years_between_matches=self.CRON_YEARS_DEPTH)
+        plan: list[tuple[float, float]] = []
+        limit = start + self.PLAN_HORIZON
         try:
-            cron.get_next()
-            while True:
-                sec_now: float = time.time()  # reference for each loop to avoid drift
-                sec_prev: float = cron.get_prev()  # look one event back
-                log.debug(' prev %s = %f',
-                          str(cron.get_current(ret_type=datetime)),
-                          sec_prev - sec_now)
-
-                sec_next: float = cron.get_next()  # seconds 'til future cron event
-                log.debug(' next %s = %f',
-                          str(cron.get_current(ret_type=datetime)),
-                          sec_next - sec_now)
-
-                if self._scheduler_stop:
-                    return  # cleanup is done in finally!
-
-                if sec_next - sec_prev > tick:
-                    # as we concatenate events <1 tick apart, must be a pause
-                    self.data = 0
-                    log.info('ScheduleInput %s: output 0 for %f s',
-                             self.id, sec_next - sec_now)
-                    self.post(MsgData(self.id, self.data))
-
-                    # while (sec_next > time.time()):
-                    while (sec_next - time.time() > self.STOP_DURATION):
-                        time.sleep(self.STOP_DURATION)
-                        if self._scheduler_stop:
-                            return  # cleanup is done in finally!
-
-                # now look how many ticks to concatenate
-                while True:
-                    candidate = cron.get_next()
-                    log.debug('  ? %s = + %f s',
-                              str(cron.get_current(ret_type=datetime)),
-                              candidate - sec_next)
-                    if candidate - sec_next > tick:
-                        log.debug('  ... busted!')
+            begin = end = cron.get_prev()  # a span might be running
+            for _ in range(self.PLAN_EVENTS):
+                event = cron.get_next()
+                if event - end > tick:
+                    plan.append((begin, max(end, begin + tick)))
+                    begin = event
+                    if event > limit:
                         break
-                    sec_next = candidate
-
-                if self._scheduler_stop:
-                    return  # cleanup is done in finally!
-
-                self.data = 100
-                log.info('ScheduleInput %s: output 100 for %f s',
-                         self.id, sec_next - time.time())
-                self.post(MsgData(self.id, self.data))
-
-                while (sec_next > time.time()):
-                    time.sleep(self.STOP_DURATION)
-                    if self._scheduler_stop:
-                        return  # cleanup is done in finally!
-        finally:
-            # turn off? Probably not, to avoid flicker when schedule is changed
-            self._scheduler_thread = None
-            self._scheduler_stop = False
-            log.brief('ScheduleInput %s: end', self.id)
+                end = event
+            else:
+                plan.append((begin, max(end, begin + tick)))
+                begin = end
+        except CroniterBadDateError:
+            log.error('ScheduleInput %s: no event of %s within %d years',
+                      self.id, self._cronspec, self.CRON_YEARS_DEPTH)
+            begin = limit
+
+        self._plan = [(b, e) for (b, e) in plan if e > start]
+        self._plan_valid = begin
+        self._plan_utcoffset = start_dt.utcoffset()
+        log.debug('ScheduleInput %s: plan of %d spans until %s',
+                  self.id, len(self._plan), datetime.fromtimestamp(self._plan_valid))
+
+    def _next_change(self, now: float) -> tuple[int, float]:
+        """ Return output at time now, and the time it changes next.
+            The plan is recompiled if it is outdated, or if the UTC
+            offset changed (DST switch or a new time zone).
+        """
+        if self._plan is None or now >= self._plan_valid \
+           or datetime.now().astimezone().utcoffset() != self._plan_utcoffset:
+            self._compile(now)
+        for (begin, end) in self._plan or []:
+            if now < begin:
+                return 0, begin
+            if now < end:
+                return 100, end
+        return 0, self._plan_valid
+
+    def _scheduler(self) -> float:
+        """ post the output if changed, return the time until next change
+        """
+        now = time.time()
+        value, until = self._next_change(now)
+        if self._first or value != self.data:
+            self.data = value
+            log.info('ScheduleInput %s: output %d for %f s',
+                     self.id, self.data, until - now)
+            self.post(MsgData(self.id, self.data))
+            self._first = False
+
+        # sleep until next change, a new cronspec or pullout wake us
+        return min(max(0.0, until - time.time()), self.MAX_WAIT)
 
     def get_settings(self) -> list[tuple]:
         settings = super().get_settings()
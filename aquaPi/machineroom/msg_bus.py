@@ -1,14 +1,15 @@
 #!/usr/bin/env python3
 
 from abc import (ABC, abstractmethod)
+from collections import deque
 import logging
 import time
 from queue import Queue
 from enum import (Enum, Flag, auto)
-from typing import (Iterable, Any)
-from threading import (Condition, Thread)
+from typing import (Callable, Iterable, Any)
+from threading import (Condition, Thread, current_thread, local)
 
-from .msg_types import (Msg, MsgInfra, MsgHello, MsgData, MsgBye)
+from .msg_types import (Msg, MsgInfra, MsgHello, MsgReady, MsgData, MsgBye)
 
 
 log = logging.getLogger('machineroom.msg_bus')
@@ -37,15 +38,81 @@ class DataRange(Enum):
 #############################
 
 
+class PublishPolicy:
+    """ Filter for MsgData posted by a node, to save dispatch, change
+        reports and history entries for values that did not change.
+        A value is posted, if it differs by at least deadband (absolute)
+        or relative (% of last posted value) from the last one posted,
+        or if the node's alert changed. Non-numeric data is posted when
+        not equal. A value within the band is posted nevertheless when
+        the node was silent for heartbeat seconds, this keeps charts
+        alive. The heartbeat is checked on post attempts, there's no timer.
+        A disabled policy (default) posts everything.
+    """
+    def __init__(self, enabled: bool = False, deadband: float = 0.0,
+                 relative: float = 0.0, heartbeat: float = 0.0):
+        self.enabled: bool = enabled
+        self.deadband: float = deadband
+        self.relative: float = relative
+        self.heartbeat: float = heartbeat
+        self._last: Any = None
+        self._last_alert: Any = None
+        self._last_time: float = 0.0
+        self.suppressed: int = 0
+
+    def __getstate__(self) -> dict[str, Any]:
+        return {'enabled': self.enabled, 'deadband': self.deadband,
+                'relative': self.relative, 'heartbeat': self.heartbeat}
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        PublishPolicy.__init__(self, **state)
+
+    def __repr__(self) -> str:
+        return (f'{type(self).__name__}(enabled={self.enabled}, deadband={self.deadband}, '
+                f'relative={self.relative}, heartbeat={self.heartbeat})')
+
+    def _in_band(self, data: Any) -> bool:
+        last = self._last
+        if isinstance(data, (int, float)) and isinstance(last, (int, float)):
+            delta = abs(data - last)
+            band = max(self.deadband, abs(last) * self.relative / 100)
+            return delta == 0 or delta < band
+        return data == last
+
+    def accept(self, data: Any, alert: Any = None, force: bool = False) -> bool:
+        """ check if data should be posted, and remember it if so,
+            forced data is always posted
+        """
+        now = time.time()
+        if not force and self.enabled and self._last_time \
+           and alert == self._last_alert \
+           and self._in_band(data) \
+           and not (self.heartbeat and now - self._last_time >= self.heartbeat):
+            self.suppressed += 1
+            return False
+        self._last = data
+        self._last_alert = alert
+        self._last_time = now
+        return True
+
+    def reset(self) -> None:
+        """ forget the last posted value, next post passes
+        """
+        self._last_time = 0.0
+
+
 class BusNode(ABC):
     """ BusNode is a minimal bus participant
         It has little overhead, can only post messages.
         The bus protocol (MsgHello/MsgBye)
         is handled internally. Overload if you need one of them,
         but don't forget to call super().listen(...)
+        MsgData is filtered by the node's PublishPolicy, PUBLISH
+        holds the defaults for a node class.
     """
     ROLE: BusRole = BusRole.UNDEF
     data_range = DataRange.UNDEF
+    PUBLISH: dict[str, Any] = {}
 
     def __init__(self, name: str, _cont: bool = False):
         self.name = name
@@ -64,6 +131,8 @@ class BusNode(ABC):
         self._bus: 'MsgBus' | None = None  # forward ref to class MsgBus
         if not _cont:
             self.data: Any = 0
+        if not _cont or not getattr(self, 'publish', None):
+            self.publish: PublishPolicy = PublishPolicy(**self.PUBLISH)
         self.unit = ''
         self.alert: tuple[str, str] | None = None
 
@@ -75,10 +144,12 @@ class BusNode(ABC):
         state["receives"] = self.receives
         state["unit"] = self.unit
         state["data_range"] = self.data_range.name
+        state["publish"] = self.publish
         return state
 
     def __setstate__(self, state: dict[str, Any]) -> None:
         self.data = state['data']
+        self.publish = state.get('publish')
         BusNode.__init__(self, state['name'], _cont=True)
         self.receives = state['receives']
         self.unit = state['unit']
@@ -86,13 +157,18 @@ class BusNode(ABC):
     def __str__(self) -> str:
         return f'{type(self).__name__}({self.name})'
 
-    def plugin(self, bus: 'MsgBus') -> None:
+    def plugin(self, bus: 'MsgBus', announce: bool = True) -> None:
+        """ plug into bus and announce it with MsgHello,
+            MsgBus.plugin_all() registers in advance and doesn't announce
+        """
         if self._bus:
             self._bus.unregister(self)
             self._bus = None
-        bus.register(self)
+        if self not in bus.nodes:
+            bus.register(self)
         self._bus = bus
-        self.post(MsgHello(self.id))
+        if announce:
+            self.post(MsgHello(self.id))
         log.info('%s plugged in, role %s', str(self), str(self.ROLE))
 
     def pullout(self) -> bool:
@@ -104,8 +180,19 @@ class BusNode(ABC):
         log.info('%s pulled', str(self))
         return True
 
-    def post(self, msg: Msg) -> None:
+    def post(self, msg: Msg, force: bool = False) -> None:
+        """ post msg to the bus, MsgData only if publish policy
+            accepts it or if forced. Data posted while listening
+            to forced data is forced too, a re-post of the inputs
+            must reach the end of each chain.
+        """
         if self._bus:
+            if isinstance(msg, MsgData) and msg.sender == self.id:
+                force = force or self._bus.dispatching_forced()
+                if not self.publish.accept(msg.data, self.alert, force):
+                    log.debug('%s suppressed %s', str(self), str(msg))
+                    return
+                msg.forced = force
             self._bus.post(msg)
 
     def listen(self, msg: Msg) -> None:
@@ -115,36 +202,35 @@ class BusNode(ABC):
             sender = self._bus.get_node(msg.sender)
             if self in sender.get_receives(True):
                 log.debug('%s.causes %s to post MsgData', str(msg), str(self))
-                self.post(MsgData(self.id, self.data))
+                self.post(MsgData(self.id, self.data), force=True)
+        elif isinstance(msg, MsgReady) \
+           and self.ROLE == BusRole.IN_ENDP:
+            log.debug('%s.causes %s to post MsgData', str(msg), str(self))
+            self.post(MsgData(self.id, self.data), force=True)
 
         #TODO: should we inherit sender.unit if we receive 'em? How about reverse order of birth? Currently only aux nodes inherit the the sources' unit, get_settings might be a better place
 
     def get_receives(self, recurse: bool = False) -> list['BusNode']:
-        receives: list['BusNode'] = []
-        if self._bus:
-            for rcv in self.receives:
-                node = self._bus.get_node(rcv)
-                if node:
-                    log.debug('%s.get_receives %r', str(self), rcv)
-                    receives.append(node)
-            if recurse:
-                for s_node in receives:
-                    receives = s_node.get_receives(recurse) + receives
-        return receives
+        """ nodes this one receives from, with recurse all upstream
+            nodes, the most distant first
+        """
+        if not self._bus:
+            return []
+        graph = self._bus.graph()
+        if recurse:
+            return graph.upstream(self)
+        return list(graph.up.get(self.id, []))
 
     def get_listeners(self, recurse: bool = False) -> list['BusNode']:
-        listeners: list[BusNode] = []
-        if self._bus:
-            for node in self._bus.nodes:
-                if node.ROLE in (BusRole.HISTORY, BusRole.ALERTS):
-                    continue
-                if self.id in node.receives:
-                    listeners.append(node)
-                    if recurse:
-                        s_node = self._bus.get_node(node.id)
-                        if s_node:
-                            listeners = listeners + s_node.get_listeners(recurse)
-        return listeners
+        """ nodes receiving from this one, with recurse all downstream
+            nodes, the nearest first. History & alerts are not included.
+        """
+        if not self._bus:
+            return []
+        graph = self._bus.graph()
+        if recurse:
+            return graph.downstream(self)
+        return [n for n in graph.down.get(self.id, []) if n.ROLE not in NodeGraph.TAPS]
 
     @abstractmethod
     def get_settings(self) -> list[tuple]:
@@ -174,6 +260,7 @@ class BusListener(BusNode, ABC):
 
     def __setstate__(self, state: dict[str, Any]) -> None:
         self.data = state['data']
+        self.publish = state.get('publish')
         BusListener.__init__(self, state['name'],
                              receives=state['receives'],
                              _cont=True)
@@ -189,6 +276,107 @@ class BusListener(BusNode, ABC):
 #############################
 
 
+class NodeGraph:
+    """ The adjacency of the nodes on a bus, derived from node.receives.
+        MsgBus builds it on demand and drops it whenever nodes are plugged
+        in or pulled out. Closures and topological order are computed once,
+        cycles are tolerated.
+    """
+    # roles which only listen, they are never part of a chain
+    TAPS = (BusRole.HISTORY, BusRole.ALERTS)
+
+    def __init__(self, nodes: Iterable[BusNode]):
+        self.nodes: list[BusNode] = sorted(nodes, key=lambda n: n.id)
+        self.index: dict[str, list[BusNode]] = {}
+        for node in self.nodes:
+            for key in {node.id, node.name}:
+                self.index.setdefault(key, []).append(node)
+        self.up: dict[str, list[BusNode]] = {n.id: [] for n in self.nodes}
+        self.down: dict[str, list[BusNode]] = {n.id: [] for n in self.nodes}
+        for node in self.nodes:
+            for rcv in node.receives:
+                src = self.get_node(rcv)
+                if src and src not in self.up[node.id]:
+                    self.up[node.id].append(src)
+                    self.down[src.id].append(node)
+        self._upstream: dict[str, list[BusNode]] = {}
+        self._downstream: dict[str, list[BusNode]] = {}
+        self._order: list[BusNode] | None = None
+        self._routes: dict[str, list[BusNode]] = {}
+
+    def get_node(self, id_or_name: str) -> BusNode | None:
+        lst = self.index.get(id_or_name)
+        return lst[0] if lst and len(lst) == 1 else None
+
+    def upstream(self, node: BusNode) -> list[BusNode]:
+        """ all nodes node receives from directly or indirectly,
+            each once, sources first
+        """
+        if node.id not in self._upstream:
+            closure: list[BusNode] = []
+            seen = {node.id}
+            stack = [(node, iter(self.up.get(node.id, [])))]
+            while stack:  # depth first, post-order
+                src = next(stack[-1][1], None)
+                if src is None:
+                    done = stack.pop()[0]
+                    if done is not node:
+                        closure.append(done)
+                elif src.id not in seen:
+                    seen.add(src.id)
+                    stack.append((src, iter(self.up[src.id])))
+            self._upstream[node.id] = closure
+        return self._upstream[node.id]
+
+    def downstream(self, node: BusNode) -> list[BusNode]:
+        """ all nodes receiving from node directly or indirectly,
+            each once, nearest first, except TAPS
+        """
+        if node.id not in self._downstream:
+            closure: list[BusNode] = []
+            seen = {node.id}
+            queue = [node]
+            for cur in queue:  # breadth first, queue grows while iterating
+                for dst in self.down.get(cur.id, []):
+                    if dst.id not in seen and dst.ROLE not in self.TAPS:
+                        seen.add(dst.id)
+                        closure.append(dst)
+                        queue.append(dst)
+            self._downstream[node.id] = closure
+        return self._downstream[node.id]
+
+    def order(self) -> list[BusNode]:
+        """ all nodes, each after the nodes it receives from,
+            nodes in a cycle are appended at the end
+        """
+        if self._order is None:
+            pending = {n.id: len(self.up[n.id]) for n in self.nodes}
+            order = [n for n in self.nodes if not pending[n.id]]
+            for cur in order:  # Kahn, order grows while iterating
+                for dst in self.down[cur.id]:
+                    pending[dst.id] -= 1
+                    if not pending[dst.id]:
+                        order.append(dst)
+            if len(order) < len(self.nodes):
+                log.warning('Cycle in node graph: %s',
+                            ', '.join(n.id for n in self.nodes if pending[n.id] > 0))
+                order += [n for n in self.nodes if pending[n.id] > 0]
+            self._order = order
+        return self._order
+
+    def route(self, sender: str) -> list[BusNode] | None:
+        """ the receivers of MsgData from sender in topological order,
+            or None if sender is no node
+        """
+        if sender not in self._routes:
+            if sender not in self.up:
+                return None
+            self._routes[sender] = [n for n in self.order()
+                                    if n.id != sender
+                                    and (sender in n.receives or '*' in n.receives)]
+        return self._routes[sender]
+
+
 class MsgBus:
     """ Communication channel between all registered
         BusNodes.
@@ -197,31 +385,46 @@ class MsgBus:
         Msg dispatcher can run as blocking loop of post()
         or in a worker thread. Unthreaded is much faster
         and easier to debug, thus the default.
+        Messages posted by listeners within the worker go to a backlog
+        instead of the (bounded) queue, which the worker must not wait
+        for, and are dispatched before the next queued message.
+        Compiled mode delivers MsgData through a receiver list per
+        sender, taken from the node graph, instead of filtering all
+        nodes for each message. Other messages, and data from senders
+        not on the bus, take the generic path.
         Several get_* methods build the interface to Flask backend
     """
 
-    def __init__(self, threaded: bool = False):
+    def __init__(self, threaded: bool = False, compiled: bool = False):
         self._threaded = threaded
+        self._compiled = compiled
         self.nodes: set[BusNode] = set()
         self.dbg_cnt: int = 0
         self._changes: set[str] = set()
         self._changed = Condition()
+        self._change_hooks: list[Callable[[str], None]] = []
+        self._topology_hooks: list[Callable[[BusNode], None]] = []
         self._queue: Queue | None = None
+        self._backlog: deque[Msg] = deque()
+        self._worker: Thread | None = None
+        self._graph: NodeGraph | None = None
+        self._context = local()  # .forced while dispatching forced data
 
         if threaded:
             self._queue = Queue(maxsize=10)
-            Thread(target=self._dispatch, daemon=True).start()
+            self._worker = Thread(target=self._dispatch, daemon=True)
+            self._worker.start()
 
     def __getstate__(self) -> dict[str, Any]:
-        state = {'nodes': self.nodes, 'threaded': self._threaded}
+        state = {'nodes': self.nodes, 'threaded': self._threaded,
+                 'compiled': self._compiled}
         log.debug('MsgBus.getstate %r', state)
         return state
 
     def __setstate__(self, state: dict[str, Any]) -> None:
         log.debug('MsgBus.setstate %r', state)
-        MsgBus.__init__(self, state['threaded'])
-        for n in state['nodes']:
-            n.plugin(self)
+        MsgBus.__init__(self, state['threaded'], state.get('compiled', False))
+        self.plugin_all(state['nodes'])
 
     def __str__(self) -> str:
         return f'{type(self).__name__}({len(self.nodes)} nodes)'
@@ -239,6 +442,33 @@ class MsgBus:
             # empty the queue before nodes change
             self._queue.join()
         self.nodes.add(node)
+        self._graph = None
+        self._topology_changed(node)
+
+    def plugin_all(self, nodes: Iterable[BusNode]) -> None:
+        """ Plug in several nodes at once, e.g. a loaded topology.
+            Instead of a MsgHello for each node, which lets inputs post
+            again and again, a single MsgReady is posted when all are
+            plugged in.
+            Raises exception if duplicate id.
+        """
+        nodes = list(nodes)
+        known = {n.id for n in self.nodes} | {n.name for n in self.nodes}
+        for node in nodes:
+            if node.id in known or node.name in known:
+                raise Exception(f'Duplicate node: name {node.name}, id {node.id}')
+            known |= {node.id, node.name}
+
+        if self._queue:
+            # empty the queue before nodes change
+            self._queue.join()
+        self.nodes.update(nodes)
+        self._graph = None
+        for node in nodes:
+            node.plugin(self, announce=False)
+        for node in nodes:
+            self._topology_changed(node)
+        self.post(MsgReady('*'))
 
     def unregister(self, node: BusNode):
         """ Remove BusNode from bus. Do not call directly,
@@ -249,6 +479,8 @@ class MsgBus:
                 # empty the queue before nodes change
                 self._queue.join()
             self.nodes.remove(node)
+            self._graph = None
+            self._topology_changed(node)
 
     def post(self, msg: Msg) -> None:
         """ Put message into the queue or dispatch in a
@@ -261,7 +493,10 @@ class MsgBus:
         msg.dbg_cnt = self.dbg_cnt
         log.debug('%s   post + %s', str(self), str(msg))
         if self._queue:
-            self._queue.put(msg, block=True, timeout=5)
+            if current_thread() is self._worker:
+                self._backlog.append(msg)
+            else:
+                self._queue.put(msg, block=True, timeout=5)
         else:
             self._dispatch_one(msg)
 
@@ -271,11 +506,20 @@ class MsgBus:
         while self._queue:  # always True, make mypy happy
             msg = self._queue.get()
             self._dispatch_one(msg)
+            while self._backlog:
+                self._dispatch_one(self._backlog.popleft())
             self._queue.task_done()
 
     def _dispatch_one(self, msg: Msg) -> None:
         """ Dispatch one message to all listeners in a blocking loop.
         """
+        if self._compiled and type(msg) is MsgData:
+            route = self.graph().route(msg.sender)
+            if route is not None:
+                self._deliver(route, msg)
+                self.report_change(msg.sender)
+                return
+
         # dispatch the message
         log.info('%s =>', str(msg))
         rcv_nodes: set[BusNode] = set()
@@ -292,11 +536,9 @@ class MsgBus:
             rcv_nodes = {n for n in rcv_nodes
                          if {msg.sender, '*'}.intersection(n.receives)}
 
-        log.debug('===== %s to be received by: %s', str(msg), str(rcv_nodes))
+        log.debug('===== %s to be received by: %s', msg, rcv_nodes)
 
-        for n in rcv_nodes:
-            log.info('  %s -> %s', str(msg), str(n))
-            n.listen(msg)
+        self._deliver(rcv_nodes, msg, verbose=True)
 
         if isinstance(msg, MsgData):
             log.debug('  send change notification for %s', str(msg))
@@ -304,6 +546,26 @@ class MsgBus:
 
         log.debug('===== %s DONE', str(msg))
 
+    def _deliver(self, nodes: Iterable[BusNode], msg: Msg, verbose: bool = False) -> None:
+        """ let nodes listen to msg, remember if it is forced data
+            for the posts of the listeners. Unthreaded, this nests.
+            verbose logs each receiver, not in the compiled path.
+        """
+        outer = getattr(self._context, 'forced', False)
+        self._context.forced = isinstance(msg, MsgData) and msg.forced
+        try:
+            for n in nodes:
+                if verbose:
+                    log.info('  %s -> %s', str(msg), str(n))
+                n.listen(msg)
+        finally:
+            self._context.forced = outer
+
+    def dispatching_forced(self) -> bool:
+        """ True while the current thread dispatches forced data
+        """
+        return getattr(self._context, 'forced', False)
+
     def teardown(self) -> None:
         """ Prepare for shutdown, e.g. unplug all.
         """
@@ -315,16 +577,24 @@ class MsgBus:
         """ Find BusNode by id or name.
             id is derived from name, and both are unique.
         """
-        lst = [n for n in self.nodes if id_or_name in (n.id, n.name)]
-        return lst[0] if len(lst) == 1 else None
+        return self.graph().get_node(id_or_name)
+
+    def graph(self) -> NodeGraph:
+        """ the adjacency graph of current nodes
+        """
+        graph = self._graph
+        if graph is None:
+            graph = self._graph = NodeGraph(self.nodes)
+        return graph
 
     # former BusBroker functions, i.e. the interface for Flask backend
 
     def get_nodes(self, roles: set[BusRole] = None) -> list[BusNode]:
         """ return list of current nodes: { id:BusNode, ... }
-            filtered by set of roles, or all
+            filtered by set of roles, or all,
+            in topological order, i.e. inputs first
         """
-        return [n for n in self.nodes if not roles or n.ROLE in roles]
+        return [n for n in self.graph().order() if not roles or n.ROLE in roles]
 
     def get_controller_nodes(self):
         """ return list of controller nodes: { id:BusNode, ... }
@@ -364,7 +634,32 @@ class MsgBus:
             self._changes.add(node_id)
             self._changed.notify()
             log.debug('report_change notified & done: %s', node_id)
-            time.sleep(.01)  # this is a hack, I don't find the race cond.
+        for hook in list(self._change_hooks):
+            hook(node_id)
+
+    def add_change_hook(self, hook: Callable[[str], None]) -> None:
+        """ call hook(node_id) for each reported change, in addition
+            to wait_for_changes(); the hook must not block, it runs
+            in the thread reporting the change
+        """
+        self._change_hooks.append(hook)
+
+    def remove_change_hook(self, hook: Callable[[str], None]) -> None:
+        if hook in self._change_hooks:
+            self._change_hooks.remove(hook)
+
+    def add_topology_hook(self, hook: Callable[[BusNode], None]) -> None:
+        """ call hook(node) for each node plugged in or pulled out
+        """
+        self._topology_hooks.append(hook)
+
+    def remove_topology_hook(self, hook: Callable[[BusNode], None]) -> None:
+        if hook in self._topology_hooks:
+            self._topology_hooks.remove(hook)
+
+    def _topology_changed(self, node: BusNode) -> None:
+        for hook in list(self._topology_hooks):
+            hook(node)
 
     def wait_for_changes(self) -> set[str]:
         """ block until at least one node reported data changes,
@@ -31,10 +31,13 @@ class MsgData(Msg):
         an expectable way, close to Python truthness,
         Caveat: data='off' -> True
         Non-binary outputs should use 0=off, 100=full on (%)
+        forced data bypasses the publish policies, also of all nodes
+        posting in reaction to it
     """
     def __init__(self, sender: str, data: Any):
         super().__init__(sender)
         self.data = data
+        self.forced = False
 
     def __str__(self) -> str:
         return super().__str__() + f':{self.data}'
@@ -49,6 +52,13 @@ class MsgHello(MsgInfra):
     """
 
 
+class MsgReady(MsgInfra):
+    """ Announces that several nodes were plugged in at once, e.g. when
+        a topology was loaded. It replaces their MsgHello: each node with
+        role IN_ENDP posts its data once, updating all its listeners.
+    """
+
+
 class MsgBye(MsgInfra):
     """ Announces removal of a bus node.
         Dependant nodes can adjust their behavior.
@@ -3,11 +3,11 @@
 from abc import ABC
 import logging
 from typing import Any
-from threading import Thread
+from threading import (Condition, Lock, Thread)
 import time
 
 from .msg_types import (Msg, MsgData)
-from .msg_bus import (BusListener, BusRole, DataRange)
+from .msg_bus import (BusListener, BusRole, DataRange, MsgBus)
 from ..driver import (IoRegistry, OutDriver)
 
 
@@ -53,6 +53,7 @@ class DeviceNode(BusListener, ABC):
     def port(self, port: str) -> None:
         if self._driver:
             IoRegistry.get().driver_destruct(self._port, self._driver)
+            self._driver = None
         if port:
             driver = IoRegistry.get().driver_factory(port)
             if isinstance(driver, OutDriver):
@@ -98,6 +99,7 @@ class SwitchDevice(DeviceNode):
 
     def __setstate__(self, state: dict[str, Any]) -> None:
         self.data = state['data']
+        self.publish = state.get('publish')
         SwitchDevice.__init__(self, state['name'], state['receives'], state['port'],
                               inverted=state['inverted'], _cont=True)
 
@@ -137,8 +139,112 @@ class SwitchDevice(DeviceNode):
         return settings
 
 
+class SlowPwmEngine:
+    """ A single timing thread generating the edges of all slow PWM outputs.
+        Each channel runs its own cycle; a duty change is applied at the
+        next cycle boundary, thus neither threads nor cycles get restarted.
+        Access the singleton through SlowPwmEngine.get().
+    """
+    # shortest pulse [s], shorter high or low phases are skipped
+    MIN_PULSE = 0.1
+
+    _engine: 'SlowPwmEngine | None' = None
+    _engine_lock: Lock = Lock()
+
+    class Channel:
+        """ timing state of one slow PWM output
+        """
+        def __init__(self, device: 'SlowPwmDevice'):
+            self.device: 'SlowPwmDevice' = device
+            self.state: bool | None = None
+            self.cycle_start: float = 0.
+            self.next_edge: float = 0.  # 0 = start a new cycle asap
+
+    @classmethod
+    def get(cls) -> 'SlowPwmEngine':
+        with cls._engine_lock:
+            if not cls._engine:
+                cls._engine = SlowPwmEngine()
+            return cls._engine
+
+    def __init__(self):
+        self._channels: dict[str, SlowPwmEngine.Channel] = {}
+        self._cond: Condition = Condition()
+        self._thread: Thread | None = None
+
+    def add(self, device: 'SlowPwmDevice') -> None:
+        """ add an output, or wake the engine for a changed duty
+        """
+        with self._cond:
+            if device.id not in self._channels:
+                self._channels[device.id] = SlowPwmEngine.Channel(device)
+            if not self._thread:
+                self._thread = Thread(name='SlowPWM', target=self._run, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def remove(self, device: 'SlowPwmDevice') -> None:
+        with self._cond:
+            self._channels.pop(device.id, None)
+            self._cond.notify()
+
+    def _next_edge(self, chan: 'SlowPwmEngine.Channel', now: float) -> bool:
+        """ advance the channel's timing, return the new output state
+        """
+        cycle = max(2 * self.MIN_PULSE, chan.device.cycle)
+        cycle_end = chan.cycle_start + cycle
+        if chan.state and now < cycle_end - self.MIN_PULSE:
+            # end of high phase
+            chan.next_edge = cycle_end
+            return False
+
+        # start of a new cycle, pick up the latest duty; stay in sync
+        # with the previous cycle unless we're far behind
+        if chan.next_edge and now - cycle_end < cycle:
+            chan.cycle_start = cycle_end
+        else:
+            chan.cycle_start = now
+        hi_sec = min(max(0., chan.device.data), 100.) / 100 * cycle
+        if hi_sec < self.MIN_PULSE:
+            chan.next_edge = chan.cycle_start + cycle
+            return False
+        if hi_sec > cycle - self.MIN_PULSE:
+            chan.next_edge = chan.cycle_start + cycle
+        else:
+            chan.next_edge = chan.cycle_start + hi_sec
+        return True
+
+    def _run(self) -> None:
+        log.debug('SlowPwmEngine started')
+        while True:
+            edges: list[tuple[SlowPwmDevice, bool, bool]] = []
+            with self._cond:
+                if not self._channels:
+                    self._thread = None
+                    break
+                now = time.time()
+                for chan in self._channels.values():
+                    if chan.next_edge <= now:
+                        state = self._next_edge(chan, now)
+                        edges.append((chan.device, state, state != chan.state))
+                        chan.state = state
+
+            # drive outputs outside the lock, posts may come back via set()
+            for device, state, changed in edges:
+                device.edge(state, changed)
+
+            with self._cond:
+                if not edges and self._channels:
+                    wake = min(ch.next_edge for ch in self._channels.values())
+                    self._cond.wait(timeout=max(0., wake - time.time()))
+        log.debug('SlowPwmEngine stopped')
+
+
 class SlowPwmDevice(DeviceNode):
     """ An analog output to a binary GPIO pin or relay using slow PWM.
+        All slow PWM outputs are timed by the shared SlowPwmEngine, from
+        plugin() until pullout(). Changes of input are applied at the
+        next cycle boundary.
 
         Options:
             name       - unique name of this output node in UI
@@ -146,6 +252,8 @@ class SlowPwmDevice(DeviceNode):
             port       - name of a IoRegistry port driver to drive output
             inverted   - swap the boolean interpretation for active low outputs
             cycle      - optional cycle time in sec for generated PWM
+            post_edges - post each edge as 100/0, or else only the
+                         received percentage, with a PERCENT data range
 
         Output:
             drive output with PWM(input/100 * cycle), possibly inverted
@@ -154,27 +262,31 @@ class SlowPwmDevice(DeviceNode):
 
     def __init__(self, name: str, receives: str, port: str,
                  inverted: bool = False, cycle: float = 60.,
+                 post_edges: bool = True,
                  _cont: bool = False):
         super().__init__(name, receives, port, _cont=_cont)
         self.data: float = 50.0
         ##self.unit = '%' if self.data_range != DataRange.BINARY else '⏻'
         self.cycle = float(cycle)
+        self._post_edges: bool = True
+        self.post_edges = post_edges
         self._inverted = inverted
-        self._thread = None
-        self._thread_stop = False
-        self.set(self.data)
+        self._state: bool | None = None
         log.info('%s init to %f|%r|%r s', self.name, self.data, inverted, cycle)
 
     def __getstate__(self) -> dict[str, Any]:
         state = super().__getstate__()
         state["cycle"] = self.cycle
         state["inverted"] = self._inverted
+        state["post_edges"] = self.post_edges
         return state
 
     def __setstate__(self, state: dict[str, Any]) -> None:
         self.data = state['data']
+        self.publish = state.get('publish')
         SlowPwmDevice.__init__(self, state['name'], state['receives'], state['port'],
                                inverted=state['inverted'], cycle=state['cycle'],
+                               post_edges=state.get('post_edges', True),
                                _cont=True)
 
     @property
@@ -184,8 +296,30 @@ class SlowPwmDevice(DeviceNode):
     @inverted.setter
     def inverted(self, inverted: bool) -> None:
         self._inverted = inverted
+        if self._driver and self._state is not None:
+            self._driver.write(self._state if not self._inverted else not self._state)
+
+    @property
+    def post_edges(self) -> bool:
+        return self._post_edges
+
+    @post_edges.setter
+    def post_edges(self, post_edges: bool) -> None:
+        # the settings form sends 0/1
+        self._post_edges = bool(post_edges)
+        self.data_range = DataRange.BINARY if self._post_edges else DataRange.PERCENT
+        self.unit = '' if self._post_edges else '%'
+        if not self._post_edges:
+            self.post(MsgData(self.id, round(self.data, 4)))
+
+    def plugin(self, bus: MsgBus, announce: bool = True) -> None:
+        super().plugin(bus, announce)
         self.set(self.data)
 
+    def pullout(self) -> bool:
+        SlowPwmEngine.get().remove(self)
+        return super().pullout()
+
     def listen(self, msg: Msg) -> None:
         if isinstance(msg, MsgData):
             log.debug('%s: ======= received %f from %s', self.id, msg.data, msg.sender)
@@ -193,44 +327,24 @@ class SlowPwmDevice(DeviceNode):
 
         super().listen(msg)
 
-    def _pulse(self, hi_sec: float, cycle: float) -> None:
-        def toggle_and_wait(state: bool, end: float) -> bool:
-            start = time.time()
-            if self._driver:
-                self._driver.write(state  if not self._inverted else not state)
+    def edge(self, state: bool, changed: bool) -> None:
+        """ called by SlowPwmEngine for each edge, or cycle start
+        """
+        self._state = state
+        if changed and self._driver:
+            self._driver.write(state if not self._inverted else not state)
+        if self.post_edges:
             log.debug('%s: ======= posts %d', self.id, 100 if state else 0)
-            self.post(MsgData(self.id, 100  if state else 0))
-            # avoid error accumulation by exact final sleep()
-            while time.time() < end - .1:
-                if self._thread_stop:
-                    self._thread_stop = False
-                    return False
-                time.sleep(.1)
-            time.sleep(max(0, end - time.time()))
-            log.debug('  _pulse needed %f instead of %f',
-                      time.time() - start, end - start)
-            return True
-
-        while True:
-            lead_edge = time.time()
-            if hi_sec > 0.1:
-                if not toggle_and_wait(True, lead_edge + hi_sec):
-                    return
-            if hi_sec < cycle:
-                if not toggle_and_wait(False, lead_edge + cycle):
-                    return
+            self.post(MsgData(self.id, 100 if state else 0))
 
     def set(self, perc: float) -> None:
         log.info('SlowPwmDevice %s: sets %.1f %%  (%.3f of %f s)',
                  self.id, perc, self.cycle * perc/100, self.cycle)
-        if self._thread:
-            self._thread_stop = True
-            self._thread.join()
         self.data = perc
-        self._thread = Thread(name='PIDpulse', target=self._pulse,
-                              args=[perc / 100 * self.cycle, self.cycle],
-                              daemon=True)
-        self._thread.start()
+        if self._bus:
+            SlowPwmEngine.get().add(self)
+        if not self.post_edges:
+            self.post(MsgData(self.id, round(self.data, 4)))
 
     def get_settings(self) -> list[tuple]:
         settings = super().get_settings()
@@ -238,6 +352,8 @@ class SlowPwmDevice(DeviceNode):
                          'type="number" min="10" max="300" step="1"'))
         settings.append(('inverted', 'Inverted', self.inverted,
                          'type="number" min="0" max="1"'))  # FIXME   'class="uk-checkbox" type="checkbox" checked' fixes appearance, but result is always False )
+        settings.append(('post_edges', 'Post edges', self.post_edges,
+                         'type="number" min="0" max="1"'))
         return settings
 
 
@@ -278,6 +394,7 @@ class AnalogDevice(DeviceNode):
 
     def __setstate__(self, state: dict[str, Any]) -> None:
         self.data = state['data']
+        self.publish = state.get('publish')
         AnalogDevice.__init__(self, state['name'], state['receives'],
                               state['port'], percept=state['percept'],
                               minimum=state['minimum'], maximum=state['maximum'], _cont=True)
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+
+import asyncio
+import logging
+from concurrent.futures import (Future, ThreadPoolExecutor)
+from threading import (Event, Lock, RLock, Thread, current_thread)
+from typing import Any, Callable
+
+
+log = logging.getLogger('machineroom.runtime')
+log.brief = log.warning  # alias, warning is used as brief info, level info is verbose
+
+
+# ========== timed work of nodes ==========
+
+
+class AsyncRuntime:
+    """ An optional asyncio event loop in a single thread, running the
+        Tickers of all nodes as tasks instead of a thread each.
+        Blocking calls, e.g. driver reads, are offloaded to a small
+        thread pool. Start it before nodes are plugged in, access the
+        singleton through AsyncRuntime.get(), which is None if not started.
+    """
+    # threads for offloaded blocking calls
+    WORKERS = 4
+
+    _runtime: 'AsyncRuntime | None' = None
+    _runtime_lock: Lock = Lock()
+
+    @classmethod
+    def get(cls) -> 'AsyncRuntime | None':
+        return cls._runtime
+
+    @classmethod
+    def start(cls, workers: int = 0) -> 'AsyncRuntime':
+        with cls._runtime_lock:
+            if not cls._runtime:
+                cls._runtime = AsyncRuntime(workers or cls.WORKERS)
+            return cls._runtime
+
+    @classmethod
+    def stop(cls) -> None:
+        """ cancel all tasks and end the loop
+        """
+        with cls._runtime_lock:
+            runtime, cls._runtime = cls._runtime, None
+        if runtime:
+            try:
+                runtime.spawn(runtime._cancel_all()).result(timeout=5)
+            except Exception:
+                log.exception('Async runtime: cancelling tasks failed')
+            runtime.loop.call_soon_threadsafe(runtime.loop.stop)
+            runtime._thread.join(timeout=5)
+            runtime._executor.shutdown(wait=False)
+            log.brief('Async runtime stopped')
+
+    def __init__(self, workers: int):
+        self.loop = asyncio.new_event_loop()
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix='offload')
+        self.loop.set_default_executor(self._executor)
+        self._thread = Thread(name='AsyncRuntime', target=self.loop.run_forever, daemon=True)
+        self._thread.start()
+        log.brief('Async runtime started, %d threads for blocking calls', workers)
+
+    async def _cancel_all(self) -> None:
+        tasks = [task for task in asyncio.all_tasks(self.loop)
+                 if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def spawn(self, coro) -> Future:
+        """ run coroutine as a task of the loop, from any thread
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def call_soon(self, func: Callable, *args: Any) -> None:
+        """ call func in the loop, from any thread
+        """
+        self.loop.call_soon_threadsafe(func, *args)
+
+    async def offload(self, func: Callable, *args: Any) -> Any:
+        """ await a blocking func, running in the thread pool
+        """
+        return await self.loop.run_in_executor(None, func, *args)
+
+
+class Ticker:
+    """ Calls step() again and again, waiting the seconds it returns
+        in between, until it returns None or stop() is called; wake()
+        cuts a wait short.
+        The Ticker runs as a task of the AsyncRuntime if that is
+        started, else in a daemon thread. With offload=True step()
+        runs in the runtime's thread pool, use it for blocking I/O,
+        this includes each post() to the bus: listeners drive outputs.
+        A step raising an exception is retried after its last wait.
+    """
+    # wait before retrying a failed step, if it never returned one
+    RETRY = 10.0
+    # shortest wait before a retry
+    RETRY_MIN = 1.0
+
+    def __init__(self, name: str, step: Callable[[], float | None],
+                 offload: bool = False):
+        self.name: str = name
+        self._step = step
+        self._offload: bool = offload
+        self._step_lock = RLock()  # held while step() runs
+        self._last_wait: float = 0.0
+        self._stop: Event = Event()
+        self._wakeup: Event = Event()  # also the pending wake() of a task
+        self._async_wakeup: asyncio.Event | None = None
+        self._runtime: AsyncRuntime | None = None
+        self._thread: Thread | None = None
+        self._task: Future | None = None
+
+    def __repr__(self) -> str:
+        mode = 'task' if self._task else 'thread' if self._thread else 'idle'
+        return f'{type(self).__name__}({self.name}, {mode})'
+
+    @property
+    def running(self) -> bool:
+        return (bool(self._thread and self._thread.is_alive())
+                or bool(self._task and not self._task.done()))
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stop = Event()  # a new one, a thread still ending keeps its own
+        self._runtime = AsyncRuntime.get()
+        if self._runtime:
+            self._async_wakeup = None  # created by the task, in its loop
+            self._task = self._runtime.spawn(self._arun(self._stop))
+        else:
+            self._thread = Thread(name=self.name, target=self._run, args=(self._stop,),
+                                  daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5) -> None:
+        """ end the Ticker, wait for a running step() to complete
+        """
+        self._stop.set()
+        self._wakeup.set()
+        if self._task:
+            self._task.cancel()  # cancels a wait immediately
+            self._task = None
+        if self._thread:
+            if self._thread is not current_thread():
+                self._thread.join(timeout=timeout)
+            self._thread = None
+        # an offloaded step may still run
+        if self._step_lock.acquire(timeout=timeout):
+            self._step_lock.release()
+
+    def wake(self) -> None:
+        """ call step() now, instead of after the current wait
+        """
+        self._wakeup.set()
+        # until the task created its event the wake is pending in _wakeup,
+        # the task's first step() honours it
+        wakeup = self._async_wakeup
+        if self._runtime and wakeup:
+            self._runtime.call_soon(wakeup.set)
+
+    def _locked_step(self, stop: Event) -> float | None:
+        with self._step_lock:
+            if stop.is_set():
+                return None
+            try:
+                wait = self._step()
+            except Exception:
+                wait = max(self.RETRY_MIN, self._last_wait or self.RETRY)
+                log.exception('%s: step failed, retry in %.1fs', self.name, wait)
+                return wait
+            if wait is not None:
+                self._last_wait = wait
+            return wait
+
+    def _run(self, stop: Event) -> None:
+        while not stop.is_set():
+            self._wakeup.clear()
+            wait = self._locked_step(stop)
+            if wait is None:
+                break
+            self._wakeup.wait(max(0.0, wait))
+
+    async def _arun(self, stop: Event) -> None:
+        runtime = self._runtime
+        self._async_wakeup = wakeup = asyncio.Event()
+        while not stop.is_set():
+            wakeup.clear()
+            self._wakeup.clear()
+            if self._offload and runtime:
+                wait = await runtime.offload(self._locked_step, stop)
+            else:
+                wait = self._locked_step(stop)
+            if wait is None:
+                break
+            if self._wakeup.is_set():
+                # woken during step(), let its queued event.set() run
+                await asyncio.sleep(0)
+                continue
+            try:
+                await asyncio.wait_for(wakeup.wait(), max(0.0, wait))
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+
+import logging
+import os
+from os import path
+import json
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+from typing import Any, Iterable
+
+from .msg_bus import (BusNode, BusRole, MsgBus, PublishPolicy)
+from .alert_nodes import AlertCond
+
+
+log = logging.getLogger('machineroom.topology')
+log.brief = log.warning  # alias, warning used as brief info, info is verbose
+
+
+# ========== topology persistence ==========
+
+# The topology file lists the nodes (type and id) of a bus, the state of
+# each node is kept in its own record in a directory next to it, e.g.
+#   topo.json      {"version": 1, "threaded": false, "compiled": false,
+#                   "nodes": [{"type": .., "id": ..}, ..]}
+#   topo.d/<id>.json   {"version": 1, "type": "AnalogInput", "state": {..}}
+# A node's state is its __getstate__() dict, restored by __setstate__().
+# Only classes derived from BusNode, AlertCond and PublishPolicy are
+# created while loading, nothing else is executed.
+
+TOPO_VERSION = 1
+
+# max. count of nodes created in parallel while loading
+LOAD_WORKERS = 8
+
+
+def state_dir(topo_file: str) -> str:
+    """ directory of node records belonging to topo_file
+    """
+    return path.splitext(topo_file)[0] + '.d'
+
+
+def _record_file(topo_file: str, node_id: str) -> str:
+    # node ids may contain '/' or xml char refs
+    return path.join(state_dir(topo_file), quote(node_id, safe='') + '.json')
+
+
+def _known_classes() -> dict[str, type]:
+    classes: dict[str, type] = {'PublishPolicy': PublishPolicy}
+    todo: list[type] = [BusNode, AlertCond]
+    while todo:
+        cls = todo.pop()
+        classes[cls.__name__] = cls
+        todo.extend(cls.__subclasses__())
+    return classes
+
+
+def encode(obj: Any) -> Any:
+    """ convert a node state into something json can write,
+        sets, tuples and objects with state are tagged
+    """
+    if obj is None or isinstance(obj, (bool, int, float, str)):
+        return obj
+    if isinstance(obj, dict):
+        return {str(k): encode(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [encode(v) for v in obj]
+    if isinstance(obj, tuple):
+        return {'__tuple__': [encode(v) for v in obj]}
+    if isinstance(obj, (set, frozenset)):
+        # sorted, an unchanged set gives an unchanged record
+        return {'__set__': sorted((encode(v) for v in obj),
+                                  key=lambda v: json.dumps(v, sort_keys=True))}
+    if isinstance(obj, (PublishPolicy, AlertCond)):
+        return {'__class__': type(obj).__name__,
+                'state': encode(obj.__getstate__())}
+    raise TypeError(f'{type(obj).__name__} can not be stored in a topology')
+
+
+def decode(obj: Any, classes: dict[str, type] | None = None) -> Any:
+    """ reverse of encode()
+    """
+    if classes is None:
+        classes = _known_classes()
+    if isinstance(obj, list):
+        return [decode(v, classes) for v in obj]
+    if isinstance(obj, dict):
+        if '__tuple__' in obj:
+            return tuple(decode(v, classes) for v in obj['__tuple__'])
+        if '__set__' in obj:
+            return {decode(v, classes) for v in obj['__set__']}
+        if '__class__' in obj:
+            cls = classes[obj['__class__']]
+            inst = cls.__new__(cls)
+            inst.__setstate__(decode(obj['state'], classes))
+            return inst
+        return {k: decode(v, classes) for k, v in obj.items()}
+    return obj
+
+
+def _write_tmp(fname: str, content: Any, sync: bool = False) -> str:
+    tmp_file = fname + '.tmp'
+    with open(tmp_file, 'w', encoding='utf8') as f_out:
+        json.dump(content, f_out, indent=2, ensure_ascii=False)
+        if sync:
+            f_out.flush()
+            os.fsync(f_out.fileno())
+    return tmp_file
+
+
+def _sync_dir(dirname: str) -> None:
+    # make the renames in dirname durable
+    fd = os.open(dirname or '.', os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_atomic(fname: str, content: Any) -> None:
+    """ write content as json to a temp file, then replace fname,
+        thus fname is either old or new, never partial
+    """
+    os.replace(_write_tmp(fname, content, sync=True), fname)
+    _sync_dir(path.dirname(fname))
+
+
+def _record(node: BusNode) -> dict[str, Any]:
+    return {'version': TOPO_VERSION,
+            'type': type(node).__name__,
+            'state': encode(node.__getstate__())}
+
+
+def save_nodes(topo_file: str, nodes: Iterable[BusNode]) -> None:
+    """ write the state records of several nodes: all temp files, one
+        sync for the batch, then they replace the records, and the
+        directory is synced once
+    """
+    os.makedirs(state_dir(topo_file), exist_ok=True)
+    written: list[tuple[str, str]] = []
+    for node in nodes:
+        fname = _record_file(topo_file, node.id)
+        written.append((_write_tmp(fname, _record(node)), fname))
+    if not written:
+        return
+    os.sync()
+    for tmp_file, fname in written:
+        os.replace(tmp_file, fname)
+    _sync_dir(state_dir(topo_file))
+
+
+def save_topology(topo_file: str, nodes: Iterable[BusNode],
+                  threaded: bool = False, compiled: bool = False) -> None:
+    """ write topology and the records of all nodes, remove
+        records of nodes no longer in the topology
+        Inputs are listed last, to have less traffic during load.
+    """
+    nodes = sorted(nodes, key=lambda n: n.ROLE == BusRole.IN_ENDP)
+    save_nodes(topo_file, nodes)
+    write_atomic(topo_file,
+                 {'version': TOPO_VERSION,
+                  'threaded': threaded,
+                  'compiled': compiled,
+                  'nodes': [{'type': type(n).__name__, 'id': n.id} for n in nodes]})
+
+    keep = {path.basename(_record_file(topo_file, n.id)) for n in nodes}
+    for entry in os.listdir(state_dir(topo_file)):
+        if entry.endswith('.json') and entry not in keep:
+            log.info('Removing stale node record %s', entry)
+            os.remove(path.join(state_dir(topo_file), entry))
+
+
+def load_topology(topo_file: str) -> MsgBus:
+    """ create a bus and all nodes of a topology
+        Nodes are created in parallel, their drivers may need some time
+        for I/O, then all are plugged in at once in the order saved.
+    """
+    with open(topo_file, 'r', encoding='utf8') as f_in:
+        topo = json.load(f_in)
+    if topo.get('version', 0) > TOPO_VERSION:
+        raise ValueError(f'{topo_file} has version {topo["version"]}, '
+                         f'this aquaPi supports up to {TOPO_VERSION}')
+
+    classes = _known_classes()
+    records = []
+    for entry in topo['nodes']:
+        with open(_record_file(topo_file, entry['id']), 'r', encoding='utf8') as f_in:
+            record = json.load(f_in)
+        cls = classes.get(record['type'])
+        if not cls or not issubclass(cls, BusNode):
+            raise ValueError(f'Unknown node type {record["type"]} of {entry["id"]}')
+        records.append((cls, record['state']))
+
+    def create(cls: type, state: dict[str, Any]) -> BusNode:
+        node = cls.__new__(cls)
+        node.__setstate__(decode(state, classes))
+        return node
+
+    with ThreadPoolExecutor(max_workers=LOAD_WORKERS,
+                            thread_name_prefix='load_node') as pool:
+        futures = [pool.submit(create, cls, state) for cls, state in records]
+        nodes = [future.result() for future in futures]
+
+    bus = MsgBus(threaded=topo.get('threaded', False),
+                 compiled=topo.get('compiled', False))
+    bus.plugin_all(nodes)
+    return bus
@@ -23,6 +23,7 @@ def settings() -> str:
 
     if request.method == 'POST':
         success = True
+        changed = set()
         for key in request.form.keys():
             # page has a (sub-) form for each controller. each sets a hidden input with sub_form name,
             # forward this after submit to allow this sub_form to render in unfolded state
@@ -38,7 +39,9 @@ def settings() -> str:
                 except ValueError:
                     new_value = request.form[key]
                 try:
-                    setattr(bus.get_node(node_attr[0]), node_attr[1], new_value)
+                    node = bus.get_node(node_attr[0])
+                    setattr(node, node_attr[1], new_value)
+                    changed.add(node)
                 except Exception as ex:
                     # FIXME translation of ex text??
                     # TODO highlight corresponding input
@@ -47,7 +50,8 @@ def settings() -> str:
 
         # TODO: validation in setters must raise exceptions
         if success:
-            mr.save_nodes(bus)
+            for node in changed:
+                mr.mark_dirty(node)
             log.brief("Saved changes")
             flash('Saved changes', 'success')
 
@@ -0,0 +1,109 @@
+""" ADS1115 inputs share one AdsSampler per chip. FakeADS1115 replaces
+    the chip object, the I²C device below it isn't simulated.
+"""
+import pytest
+
+from aquaPi.driver.base import PortFunc
+from aquaPi.driver.i2c_bus import I2cBus
+
+adc = pytest.importorskip('aquaPi.driver.DriverADC')
+AdsSampler = adc.AdsSampler
+DriverADS1115 = adc.DriverADS1115
+FakeADS1115 = adc.FakeADS1115
+
+
+@pytest.fixture(autouse=True)
+def samplers(monkeypatch):
+    monkeypatch.setattr(AdsSampler, '_samplers', {})
+    monkeypatch.setattr(AdsSampler, 'INTERVAL', 0.1)
+
+
+def _cfg(inp: int, initval: float) -> dict:
+    return {'adr': 0x48, 'cnt': 1, 'in': inp, 'fake': True, 'initval': initval}
+
+
+def test_inputs_share_sampler():
+    ph = DriverADS1115(_cfg(3, 2.49), PortFunc.Ain)
+    temp = DriverADS1115(_cfg(0, 1.2), PortFunc.Ain)
+    try:
+        assert ph._sampler is temp._sampler
+        assert ph.read() == pytest.approx(2.49, abs=0.05)
+        assert temp.read() == pytest.approx(1.2, abs=0.05)
+        assert ph._sampler.ads.conversions > 0
+    finally:
+        ph.close()
+        sampler = temp._sampler
+        temp.close()
+    assert AdsSampler._samplers == {}
+    assert sampler.ads.mode == adc.Mode.SINGLE
+    assert sampler.ads.gain == 2
+
+
+def test_sampler_per_bus():
+    buses = [I2cBus(None, None), I2cBus(None, None)]
+    samplers = [AdsSampler.get(bus, 0x48, FakeADS1115) for bus in buses]
+    assert samplers[0] is not samplers[1]
+    assert AdsSampler.get(buses[0], 0x48, FakeADS1115) is samplers[0]
+    assert set(AdsSampler._samplers) == {(buses[0], 0x48), (buses[1], 0x48)}
+
+
+def test_failed_reset_is_logged(caplog):
+    class BrokenADS1115(FakeADS1115):
+        def read(self, pin: int) -> int:
+            if self.mode == adc.Mode.SINGLE:
+                raise OSError('I²C remote I/O error')
+            return super().read(pin)
+
+    bus = I2cBus(None, None)
+    sampler = AdsSampler.get(bus, 0x49, lambda: BrokenADS1115(address=0x49))
+    sampler.register(1, gain=1)
+    assert sampler.voltage(1) is not None
+    sampler.unregister(1)
+    assert (bus, 0x49) not in AdsSampler._samplers
+    assert 'reset to power-on defaults failed' in caplog.text
+
+
+def test_conversion_awaited_without_bus(monkeypatch):
+    bus = I2cBus(None, None)
+    held = []
+    wait = AdsSampler._wait_conversion
+
+    def checked_wait(self) -> None:
+        held.append(bus._lock._is_owned())
+        wait(self)
+    monkeypatch.setattr(AdsSampler, '_wait_conversion', checked_wait)
+
+    class WaitingADS1115(FakeADS1115):
+        # ADS1x15.read() waits for the conversion, don't call it holding the bus
+        def read(self, pin: int) -> int:
+            held.append(bus._lock._is_owned())
+            return super().read(pin)
+
+    sampler = AdsSampler.get(bus, 0x4A, lambda: WaitingADS1115(address=0x4A))
+    sampler.ads.set_voltage(2, 3.3)
+    sampler.register(2, gain=-16)
+    try:
+        assert sampler.voltage(2) == pytest.approx(3.3, abs=0.05)
+        assert sampler.ads._pin == 2 + 4
+        assert held and not any(held)
+    finally:
+        sampler.unregister(2)
+
+
+def test_port_names_follow_address(monkeypatch):
+    bus = I2cBus(None, None)
+    monkeypatch.setattr(adc, 'SIMULATED', False)
+    monkeypatch.setattr(adc.I2cBus, 'get', lambda *args, **kwargs: bus)
+    monkeypatch.setattr(adc.board, 'SCL', type('Pin', (), {'id': 3}), raising=False)
+    monkeypatch.setattr(adc.board, 'SDA', type('Pin', (), {'id': 2}), raising=False)
+    monkeypatch.setattr(adc, '_detect_ads111x', lambda ads: True)
+    present = [0x48, 0x4A]
+    monkeypatch.setattr(adc, '_scan_i2c', lambda bus, adrs: (
+        (adr, FakeADS1115(address=adr)) for adr in adrs if adr in present))
+
+    ports = DriverADS1115.find_ports()
+    assert ports['ADC #3 in 1'].cfg == {'adr': 0x4A, 'cnt': 3, 'in': 1}
+    assert len(ports) == 8
+
+    present.remove(0x48)
+    assert set(DriverADS1115.find_ports()) == {f'ADC #3 in {ch}' for ch in range(4)}
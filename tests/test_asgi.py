@@ -0,0 +1,126 @@
+""" Slow requests and event streams of pages must not block the others
+"""
+import asyncio
+from threading import Event
+
+import pytest
+from flask import Flask, Response
+
+from aquaPi.asgi import AquaPiAsgi
+from aquaPi.pages.sse_util import format_msg, render_sse_template
+
+
+def _scope(path: str, accept: bytes) -> dict:
+    return {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': 'GET', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+            'root_path': '', 'query_string': b'',
+            'headers': [(b'host', b'test'), (b'accept', accept)],
+            'client': ('127.0.0.1', 4711), 'server': ('test', 80)}
+
+
+async def _get(app: AquaPiAsgi, path: str, accept: bytes = b'*/*',
+               gone: asyncio.Event | None = None) -> list[dict]:
+    """ one request, the client disconnects when gone is set
+    """
+    sent: list[dict] = []
+    requested = False
+
+    async def receive() -> dict:
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await (gone or asyncio.Event()).wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(msg: dict) -> None:
+        sent.append(msg)
+
+    await app(_scope(path, accept), receive, send)
+    return sent
+
+
+@pytest.fixture
+def flask_app():
+    app = Flask(__name__)
+    app.closed = Event()
+    app.release = Event()
+
+    @app.route('/page')
+    def page():
+        return render_sse_template('unused.html', lambda: '"tick"', delay=0.05)
+
+    @app.route('/blocked')
+    def blocked():
+        # like bus.wait_for_changes(), blocks until there is news
+        def events():
+            try:
+                while True:
+                    yield format_msg('"news"')
+                    app.release.wait()
+            finally:
+                app.closed.set()
+        return Response(events(), content_type='text/event-stream')
+
+    @app.route('/plain')
+    def plain():
+        app.release.set()
+        return 'ok'
+
+    @app.route('/slow')
+    def slow():
+        # completes early only if /plain runs meanwhile
+        return 'released' if app.release.wait(5) else 'timeout'
+
+    return app
+
+
+def test_slow_request_does_not_block(flask_app):
+    asgi = AquaPiAsgi(flask_app)
+
+    async def run() -> tuple[list[dict], list[dict]]:
+        slow = asyncio.ensure_future(_get(asgi, '/slow'))
+        await asyncio.sleep(0.2)
+        plain = await asyncio.wait_for(_get(asgi, '/plain'), 2)
+        return plain, await asyncio.wait_for(slow, 2)
+
+    plain, slow = asyncio.run(run())
+    assert plain[1]['body'] == b'ok'
+    assert slow[1]['body'] == b'released'
+
+
+def test_page_stream_does_not_block(flask_app):
+    asgi = AquaPiAsgi(flask_app)
+
+    async def run() -> list[dict]:
+        gone = asyncio.Event()
+        stream = asyncio.ensure_future(_get(asgi, '/page', b'text/event-stream', gone))
+        await asyncio.sleep(0.2)
+        for _ in range(3):
+            sent = await asyncio.wait_for(_get(asgi, '/plain'), 5)
+            assert sent[0]['status'] == 200
+            assert sent[1]['body'] == b'ok'
+        gone.set()
+        return await asyncio.wait_for(stream, 5)
+
+    sent = asyncio.run(run())
+    assert sent[0]['status'] == 200
+    assert sent[1]['body'] == b'data: "tick"\n\n'
+    assert len(sent) > 2
+
+
+def test_blocked_stream_closed_after_disconnect(flask_app):
+    asgi = AquaPiAsgi(flask_app)
+
+    async def run() -> list[dict]:
+        gone = asyncio.Event()
+        stream = asyncio.ensure_future(_get(asgi, '/blocked', b'text/event-stream', gone))
+        await asyncio.sleep(0.2)
+        gone.set()
+        return await asyncio.wait_for(stream, 5)
+
+    sent = asyncio.run(run())
+    assert sent[1]['body'] == b'data: "news"\n\n'
+    assert not flask_app.closed.is_set()
+    flask_app.release.set()
+    assert flask_app.closed.wait(5)
@@ -0,0 +1,30 @@
+""" 'flask --app aquaPi.assets assets build' runs without the machine room,
+    the build serves hashed names and skips fonts missing in static/
+"""
+from aquaPi import assets
+
+
+def test_build_and_serve(tmp_path):
+    app = assets.create_app()
+    assert 'machineroom' not in app.extensions
+    app.config['ASSETS_DIR'] = str(tmp_path / 'assets')
+
+    result = app.test_cli_runner().invoke(args=['assets', 'build'])
+    assert result.exit_code == 0, result.output
+    files = app.extensions['assets']
+    assert app.extensions['assets_hashed'] == set(files.values())
+
+    css = (tmp_path / 'assets' / files['css/materialdesignicons.6.9.96.min.css']).read_text()
+    assert 'webfont.woff?' not in css
+    assert files['fonts/materialdesignicons-webfont.woff2'] in css
+    with open(app.static_folder + '/css/materialdesignicons.6.9.96.min.css') as f_in:
+        assert 'webfont.woff?' in f_in.read()  # vendored file unchanged
+
+    result = app.test_cli_runner().invoke(args=['assets', 'build', '--if-stale'])
+    assert 'up to date' in result.output
+
+    with app.test_client() as client:
+        resp = client.get('/assets/' + files['bundle/libs.js'])
+        assert resp.status_code == 200
+        assert 'immutable' in resp.headers['Cache-Control']
+        assert client.get('/assets/bundle/libs.js').status_code == 404
@@ -0,0 +1,22 @@
+""" The bus benchmark runs all modes, with and without change feed
+"""
+import json
+
+from aquaPi.machineroom import bench, hist_nodes
+
+
+def test_bench_smoke(tmp_path, monkeypatch):
+    monkeypatch.setattr(hist_nodes, 'QUEST_DB', False)
+    out = tmp_path / 'bench.json'
+    assert bench.main(['--sizes', '10', '20', '--posts', '20', '-o', str(out)]) == 0
+
+    report = json.loads(out.read_text())
+    assert report['version'] == bench.BENCH_VERSION
+    results = report['results']
+    assert len(results) == 2 * 2 * 2 * 2
+    assert {(r['threaded'], r['compiled'], r['change_feed']) for r in results} == {
+        (t, c, f) for t in (False, True) for c in (False, True) for f in (False, True)}
+    for result in results:
+        assert result['nodes'] in (10, 20)
+        assert result['msgs'] >= result['posts']
+        assert result['msgs_per_s'] > 0
@@ -0,0 +1,70 @@
+""" Port discovery must not hang on slow drivers, neither at startup nor
+    on config pages asking for ports
+"""
+import subprocess
+import sys
+from threading import Event
+from time import monotonic
+
+import pytest
+
+from aquaPi.driver import IoRegistry
+from aquaPi.driver.base import Driver, IoPort, PortFunc
+
+
+class HangingDriver(Driver):
+    DISCOVERY_TIMEOUT = 0.2
+
+    @staticmethod
+    def find_ports() -> dict[str, IoPort]:
+        Event().wait()
+        return {}
+
+
+class LazyDriver(Driver):
+    LAZY_DISCOVERY = True
+    found = Event()
+    release = Event()
+
+    @staticmethod
+    def find_ports() -> dict[str, IoPort]:
+        LazyDriver.release.wait(5)
+        LazyDriver.found.set()
+        return {'Lazy #1': IoPort(PortFunc.Bout, LazyDriver, {})}
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(IoRegistry, '_map', {})
+    monkeypatch.setattr(IoRegistry, '_free', {func: {} for func in PortFunc})
+    monkeypatch.setattr(IoRegistry, '_used', {func: {} for func in PortFunc})
+    monkeypatch.setattr(IoRegistry, '_lazy', set())
+    monkeypatch.setattr(IoRegistry, 'discovery', {})
+    return IoRegistry.__new__(IoRegistry)
+
+
+def test_discovery_timeout(registry):
+    start = monotonic()
+    assert registry._discover({HangingDriver}) == {}
+    assert monotonic() - start < 2
+    assert IoRegistry.discovery['HangingDriver']['state'] == 'timeout'
+
+
+def test_hanging_discovery_does_not_block_exit():
+    script = ('from tests.test_io_registry import HangingDriver\n'
+              'from aquaPi.driver import IoRegistry\n'
+              'IoRegistry.__new__(IoRegistry)._discover({HangingDriver})\n')
+    subprocess.run([sys.executable, '-c', script], timeout=20, check=True)
+
+
+def test_lazy_ports_resolved_in_background(registry):
+    LazyDriver.found.clear()
+    LazyDriver.release.clear()
+    IoRegistry._lazy = {LazyDriver}
+
+    assert registry.get_ports_by_function([PortFunc.Bout]) == {}
+    LazyDriver.release.set()
+    assert LazyDriver.found.wait(5)
+    with IoRegistry._lazy_lock:
+        pass
+    assert list(registry.get_ports_by_function([PortFunc.Bout])) == ['Lazy #1']
@@ -0,0 +1,78 @@
+""" DS1820 sensors with bulk conversion on a fake sysfs w1 tree
+"""
+from time import sleep
+
+import pytest
+
+from aquaPi.driver import base
+from aquaPi.driver.base import PortFunc
+from aquaPi.driver.DriverOneWire import DriverDS1820, W1BulkConverter
+
+
+class FakeKernel:
+    """ stands in for the w1 kernel driver: each bulk conversion
+        stores the next queued value of each sensor
+    """
+    def __init__(self, master):
+        self.master = master
+        self.queued: dict[str, list[str]] = {}
+        self.conversions = 0
+
+    def sensor(self, adr: str, *values: str) -> str:
+        folder = self.master / adr
+        folder.mkdir()
+        (folder / 'temperature').write_text('0\n')
+        (folder / 'conv_time').write_text('20\n')
+        self.queued[adr] = list(values)
+        return str(folder)
+
+    def convert(self) -> None:
+        self.conversions += 1
+        for adr, values in self.queued.items():
+            if values:
+                (self.master / adr / 'temperature').write_text(values.pop(0) + '\n')
+
+
+@pytest.fixture
+def kernel(tmp_path, monkeypatch):
+    monkeypatch.setattr(base, 'is_raspi', lambda: True)
+    monkeypatch.setattr(W1BulkConverter, '_masters', {})
+    master = tmp_path / 'w1_bus_master1'
+    master.mkdir()
+    (master / 'therm_bulk_read').write_text('0\n')
+    fake = FakeKernel(master)
+
+    convert = W1BulkConverter._convert
+
+    def kernel_convert(self) -> None:
+        fake.convert()
+        convert(self)
+    monkeypatch.setattr(W1BulkConverter, '_convert', kernel_convert)
+    return fake
+
+
+def test_bulk_reads_fresh(kernel):
+    adr1 = kernel.sensor('28-000000000001', '21000', '21500', '22000')
+    adr2 = kernel.sensor('28-000000000002', '18000', '18500', '19000')
+    ds1 = DriverDS1820({'adr': adr1, 'max_age': 0.3}, PortFunc.Ain)
+    ds2 = DriverDS1820({'adr': adr2, 'max_age': 0.3}, PortFunc.Ain)
+    try:
+        assert ds1._bulk is ds2._bulk
+        first = (ds1.read(), ds2.read())
+        assert first in {(21.0, 18.0), (21.5, 18.5)}
+        assert ds1.read() == first[0]  # cached
+        sleep(0.4)
+        assert ds1.read() > first[0]  # too old, converted again
+    finally:
+        ds1.close()
+        ds2.close()
+
+
+def test_85000_converted_again(kernel):
+    adr = kernel.sensor('28-000000000003', '85000', '23500')
+    ds = DriverDS1820({'adr': adr, 'bulk_interval': 60}, PortFunc.Ain)
+    try:
+        assert ds.read() == 23.5
+        assert kernel.conversions == 2
+    finally:
+        ds.close()
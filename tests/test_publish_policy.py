@@ -0,0 +1,73 @@
+""" Publish policies must not hide data from nodes plugged in later
+"""
+import pytest
+
+from aquaPi.machineroom.msg_bus import MsgBus
+from aquaPi.machineroom.msg_types import MsgData
+from aquaPi.machineroom.in_nodes import AnalogInput
+from aquaPi.machineroom.aux_nodes import AvgAux
+from aquaPi.machineroom.ctrl_nodes import MaximumCtrl
+
+
+BUS_MODES = [(False, False), (False, True), (True, False), (True, True)]
+
+
+def _wait_idle(bus: MsgBus) -> None:
+    if bus._queue:
+        bus._queue.join()
+
+
+@pytest.fixture(params=BUS_MODES, ids=lambda m: f'threaded={m[0]},compiled={m[1]}')
+def bus(request):
+    threaded, compiled = request.param
+    bus = MsgBus(threaded=threaded, compiled=compiled)
+    yield bus
+    bus.teardown()
+
+
+@pytest.fixture
+def chain(bus):
+    """ input -> aux on the bus, with a value posted through
+    """
+    inp = AnalogInput('test pH', '', 0, 'pH', interval=3600)
+    aux = AvgAux('test avg', [inp.id])
+    bus.plugin_all([inp, aux])
+    inp.data = 7.5
+    inp.post(MsgData(inp.id, inp.data))
+    _wait_idle(bus)
+    assert aux.data == 7.5
+    return inp, aux
+
+
+def test_ctrl_after_aux_gets_data(bus, chain):
+    _inp, aux = chain
+    ctrl = MaximumCtrl('test max', aux.id, 7.0)
+    ctrl.plugin(bus)
+    _wait_idle(bus)
+    assert ctrl.data == 100.0
+
+
+def test_ctrl_after_aux_on_ready(bus, chain):
+    _inp, aux = chain
+    ctrl = MaximumCtrl('test max', aux.id, 7.0)
+    bus.plugin_all([ctrl])
+    _wait_idle(bus)
+    assert ctrl.data == 100.0
+
+
+def test_unchanged_data_still_suppressed(bus, chain):
+    inp, aux = chain
+    suppressed = aux.publish.suppressed
+    inp_suppressed = inp.publish.suppressed
+    inp.post(MsgData(inp.id, inp.data), force=True)
+    _wait_idle(bus)
+    assert aux.publish.suppressed == suppressed  # forced chain
+    inp.data = 7.5001
+    inp.post(MsgData(inp.id, inp.data))
+    inp.data = 7.5
+    inp.post(MsgData(inp.id, inp.data))
+    _wait_idle(bus)
+    assert aux.publish.suppressed == suppressed  # changes pass
+    inp.post(MsgData(inp.id, inp.data))
+    _wait_idle(bus)
+    assert inp.publish.suppressed == inp_suppressed + 1
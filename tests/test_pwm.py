@@ -0,0 +1,37 @@
+""" DriverPWM on a fake pwmchip, a directory tree like sysfs
+"""
+import pytest
+
+from aquaPi.driver import base
+from aquaPi.driver.base import PortFunc
+from aquaPi.driver.DriverPWM import DriverPWM
+
+
+@pytest.fixture
+def pwmchip(tmp_path, monkeypatch):
+    monkeypatch.setattr(base, 'is_raspi', lambda: True)
+    channel = tmp_path / 'pwmchip0' / 'pwm1'
+    channel.mkdir(parents=True)
+    for attr in ('period', 'duty_cycle', 'enable'):
+        (channel / attr).write_text('0')
+    return tmp_path / 'pwmchip0'
+
+
+def _attr(pwmchip, name: str) -> str:
+    return (pwmchip / 'pwm1' / name).read_text()
+
+
+def test_values_replace_previous(pwmchip):
+    pwm = DriverPWM({'pin': 19, 'channel': 1, 'pwmchip': str(pwmchip)}, PortFunc.Aout)
+    assert _attr(pwmchip, 'period') == str(DriverPWM.PERIOD)
+    assert (_attr(pwmchip, 'duty_cycle'), _attr(pwmchip, 'enable')) == ('0', '0')
+
+    pwm.write(100)
+    assert (_attr(pwmchip, 'duty_cycle'), _attr(pwmchip, 'enable')) == (str(DriverPWM.PERIOD), '1')
+    pwm.write(25.5)
+    assert _attr(pwmchip, 'duty_cycle') == str(int(25.5 / 100 * DriverPWM.PERIOD))
+    pwm.write(0)
+    assert (_attr(pwmchip, 'duty_cycle'), _attr(pwmchip, 'enable')) == ('0', '0')
+
+    pwm.close()
+    assert pwm._duty_fd is None and pwm._enable_fd is None
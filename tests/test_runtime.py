@@ -0,0 +1,73 @@
+""" Ticker tasks of the AsyncRuntime don't lose a wake(), neither before
+    the task runs nor during its step
+"""
+from threading import Event
+from time import sleep
+
+import pytest
+
+from aquaPi.machineroom.runtime import AsyncRuntime, Ticker
+
+
+@pytest.fixture
+def runtime():
+    yield AsyncRuntime.start(workers=2)
+    AsyncRuntime.stop()
+
+
+class Steps:
+    """ step() of a Ticker that counts its calls and waits long
+    """
+    def __init__(self, hold: Event | None = None):
+        self.count = 0
+        self.hold = hold
+        self.running = Event()
+
+    def __call__(self) -> float:
+        self.count += 1
+        self.running.set()
+        if self.hold:
+            self.hold.wait(5)
+            self.hold = None
+        return 60.
+
+    def wait_count(self, count: int) -> int:
+        for _ in range(200):
+            if self.count >= count:
+                break
+            sleep(0.01)
+        return self.count
+
+
+def test_wake_before_task_runs(runtime):
+    steps = Steps()
+    ticker = Ticker('early', steps)
+    loop_free = Event()
+    runtime.call_soon(loop_free.wait, 5)  # the task can't start yet
+    try:
+        ticker.start()
+        ticker.wake()
+        assert ticker._async_wakeup is None
+    finally:
+        loop_free.set()
+    try:
+        assert steps.wait_count(1) == 1
+        sleep(0.1)
+        assert steps.count == 1  # the first step was the wake
+    finally:
+        ticker.stop()
+
+
+@pytest.mark.parametrize('offload', [False, True])
+def test_wake_during_step(runtime, offload):
+    hold = Event()
+    steps = Steps(hold)
+    ticker = Ticker('busy', steps, offload=offload)
+    ticker.start()
+    try:
+        assert steps.running.wait(2)
+        ticker.wake()
+        hold.set()
+        assert steps.wait_count(2) == 2
+    finally:
+        ticker.stop()
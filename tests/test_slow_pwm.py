@@ -0,0 +1,42 @@
+""" SlowPwmDevice is timed by the SlowPwmEngine only while plugged in
+"""
+import pytest
+
+from aquaPi.machineroom.msg_bus import DataRange, MsgBus
+from aquaPi.machineroom.out_nodes import SlowPwmDevice, SlowPwmEngine
+from aquaPi.machineroom.topology import encode
+
+
+@pytest.fixture
+def bus():
+    bus = MsgBus()
+    yield bus
+    bus.teardown()
+
+
+def _engine_has(device: SlowPwmDevice) -> bool:
+    return device.id in SlowPwmEngine.get()._channels
+
+
+def test_engine_follows_plugin(bus):
+    pwm = SlowPwmDevice('Fan', '', '', cycle=30.0)
+    assert not _engine_has(pwm)
+    pwm.plugin(bus)
+    assert _engine_has(pwm)
+    pwm.pullout()
+    assert not _engine_has(pwm)
+
+
+def test_post_edges_from_form(bus):
+    pwm = SlowPwmDevice('Fan', '', '', cycle=30.0)
+    assert pwm.data_range == DataRange.BINARY
+    pwm.plugin(bus)
+    # settings.py sets numbers from the form as float
+    pwm.post_edges = 0.0
+    assert pwm.post_edges is False
+    assert pwm.data_range == DataRange.PERCENT
+    assert encode(pwm.__getstate__())['post_edges'] is False
+    pwm.post_edges = 1.0
+    assert pwm.post_edges is True
+    assert pwm.data_range == DataRange.BINARY
+    pwm.pullout()
@@ -0,0 +1,48 @@
+""" A SunCtrl cycle is planned from its seed, the same seed gives the same
+    curve, in the node and from /api/plan
+"""
+from types import SimpleNamespace
+
+from flask import Flask
+
+from aquaPi.api import bp
+from aquaPi.machineroom.ctrl_nodes import SunCtrl
+
+NOW = 1_700_000_000.0
+
+
+def _planned(seed: int, cloudiness: int | None = None) -> SunCtrl:
+    sun = SunCtrl('Sun', '', xscend=1)
+    sun.target = 80.0
+    sun._new_cycle(NOW, seed=seed)
+    if cloudiness is not None:
+        sun.cloudiness = cloudiness
+    sun._extend_plan(NOW + SunCtrl.PLAN_HORIZON)
+    return sun
+
+
+def test_same_seed_same_plan():
+    plan = _planned(4711).get_plan()
+    assert plan == _planned(4711).get_plan()
+    assert plan[0][0] == int(NOW)
+    assert all(0. <= level <= 80. for _, level in plan)
+    assert max(level for _, level in plan) > 0.
+
+    # with clouds planned, another seed changes the weather
+    assert _planned(4711, cloudiness=5).get_plan() == _planned(4711, cloudiness=5).get_plan()
+    assert _planned(4711, cloudiness=5).get_plan() != _planned(4712, cloudiness=5).get_plan()
+
+
+def test_api_plan():
+    sun = _planned(4711)
+    app = Flask(__name__)
+    app.register_blueprint(bp)
+    bus = SimpleNamespace(get_node=lambda node_id: sun if node_id == sun.id else None)
+    app.extensions['machineroom'] = SimpleNamespace(bus=bus)
+
+    with app.test_client() as client:
+        resp = client.get(f'/api/plan/{sun.id}')
+        assert resp.status_code == 200
+        assert resp.get_json() == {'result': 'SUCCESS',
+                                   'data': {sun.id: [list(pt) for pt in _planned(4711).get_plan()]}}
+        assert client.get('/api/plan/nowhere').status_code == 404
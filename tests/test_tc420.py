@@ -0,0 +1,88 @@
+""" DriverTC420 coalesces channel writes, keeps the devices it found and
+    backs off from a failing device
+"""
+from time import sleep
+
+import pytest
+
+from aquaPi.driver.base import PortFunc
+
+tc420 = pytest.importorskip('aquaPi.driver.DriverTC420')
+DriverTC420 = tc420.DriverTC420
+FakeTC420 = tc420.FakeTC420
+
+
+class FailingTC420(FakeTC420):
+    def send(self, packet) -> None:
+        self.sent.append(packet)
+        raise OSError('USB transfer failed')
+
+
+class NoTC420:
+    def __init__(self, dev_index: int = 0):
+        raise tc420.NoDeviceFoundError()
+
+
+@pytest.fixture(autouse=True)
+def fake_usb(monkeypatch):
+    monkeypatch.setattr(tc420, 'TC420', NoTC420)
+    monkeypatch.setattr(tc420, 'is_raspi', lambda: False)
+    monkeypatch.setattr(tc420, 'PlayInitPacket', lambda name: 'init')
+    monkeypatch.setattr(tc420, 'PlaySetChannels', tuple)
+    monkeypatch.setattr(tc420, 'ModeStopPacket', lambda: 'stop')
+    monkeypatch.setattr(DriverTC420, 'FLUSH_INTERVAL', 0.05)
+    # the writer thread is shared, its lock must stay
+    with DriverTC420._writer_cond:
+        monkeypatch.setattr(DriverTC420, 'devices', [])
+        monkeypatch.setattr(DriverTC420, 'ports', [])
+        monkeypatch.setattr(DriverTC420, '_dirty', set())
+        monkeypatch.setattr(DriverTC420, '_sent', {})
+        monkeypatch.setattr(DriverTC420, '_failed', {})
+
+
+def _wait_sent(dev: FakeTC420, packet, timeout: float = 2.) -> None:
+    for _ in range(int(timeout / 0.01)):
+        if dev.sent and dev.sent[-1] == packet:
+            return
+        sleep(0.01)
+    raise AssertionError(f'{packet} not sent: {dev.sent}')
+
+
+def test_find_ports_twice():
+    ports = DriverTC420.find_ports()
+    assert DriverTC420.find_ports().keys() == ports.keys()
+    assert len(DriverTC420.devices) == len(DriverTC420.ports) == 1
+    assert isinstance(DriverTC420.devices[0], FakeTC420)
+
+
+def test_writes_coalesced():
+    ports = DriverTC420.find_ports()
+    ch1 = DriverTC420(ports['TC420 #1 CH1'].cfg, PortFunc.Aout)
+    ch2 = DriverTC420(ports['TC420 #1 CH2'].cfg, PortFunc.Aout)
+    dev = DriverTC420.devices[0]
+    _wait_sent(dev, (0, 0, 0, 0, 0))
+
+    sent = len(dev.sent)
+    for val in range(1, 11):
+        ch1.write(val)
+        ch2.write(val / 2)
+    _wait_sent(dev, (10, 5, 0, 0, 0))
+    assert len(dev.sent) - sent <= 3
+
+    ch1.close()
+    assert dev.sent[-2:] == [(0, 5, 0, 0, 0), 'stop']
+
+
+def test_failing_device_backs_off():
+    DriverTC420.devices.append(FailingTC420(0))
+    DriverTC420.ports.append([0, 0, 0, 0, 0])
+    dev = DriverTC420.devices[0]
+    drv = DriverTC420.__new__(DriverTC420)
+    drv.name, drv._idx, drv._channel = 'failing', 0, 0
+    drv.close = lambda: None
+
+    drv.write(50)
+    sleep(1.)
+    # every 0.05 s without backoff, after 0.1, 0.2, 0.4 s with it
+    assert 2 <= len(dev.sent) <= 5
+    assert DriverTC420._failed[0] == len(dev.sent)
@@ -0,0 +1,112 @@
+""" Text drivers merge texts, retry with backoff and don't leak SMTP
+    sessions, checked against a stand-in server
+"""
+from threading import Event
+from time import monotonic, sleep
+
+import pytest
+
+from aquaPi.driver import DriverText as text_mod
+from aquaPi.driver.base import PortFunc
+from aquaPi.driver.DriverText import DriverEmail, DriverText
+
+
+class StandInSMTP:
+    """ the smtplib.SMTP calls of DriverEmail, fails while 'down'
+    """
+    sessions: list['StandInSMTP'] = []
+    down = 0  # count of sends to fail
+    sent: list = []
+
+    def __init__(self, server: str, timeout: float = 0):
+        self.closed = False
+        StandInSMTP.sessions.append(self)
+
+    def starttls(self) -> None:
+        pass
+
+    def login(self, login: str, pwd: str) -> None:
+        pass
+
+    def noop(self) -> tuple[int, bytes]:
+        return (250, b'ok')
+
+    def send_message(self, msg) -> None:
+        if StandInSMTP.down:
+            StandInSMTP.down -= 1
+            raise text_mod.smtplib.SMTPServerDisconnected('gone')
+        StandInSMTP.sent.append(msg)
+
+    def quit(self) -> None:
+        self.closed = True
+
+
+class RecordingText(DriverText):
+    """ fails the first 'failures' deliveries
+    """
+    def __init__(self, failures: int = 0):
+        super().__init__({}, PortFunc.Tout)
+        self.name = 'recording'
+        self.failures = failures
+        self.attempts: list[float] = []
+        self.delivered: list[str] = []
+        self.done = Event()
+
+    def _deliver(self, subj_text: str) -> None:
+        self.attempts.append(monotonic())
+        if self.failures:
+            self.failures -= 1
+            raise OSError('down')
+        self.delivered.append(subj_text)
+        self.done.set()
+
+
+@pytest.fixture(autouse=True)
+def fast(monkeypatch):
+    monkeypatch.setattr(DriverText, 'MERGE_WINDOW', 0.1)
+    monkeypatch.setattr(DriverText, 'RETRY_MIN', 0.4)
+    monkeypatch.setattr(text_mod.smtplib, 'SMTP', StandInSMTP)
+    StandInSMTP.sessions, StandInSMTP.sent, StandInSMTP.down = [], [], 0
+
+
+def test_merge():
+    assert DriverText._merge(['Alarm\nA', 'Alarm\nB']) == 'Alarm\nA\n\nB'
+    assert DriverText._merge(['Alarm', 'Alarm']) == 'Alarm'
+    assert DriverText._merge(['Temp high\nA', 'pH low']) == 'Temp high (+1)\nTemp high\nA\n\npH low'
+
+
+def test_write_keeps_retry_delay():
+    drv = RecordingText(failures=1)
+    drv.write('Alarm\nfirst')
+    sleep(0.2)
+    for n in range(5):
+        drv.write(f'Alarm\n{n}')
+        sleep(0.02)
+    assert drv.done.wait(5)
+    first, retry = drv.attempts
+    assert retry - first >= 0.4
+    assert drv.delivered == ['Alarm\nfirst\n\n0\n\n1\n\n2\n\n3\n\n4']
+
+
+def test_email_session_closed_on_failure():
+    drv = DriverEmail({'server': 'stand-in', 'login': 'l', 'pwd': 'p',
+                       'from': 'aquaPi', 'to': 'you'}, PortFunc.Tout)
+    StandInSMTP.down = 1
+    drv.write('Alarm\nwater')
+    for _ in range(300):
+        if StandInSMTP.sent:
+            break
+        sleep(0.01)
+    msg, = StandInSMTP.sent
+    assert msg['Subject'] == 'Alarm'
+    assert msg.get_content().strip() == 'water'
+    failed, current = StandInSMTP.sessions
+    assert failed.closed
+    assert drv._smtp is current
+
+    drv.close()
+    for _ in range(300):
+        if current.closed:
+            break
+        sleep(0.01)
+    assert current.closed
@@ -0,0 +1,136 @@
+""" Every node type survives save_topology() & load_topology(),
+    also when converted from a legacy pickled bus
+"""
+import os
+import pickle
+
+import pytest
+
+from aquaPi.machineroom import MachineRoom
+from aquaPi.machineroom.msg_bus import MsgBus
+from aquaPi.machineroom.in_nodes import AnalogInput, SwitchInput, ScheduleInput
+from aquaPi.machineroom.aux_nodes import ScaleAux, AvgAux, MinAux, MaxAux
+from aquaPi.machineroom.ctrl_nodes import (MinimumCtrl, MaximumCtrl, PidCtrl,
+                                           FadeCtrl, SunCtrl)
+from aquaPi.machineroom.out_nodes import SwitchDevice, SlowPwmDevice, AnalogDevice
+from aquaPi.machineroom.hist_nodes import History
+from aquaPi.machineroom.alert_nodes import Alert, AlertAbove, AlertBelow
+from aquaPi.machineroom import hist_nodes
+from aquaPi.machineroom.topology import (encode, load_topology, save_nodes,
+                                         save_topology, state_dir)
+
+# values changing while the bus runs
+RUNTIME = {'data', 'alert'}
+
+
+def _nodes() -> list:
+    temp = AnalogInput('Temp', '', 24.5, '°C', interval=3600, avg=3,
+                       min_interval=600, rate=0.5, deadband=0.1)
+    level = SwitchInput('Level', '', interval=3600, inverted=True)
+    sched = ScheduleInput('Light Schedule', '30 8-20 * * 1-5')
+    scale = ScaleAux('pH', temp.id, 'pH', points=[(0., 7.), (100., 4.)], limit=(0., 14.))
+    avg = AvgAux('Avg', [temp.id, scale.id], unfair_avg=2)
+    low = MinAux('Min', [temp.id, scale.id])
+    high = MaxAux('Max', [temp.id, scale.id])
+    heat = MinimumCtrl('Heat', temp.id, 25.0, hysteresis=0.4)
+    co2 = MaximumCtrl('CO2', scale.id, 6.8, hysteresis=0.1)
+    pid = PidCtrl('PID', avg.id, 25.5, p_fact=2.0, i_fact=0.1, d_fact=0.5)
+    fade = FadeCtrl('Fade', sched.id, fade_time=600, fade_out=300, easing='cubic')
+    sun = SunCtrl('Sun', sched.id, xscend=1.5)
+    switch = SwitchDevice('Heater', heat.id, '', inverted=True)
+    pwm = SlowPwmDevice('Fan', pid.id, '', cycle=30.0, post_edges=False)
+    dimmer = AnalogDevice('Dimmer', fade.id, '', percept=True, minimum=10, maximum=90)
+    hist = History('Temperatures', [temp.id, avg.id], duration=12)
+    alert = Alert('Warnings', {AlertAbove(temp.id, 28.0, 5), AlertBelow(scale.id, 6.0)}, '',
+                  repeat=600)
+    return [hist, alert, switch, pwm, dimmer, heat, co2, pid, fade, sun,
+            scale, avg, low, high, temp, level, sched]
+
+
+def _states(nodes) -> dict:
+    states = {}
+    for node in nodes:
+        state = {key: val for key, val in encode(node.__getstate__()).items()
+                 if key not in RUNTIME}
+        state['receives'] = sorted(state['receives'])  # Alert: from a set
+        states[node.id] = state
+    return states
+
+
+def _running(nodes) -> MsgBus:
+    # aux nodes inherit units when plugged in
+    bus = MsgBus()
+    bus.plugin_all(nodes)
+    return bus
+
+
+@pytest.fixture(autouse=True)
+def memory_history(monkeypatch):
+    monkeypatch.setattr(hist_nodes, 'QUEST_DB', False)
+
+
+def test_round_trip(tmp_path):
+    nodes = _nodes()
+    running = _running(nodes)
+    expected = _states(nodes)
+    topo_file = str(tmp_path / 'topo.json')
+    save_topology(topo_file, nodes, threaded=True, compiled=True)
+    running.teardown()
+
+    bus = load_topology(topo_file)
+    try:
+        assert (bus._threaded, bus._compiled) == (True, True)
+        assert {type(n).__name__ for n in bus.nodes} == {type(n).__name__ for n in nodes}
+        assert _states(bus.nodes) == expected
+    finally:
+        bus.teardown()
+
+
+def test_stale_records_removed(tmp_path):
+    nodes = _nodes()
+    topo_file = str(tmp_path / 'topo.json')
+    save_topology(topo_file, nodes)
+    save_topology(topo_file, nodes[1:])
+    assert len(list((tmp_path / state_dir('topo')).iterdir())) == len(nodes) - 1
+
+
+def test_legacy_pickle(tmp_path):
+    nodes = _nodes()
+    bus = _running(nodes)
+    expected = _states(nodes)
+    legacy_file = tmp_path / 'topo.pickle'
+    with open(legacy_file, 'wb') as f_out:
+        pickle.dump(bus, f_out)
+    bus.teardown()
+
+    legacy = MachineRoom._restore_legacy(str(legacy_file))
+    topo_file = str(tmp_path / 'topo.json')
+    try:
+        save_topology(topo_file, legacy.nodes)
+    finally:
+        legacy.teardown()
+    bus = load_topology(topo_file)
+    try:
+        assert _states(bus.nodes) == expected
+    finally:
+        bus.teardown()
+
+
+def test_save_nodes_syncs_batch(tmp_path, monkeypatch):
+    calls = {'sync': 0, 'fsync': 0}
+    sync, fsync = os.sync, os.fsync
+
+    def counted_sync() -> None:
+        calls['sync'] += 1
+        sync()
+
+    def counted_fsync(fd: int) -> None:
+        calls['fsync'] += 1
+        fsync(fd)
+    monkeypatch.setattr(os, 'sync', counted_sync)
+    monkeypatch.setattr(os, 'fsync', counted_fsync)
+
+    nodes = _nodes()
+    save_nodes(str(tmp_path / 'topo.json'), nodes)
+    assert calls == {'sync': 1, 'fsync': 1}  # the batch, the directory
+    assert len(list((tmp_path / state_dir('topo')).iterdir())) == len(nodes)